@@ -33,20 +33,81 @@
     >>> rc.setVolume(30)
 """
 
-import logging
 import re
 import sys
 
-from .remote_control import RemoteControl
-from .constants import Keys
-from .utils import getLogger
-from .exceptions import RemoteControlException, UserControlException
-
 __version__ = '1.4.5'
 
-__all__ = ['RemoteControl', 'Keys', 'getLogger',
-    'RemoteControlException',
-    'UserControlException']
+# Module of each public name, imported on first access so a short script
+# or the command line client do not pay for the whole package
+LAZY_NAMES = {
+    'RemoteControl': 'remote_control',
+    'ConnectionPool': 'pool',
+    'RemoteControlGroup': 'fleet',
+    'DescriptionCache': 'cache',
+    'Instrumentation': 'metrics',
+    'MetricsRegistry': 'metrics',
+    'CircuitBreaker': 'breaker',
+    'StateCache': 'state',
+    'CommandCoalescer': 'coalesce',
+    'CommandScheduler': 'scheduler',
+    'DiscoveryService': 'registry',
+    'TVRegistry': 'registry',
+    'EventListener': 'events',
+    'TVDevice': 'device',
+    'ControllerDaemon': 'daemon',
+    'Macro': 'macro',
+    'MacroRunner': 'macro',
+    'TraceRecorder': 'trace',
+    'TraceReplayer': 'trace',
+    'AdaptivePolicy': 'policy',
+    'Keys': 'constants',
+    'CircuitState': 'constants',
+    'Priority': 'constants',
+    'DeviceEvent': 'constants',
+    'getLogger': 'utils',
+    'RemoteControlException': 'exceptions',
+    'UserControlException': 'exceptions',
+}
+if sys.version_info >= (3, 5):
+    LAZY_NAMES['AsyncRemoteControl'] = 'aio'
+
+__all__ = list(LAZY_NAMES)
+
+if sys.version_info >= (3, 7):
+    import importlib
+
+    def __getattr__(name):
+        if name not in LAZY_NAMES:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        value = getattr(importlib.import_module('.' + LAZY_NAMES[name], __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(LAZY_NAMES))
+else:
+    from .remote_control import RemoteControl
+    from .pool import ConnectionPool
+    from .fleet import RemoteControlGroup
+    from .cache import DescriptionCache
+    from .metrics import Instrumentation, MetricsRegistry
+    from .breaker import CircuitBreaker
+    from .state import StateCache
+    from .coalesce import CommandCoalescer
+    from .scheduler import CommandScheduler
+    from .registry import DiscoveryService, TVRegistry
+    from .events import EventListener
+    from .device import TVDevice
+    from .daemon import ControllerDaemon
+    from .macro import Macro, MacroRunner
+    from .trace import TraceRecorder, TraceReplayer
+    from .policy import AdaptivePolicy
+    from .constants import Keys, CircuitState, Priority, DeviceEvent
+    from .utils import getLogger
+    from .exceptions import RemoteControlException, UserControlException
+    if sys.version_info >= (3, 5):
+        from .aio import AsyncRemoteControl
 
 def getOnlineVersion():
     """Fetch lib version from source repository
@@ -0,0 +1,301 @@
+# -*- coding: utf8 -*-
+
+"""
+    Asyncio flavour of the remote control client (Python 3 only)
+
+    Usage:
+
+    >>> import asyncio
+    >>> import panasonic_viera
+    >>> rc = panasonic_viera.AsyncRemoteControl("192.168.1.2")
+    >>> asyncio.get_event_loop().run_until_complete(rc.getVolume())
+"""
+
+# Systems imports
+import asyncio
+import re
+import socket
+
+# Project imports
+from .constants import ErrorCodes
+from .exceptions import RemoteControlException, UserControlException
+from .cache import getHeader
+from .soap import SoapTemplate, buildHostLine
+from .remote_control import (buildHttpRequest, checkVolume, getKeyTemplate,
+                             parseVolumeResponse, parseMuteResponse,
+                             parseInformations, buildDiscoveryRequest,
+                             parseDiscoveryResponse, buildDevice, URL_INFORMATION,
+                             GET_VOLUME_TEMPLATE, SET_VOLUME_TEMPLATE,
+                             GET_MUTE_TEMPLATE, SET_MUTE_TEMPLATES,
+                             DEFAULT_PORT, DEFAULT_TIMEOUT,
+                             DEFAULT_FIND_LOCAL_PORT,
+                             DEFAULT_FIND_MULTICAST_ADDRESS,
+                             DEFAULT_FIND_MULTICAST_PORT, DESCRIPTION_ERRORS)
+from .utils import getLogger, getNeighborTable
+
+# Global vars
+g_logger = getLogger()
+
+RE_STATUS_LINE = re.compile(br'HTTP/\d\.\d (\d{3})(?: |\r?\n|$)')
+
+
+async def readHttpResponse(reader):
+    """Read a full HTTP response from an asyncio stream
+
+    @param [asyncio.StreamReader] reader  the stream to read from
+    @return [tuple] the HTTP status code and the response body
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed before the response")
+    match = RE_STATUS_LINE.match(status_line)
+    if match is None:
+        raise ValueError("Invalid status line {!r}".format(status_line[:64]))
+    status = int(match.group(1))
+
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+    return status, body
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Collect the SSDP replies in a queue
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait((data, addr))
+
+
+class AsyncRemoteControl:
+    """This is an asyncio remote control client
+
+    It exposes the same operations as RemoteControl as coroutines.
+    """
+
+    def __init__(self, host=None, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+        """Default constructor
+
+        @param [str] OPTIONAL host  the hostname/ip address of the TV
+        @param [int] OPTIONAL port  the port of the TV
+        @param [float] OPTIONAL timeout  the network timeout in seconds
+        """
+        self.__host = host
+        self.__port = port
+        self.__timeout = timeout
+        self.__host_line = buildHostLine(host, port)
+
+    def setTimeout(self, timeout):
+        try:
+            self.__timeout = float(timeout)
+        except ValueError:
+            g_logger.error("Unable to set network timeout with value : %s", timeout)
+
+    async def exchange(self, host, port, data):
+        """Send raw request bytes on a new connection and read the response
+
+        @param [str] host  the hostname/ip address of the TV
+        @param [int] port  the port of the TV
+        @param [bytes] data  the full HTTP request
+
+        @return [tuple] the HTTP status code and the response body
+        """
+        async def _exchange():
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                writer.write(data)
+                await writer.drain()
+                return await readHttpResponse(reader)
+            finally:
+                writer.close()
+
+        try:
+            return await asyncio.wait_for(_exchange(), self.__timeout)
+        except (asyncio.TimeoutError, OSError, ValueError,
+                asyncio.IncompleteReadError) as e:
+            g_logger.fatal(str(e) or type(e).__name__)
+            raise RemoteControlException("The TV is unreacheable.", ErrorCodes.TV_UNREACHEABLE)
+
+    async def find(self, multicast_address=DEFAULT_FIND_MULTICAST_ADDRESS, multicast_port=DEFAULT_FIND_MULTICAST_PORT, multicast_localport=DEFAULT_FIND_LOCAL_PORT, records=False):
+        """Find a TV on the network
+
+        The description of all TVs are fetched concurrently.
+
+        @param [bool] OPTIONAL records  return TVDevice records instead of dicts
+        @return [list] the list of discovered TVs, see RemoteControl.find
+        """
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DiscoveryProtocol(queue),
+            local_addr=(str(socket.INADDR_ANY), multicast_localport),
+            family=socket.AF_INET)
+        arps = getNeighborTable()
+
+        tvs = []
+        fetches = []
+        seen = set()
+        try:
+            g_logger.debug("Sending multicast discovery request")
+            transport.sendto(buildDiscoveryRequest(multicast_address, multicast_port),
+                             (multicast_address, multicast_port))
+            deadline = loop.time() + self.__timeout
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    data, addr = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                tv = parseDiscoveryResponse(data, addr, arps)
+                usn = getHeader(tv['discovery'], 'USN') or tv['address']
+                if usn in seen:
+                    continue
+                seen.add(usn)
+                tvs.append(tv)
+                fetches.append(self.description(tv['address']))
+        finally:
+            transport.close()
+        g_logger.info("No more TV's found")
+
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+        devices = []
+        for tv, description in zip(tvs, results):
+            try:
+                if isinstance(description, Exception):
+                    raise description
+                device = buildDevice(tv, description)
+            except DESCRIPTION_ERRORS as e:
+                g_logger.fatal("Unable to describe TV %s : %s", tv['address'], str(e))
+                continue
+            devices.append(device if records else device.toDict())
+            g_logger.info("Found TV %s", tv['address'])
+        return devices
+
+    async def soapRequest(self, url, urn, action, params):
+        """Send a SOAP request to the TV.
+
+        @param [str] url  the query part of the url
+        @param [str] urn  the resource identifier
+        @param [str] params other query params
+
+        @return [bytes] the response body
+        """
+        return await self.sendTemplate(SoapTemplate(url, urn, action, params))
+
+    async def sendTemplate(self, template, value=None):
+        """Send a precomputed SOAP request to the TV.
+
+        @param [SoapTemplate] template  the request template
+        @param [object] OPTIONAL value  the variable argument of the template
+
+        @return [bytes] the response body
+        """
+        data = template.request(self.__host_line, value)
+        g_logger.debug("Sending request to %s:%d : '''%s'''", self.__host, self.__port, data)
+        status, res = await self.exchange(self.__host, self.__port, data)
+        if status >= 400:
+            g_logger.fatal("HTTP Error %d from %s:%d", status, self.__host, self.__port)
+            raise UserControlException("This command has failed, maybe the TV does not support it.", ErrorCodes.COMMANDE_NOT_SUPPORTED)
+        return res
+
+    async def http(self, query, host=None, port=None):
+        """Send a HTTP request to the TV.
+
+        @param [str] query  the query part of the url
+        @param [str] OPTIONAL host  the hostname/ip address of the TV
+        @param [str] OPTIONAL port  the port of the TV
+
+        @return [bytes] the response body
+        """
+        if host is None:
+            host = self.__host
+        if port is None:
+            port = self.__port
+        g_logger.debug("Sending http request to http://%s:%d/%s", host, port, query)
+        status, res = await self.exchange(host, port, buildHttpRequest(host, port, query))
+        if status >= 400:
+            g_logger.fatal("HTTP Error %d from %s:%d", status, host, port)
+        return res
+
+    async def informations(self, host=None, port=None):
+        """Retrieve a such amount of informations from the TV
+
+        @return [dict] see RemoteControl.informations
+        """
+        return parseInformations(await self.description(host, port))
+
+    async def description(self, host=None, port=None):
+        """Retrieve the XML description file of the TV
+
+        @return [bytes] the content of the description file
+        """
+        return await self.http(URL_INFORMATION, host, port)
+
+    async def sendKey(self, key):
+        """Send a key command to the TV.
+
+        @param [str] key a predefined keys from Keys enum
+        """
+        if self.__host is None:
+            raise UserControlException("You must set the host value to used this feature.")
+        g_logger.info("Send Key %s to %s", key, self.__host)
+        await self.sendTemplate(getKeyTemplate(key))
+
+    async def getVolume(self):
+        """Return the current volume level.
+
+        @return [int] the volume value
+        """
+        g_logger.info("Send GetVolume request to %s", self.__host)
+        res = await self.sendTemplate(GET_VOLUME_TEMPLATE)
+        return parseVolumeResponse(res)
+
+    async def setVolume(self, volume):
+        """Set a new volume level
+
+        @param [int] the new value for volume
+        """
+        checkVolume(volume)
+        g_logger.info("Send SetVolume request to %s", self.__host)
+        await self.sendTemplate(SET_VOLUME_TEMPLATE, volume)
+
+    async def getMute(self):
+        """Return if the TV is muted
+
+        @return [bool] the mute status
+        """
+        g_logger.info("Send GetMute request to %s", self.__host)
+        res = await self.sendTemplate(GET_MUTE_TEMPLATE)
+        return parseMuteResponse(res)
+
+    async def setMute(self, enable):
+        """Mute or unmute the TV.
+
+        @param [bool] true if mute must be enabled, false if not
+        """
+        g_logger.info("Send SetMute request to %s", self.__host)
+        await self.sendTemplate(SET_MUTE_TEMPLATES[bool(enable)])
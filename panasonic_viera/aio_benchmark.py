@@ -0,0 +1,53 @@
+# -*- coding: utf8 -*-
+
+"""
+    Benchmark of the asyncio client, see benchmark.py
+
+    This module needs python 3.5 or newer, it is imported by the 'async'
+    mode only.
+"""
+
+# Systems imports
+import asyncio
+
+# Project imports
+from .aio import AsyncRemoteControl
+from .benchmark import BenchmarkResult
+from .constants import Keys
+from .utils import monotonic
+
+
+def runAsync(operation, host, port, timeout, count, concurrency, ssdp_address):
+    """Benchmark the asyncio client
+    """
+    rc = AsyncRemoteControl(host, port, timeout)
+
+    async def call(semaphore):
+        async with semaphore:
+            start = monotonic()
+            try:
+                if operation == 'sendKey':
+                    await rc.sendKey(Keys.VOLUME_UP)
+                elif operation == 'find':
+                    await rc.find(multicast_address=ssdp_address[0],
+                                  multicast_port=ssdp_address[1],
+                                  multicast_localport=0)
+                else:
+                    await getattr(rc, operation)()
+            except Exception:
+                return None
+            return monotonic() - start
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[call(semaphore) for i in range(count)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = monotonic()
+        durations = loop.run_until_complete(run())
+        duration = monotonic() - start
+    finally:
+        loop.close()
+    latencies = [d for d in durations if d is not None]
+    return BenchmarkResult('async', operation, latencies, count - len(latencies), duration)
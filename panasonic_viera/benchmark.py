@@ -0,0 +1,194 @@
+# -*- coding: utf8 -*-
+
+"""
+    Throughput and latency benchmarks of the clients against a local MockTV
+
+    Usage:
+
+        python -m panasonic_viera.benchmark --requests 500 --latency 0.002
+"""
+
+# Systems imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+# Project imports
+from .constants import Keys
+from .mock import MockTV
+from .remote_control import RemoteControl
+from .utils import monotonic
+
+OPERATIONS = ('sendKey', 'getVolume', 'informations', 'find')
+MODES = ('serial', 'pooled', 'threaded', 'async')
+
+DEFAULT_REQUESTS = 200
+DEFAULT_FIND_REQUESTS = 5
+DEFAULT_FIND_TIMEOUT = 0.2
+DEFAULT_CONCURRENCY = 8
+
+
+def percentile(values, ratio):
+    """Return the percentile of a list of values
+
+    @param [list] values  the sorted values
+    @param [float] ratio  the percentile between 0 and 1
+    """
+    if not values:
+        return float('nan')
+    index = min(len(values) - 1, int(round(ratio * (len(values) - 1))))
+    return values[index]
+
+
+class BenchmarkResult:
+    """The measures of one operation in one client mode
+    """
+
+    def __init__(self, mode, operation, latencies, errors, duration):
+        self.mode = mode
+        self.operation = operation
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.duration = duration
+
+    def getRate(self):
+        """Return the number of requests per second
+        """
+        if self.duration <= 0:
+            return float('nan')
+        return (len(self.latencies) + self.errors) / self.duration
+
+    def getP50(self):
+        return percentile(self.latencies, 0.5)
+
+    def getP99(self):
+        return percentile(self.latencies, 0.99)
+
+    def __str__(self):
+        return '{:<9} {:<13} {:>6} {:>6} {:>10.1f} {:>9.2f} {:>9.2f}'.format(
+            self.mode, self.operation, len(self.latencies), self.errors,
+            self.getRate(), self.getP50() * 1000, self.getP99() * 1000)
+
+    @staticmethod
+    def header():
+        return '{:<9} {:<13} {:>6} {:>6} {:>10} {:>9} {:>9}'.format(
+            'mode', 'operation', 'ok', 'errors', 'req/s', 'p50 ms', 'p99 ms')
+
+
+def callOperation(rc, operation, ssdp_address):
+    """Run one operation with a synchronous RemoteControl
+    """
+    if operation == 'sendKey':
+        return rc.sendKey(Keys.VOLUME_UP)
+    if operation == 'find':
+        return rc.find(multicast_address=ssdp_address[0],
+                       multicast_port=ssdp_address[1], multicast_localport=0)
+    return getattr(rc, operation)()
+
+
+def measure(func):
+    """Call a function and return its duration, or None if it has failed
+    """
+    start = monotonic()
+    try:
+        func()
+    except Exception:
+        return None
+    return monotonic() - start
+
+
+def runSync(mode, operation, rc, count, concurrency, ssdp_address):
+    """Benchmark a synchronous client mode
+    """
+    call = lambda: measure(lambda: callOperation(rc, operation, ssdp_address))
+    start = monotonic()
+    if mode == 'threaded':
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        durations = list(executor.map(lambda i: call(), range(count)))
+        executor.shutdown()
+    else:
+        durations = [call() for i in range(count)]
+    duration = monotonic() - start
+    latencies = [d for d in durations if d is not None]
+    return BenchmarkResult(mode, operation, latencies, count - len(latencies), duration)
+
+
+def benchmark(requests=DEFAULT_REQUESTS, find_requests=DEFAULT_FIND_REQUESTS,
+              concurrency=DEFAULT_CONCURRENCY, find_timeout=DEFAULT_FIND_TIMEOUT,
+              modes=MODES, operations=OPERATIONS, **mock_options):
+    """Run the benchmarks against a new MockTV
+
+    @param [int] OPTIONAL requests  the number of requests per operation
+    @param [int] OPTIONAL find_requests  the number of find() calls
+    @param [int] OPTIONAL concurrency  the requests in flight for the
+                threaded and async modes
+    @param [float] OPTIONAL find_timeout  the discovery window of find()
+    @param [dict] mock_options  the options given to MockTV
+
+    @return [list] a BenchmarkResult per mode and operation
+    """
+    results = []
+    with MockTV(**mock_options) as tv:
+        host, port = tv.getAddress()
+        ssdp_address = tv.getSsdpAddress()
+        for mode in modes:
+            if mode == 'async' and sys.version_info < (3, 5):
+                continue
+            for operation in operations:
+                count = find_requests if operation == 'find' else requests
+                timeout = find_timeout if operation == 'find' else DEFAULT_FIND_TIMEOUT * 10
+                if mode == 'async':
+                    # coroutines are a syntax error on python 2
+                    from .aio_benchmark import runAsync
+                    result = runAsync(operation, host, port, timeout, count,
+                                      concurrency, ssdp_address)
+                else:
+                    rc = RemoteControl(host, port, timeout,
+                                       pool=(mode != 'serial'))
+                    result = runSync(mode, operation, rc, count, concurrency,
+                                     ssdp_address)
+                    if rc.getPool() is not None:
+                        rc.getPool().close()
+                results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Viera clients against a local mock TV')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS,
+                        help='number of requests per operation')
+    parser.add_argument('--find-requests', type=int, default=DEFAULT_FIND_REQUESTS,
+                        help='number of find() calls')
+    parser.add_argument('--find-timeout', type=float, default=DEFAULT_FIND_TIMEOUT,
+                        help='discovery window of find() in seconds')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='requests in flight for threaded and async modes')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='latency of the mock TV in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='probability of a SOAP error')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='probability of a dropped connection')
+    parser.add_argument('--mode', action='append', choices=MODES,
+                        help='client mode to run, can be repeated')
+    parser.add_argument('--operation', action='append', choices=OPERATIONS,
+                        help='operation to run, can be repeated')
+    args = parser.parse_args(argv)
+
+    results = benchmark(requests=args.requests,
+                        find_requests=args.find_requests,
+                        concurrency=args.concurrency,
+                        find_timeout=args.find_timeout,
+                        modes=args.mode or MODES,
+                        operations=args.operation or OPERATIONS,
+                        latency=args.latency,
+                        error_rate=args.error_rate,
+                        drop_rate=args.drop_rate)
+    print(BenchmarkResult.header())
+    for result in results:
+        print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
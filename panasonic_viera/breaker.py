@@ -0,0 +1,158 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import socket
+import threading
+
+# Project imports
+from .constants import CircuitState
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+DEFAULT_PROBE_TIMEOUT = 0.5
+# Time after which the trial request of a half-open circuit is considered lost
+DEFAULT_TRIAL_TIMEOUT = 10.0
+
+
+class _HostCircuit:
+    """The circuit state of one TV
+    """
+
+    def __init__(self, backoff):
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.next_probe = 0.0
+        # the deadline of the trial request of a half-open circuit
+        self.trial_expires = None
+
+
+class CircuitBreaker:
+    """This is a circuit breaker for unreachable TVs
+
+    After 'threshold' consecutive unreachable errors the circuit of a TV is
+    opened and requests fail immediately. Once the backoff delay has
+    elapsed, a TCP connection probe is made before the next request: if it
+    succeeds the circuit becomes half-open and this request is sent as the
+    only trial, else the backoff delay is doubled up to 'max_backoff'. The
+    other requests fail until the outcome of the trial is recorded, or
+    until the trial is considered lost after 'trial_timeout' seconds.
+
+    One breaker can be shared by many RemoteControl instances.
+    """
+
+    def __init__(self, threshold=DEFAULT_FAILURE_THRESHOLD, backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, probe_timeout=DEFAULT_PROBE_TIMEOUT,
+                 trial_timeout=DEFAULT_TRIAL_TIMEOUT):
+        """Default constructor
+
+        @param [int] OPTIONAL threshold  the number of consecutive failures
+                    which opens the circuit
+        @param [float] OPTIONAL backoff  the first delay before a probe
+        @param [float] OPTIONAL max_backoff  the max delay between two probes
+        @param [float] OPTIONAL probe_timeout  the timeout of a TCP probe
+        @param [float] OPTIONAL trial_timeout  the time after which the
+                    trial request of a half-open circuit is considered lost
+        """
+        self.__threshold = threshold
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__probe_timeout = probe_timeout
+        self.__trial_timeout = trial_timeout
+        self.__circuits = dict()
+        self.__lock = threading.Lock()
+
+    def getState(self, host, port):
+        """Return the circuit state of a TV
+
+        @return [CircuitState] the state
+        """
+        circuit = self.__circuits.get((host, port))
+        if circuit is None:
+            return CircuitState.CLOSED
+        return circuit.state
+
+    def getOpenHosts(self):
+        """Return the (host, port) couples whose circuit is open
+        """
+        with self.__lock:
+            return [key for key, circuit in self.__circuits.items()
+                    if circuit.state == CircuitState.OPEN]
+
+    def allow(self, host, port):
+        """Tell if a request may be sent to a TV
+
+        This may run a TCP probe when the circuit is open and its backoff
+        delay has elapsed. A half-open circuit admits one trial request.
+
+        @return [bool] False if the request must fail immediately
+        """
+        with self.__lock:
+            circuit = self.__circuits.get((host, port))
+            if circuit is None or circuit.state == CircuitState.CLOSED:
+                return True
+            if circuit.state == CircuitState.HALF_OPEN:
+                if circuit.trial_expires is not None and monotonic() < circuit.trial_expires:
+                    return False
+                # the trial has not been recorded, admit a new one
+                circuit.trial_expires = monotonic() + self.__trial_timeout
+                return True
+            if monotonic() < circuit.next_probe:
+                return False
+            # let only one caller run the probe
+            circuit.next_probe = monotonic() + circuit.backoff
+
+        if self.probe(host, port):
+            with self.__lock:
+                circuit.state = CircuitState.HALF_OPEN
+                circuit.trial_expires = monotonic() + self.__trial_timeout
+            g_logger.info("Circuit of %s:%d is half-open", host, port)
+            return True
+
+        with self.__lock:
+            circuit.backoff = min(circuit.backoff * 2, self.__max_backoff)
+            circuit.next_probe = monotonic() + circuit.backoff
+        g_logger.debug("Probe of %s:%d has failed, next one in %.1fs", host, port, circuit.backoff)
+        return False
+
+    def probe(self, host, port):
+        """Check if the TV accepts TCP connections
+
+        @return [bool] True if the TV is reachable
+        """
+        try:
+            sock = socket.create_connection((host, port), self.__probe_timeout)
+        except (socket.error, socket.timeout):
+            return False
+        sock.close()
+        return True
+
+    def recordSuccess(self, host, port):
+        """Close the circuit of a TV which has answered
+        """
+        with self.__lock:
+            circuit = self.__circuits.pop((host, port), None)
+        if circuit is not None and circuit.state != CircuitState.CLOSED:
+            g_logger.info("Circuit of %s:%d is closed", host, port)
+
+    def recordFailure(self, host, port):
+        """Count an unreachable error for a TV
+        """
+        with self.__lock:
+            circuit = self.__circuits.get((host, port))
+            if circuit is None:
+                circuit = self.__circuits[(host, port)] = _HostCircuit(self.__backoff)
+            circuit.failures += 1
+            if (circuit.state == CircuitState.HALF_OPEN or
+                    (circuit.state == CircuitState.CLOSED and circuit.failures >= self.__threshold)):
+                if circuit.state == CircuitState.HALF_OPEN:
+                    circuit.backoff = min(circuit.backoff * 2, self.__max_backoff)
+                circuit.state = CircuitState.OPEN
+                circuit.trial_expires = None
+                circuit.next_probe = monotonic() + circuit.backoff
+                g_logger.warning("Circuit of %s:%d is open for %.1fs", host, port, circuit.backoff)
@@ -0,0 +1,234 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import atexit
+import base64
+from collections import OrderedDict
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+# Project imports
+from .utils import getLogger
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_CACHE_SIZE = 256
+# Delay in seconds between a change and its write in the persistence file
+DEFAULT_SAVE_DELAY = 1.0
+
+RE_MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)', re.IGNORECASE)
+
+
+def getHeader(headers, name):
+    """Get a header value from a dict of SSDP headers without case sensitivity
+
+    @param [dict] headers  the headers as stored in tv['discovery']
+    @param [str] name  the header name
+    @return [str] the header value or None
+    """
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def getMaxAge(headers):
+    """Extract the max-age value of the CACHE-CONTROL SSDP header
+
+    @return [int] the max-age in seconds or None
+    """
+    value = getHeader(headers, 'CACHE-CONTROL')
+    if value is None:
+        return None
+    match = RE_MAX_AGE.search(value)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+class DescriptionCache:
+    """This is a cache for the TV description files
+
+    Entries are kept at most 'ttl' seconds, or for the max-age announced by
+    the TV, and the least recently used entries are evicted beyond 'maxsize'
+    entries. When a path is given, entries are persisted in this JSON file
+    so a new process starts with a warm cache. The changes made within
+    'save_delay' seconds are written at once, and the pending ones are
+    written when the process exits.
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL, maxsize=DEFAULT_CACHE_SIZE, path=None,
+                 save_delay=DEFAULT_SAVE_DELAY):
+        """Default constructor
+
+        @param [int] OPTIONAL ttl  the default lifetime of an entry in seconds
+        @param [int] OPTIONAL maxsize  the max number of entries
+        @param [str] OPTIONAL path  the JSON file used to persist the entries
+        @param [float] OPTIONAL save_delay  the delay before the changes are
+                    written in the file, 0 to write them on each change
+        """
+        self.__ttl = ttl
+        self.__maxsize = maxsize
+        self.__path = path
+        self.__save_delay = save_delay
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__save_lock = threading.Lock()
+        self.__dirty = False
+        self.__timer = None
+        if path is not None:
+            self.load()
+            atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, bootid=None):
+        """Return a cached description
+
+        An expired entry is still returned when the given BOOTID matches the
+        one stored with the entry, because the device has not rebooted.
+
+        @param [str] key  the entry key, an UUID or a 'host:port' string
+        @param [str] OPTIONAL bootid  the BOOTID announced by the TV
+        @return [bytes] the description or None
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if bootid is not None and entry['bootid'] is not None:
+                if entry['bootid'] != str(bootid):
+                    del self.__entries[key]
+                    return None
+            elif entry['expires'] < time.time():
+                del self.__entries[key]
+                return None
+            self.__touch(key)
+            return entry['data']
+
+    def put(self, key, data, ttl=None, bootid=None):
+        """Store a description
+
+        @param [str] key  the entry key, an UUID or a 'host:port' string
+        @param [bytes] data  the content of the description file
+        @param [int] OPTIONAL ttl  the lifetime of this entry
+        @param [str] OPTIONAL bootid  the BOOTID announced by the TV
+        """
+        if ttl is None:
+            ttl = self.__ttl
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        with self.__lock:
+            self.__entries[key] = dict(
+                data=data,
+                expires=time.time() + ttl,
+                bootid=str(bootid) if bootid is not None else None)
+            self.__touch(key)
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+        if self.__path is not None:
+            self.__scheduleSave()
+
+    def invalidate(self, key):
+        """Remove an entry from the cache
+        """
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries from the cache
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def load(self):
+        """Load the entries from the persistence file
+        """
+        try:
+            with open(self.__path, 'r') as f_cache:
+                entries = json.load(f_cache)
+        except (IOError, OSError, ValueError) as e:
+            g_logger.debug("Unable to load description cache from %s : %s", self.__path, str(e))
+            return
+        now = time.time()
+        with self.__lock:
+            for key, entry in entries:
+                if entry['expires'] >= now or entry.get('bootid') is not None:
+                    self.__entries[key] = dict(data=self.__decodeData(entry),
+                                               expires=entry['expires'],
+                                               bootid=entry.get('bootid'))
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+        g_logger.debug("Loaded %d descriptions from %s", len(self.__entries), self.__path)
+
+    def save(self):
+        """Write the entries into the persistence file now
+        """
+        with self.__save_lock:
+            with self.__lock:
+                self.__dirty = False
+                entries = [(key, dict(data64=base64.b64encode(entry['data']).decode('ascii'),
+                                      expires=entry['expires'], bootid=entry['bootid']))
+                           for key, entry in self.__entries.items()]
+            directory, name = os.path.split(os.path.abspath(self.__path))
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory)
+                with os.fdopen(fd, 'w') as f_cache:
+                    json.dump(entries, f_cache)
+                os.rename(tmp_path, self.__path)
+            except (IOError, OSError) as e:
+                g_logger.warning("Unable to save description cache into %s : %s", self.__path, str(e))
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+    def flush(self):
+        """Write the pending changes into the persistence file
+        """
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            dirty = self.__dirty
+        if dirty:
+            self.save()
+
+    def __scheduleSave(self):
+        if not self.__save_delay:
+            self.save()
+            return
+        with self.__lock:
+            self.__dirty = True
+            if self.__timer is not None:
+                return
+            self.__timer = threading.Timer(self.__save_delay, self.__delayedSave)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def __delayedSave(self):
+        with self.__lock:
+            self.__timer = None
+        self.save()
+
+    @staticmethod
+    def __decodeData(entry):
+        """Return the description of a persisted entry as bytes
+        """
+        if 'data64' in entry:
+            return base64.b64decode(entry['data64'])
+        # files written by the previous versions
+        return entry['data'].encode('utf-8')
+
+    def __touch(self, key):
+        """Mark an entry as the most recently used one
+        """
+        entry = self.__entries.pop(key)
+        self.__entries[key] = entry
@@ -0,0 +1,200 @@
+# -*- coding: utf8 -*-
+
+"""
+    Command line client of the controller daemon
+
+    Only the standard modules needed to talk to the daemon are imported, so
+    a command is sent in a few milliseconds. When no daemon is listening,
+    the command is run in process.
+
+    Usage:
+
+        viera [-s SOCKET] [-p PORT] HOST key MUTE
+        viera HOST volume [VALUE]
+        viera HOST mute [on|off]
+        viera find
+"""
+
+# Systems imports
+import json
+import os
+import socket
+import sys
+
+# Max size of a daemon reply line
+MAX_REPLY_SIZE = 1 << 20
+
+USAGE = """usage: viera [-s SOCKET] [-p PORT] HOST key NAME
+       viera [-s SOCKET] [-p PORT] HOST volume [VALUE]
+       viera [-s SOCKET] [-p PORT] HOST mute [on|off]
+       viera [-s SOCKET] find
+       viera [-s SOCKET] ping"""
+
+
+class DaemonUnavailableError(Exception):
+    """Raised when no daemon accepts connections on the socket
+
+    The request has not been sent, so it can be run in process.
+    """
+
+
+def getSocketPath():
+    """Return the default path of the daemon socket
+
+    @return [str] $VIERA_SOCKET, else a socket in $XDG_RUNTIME_DIR, else in /tmp
+    """
+    path = os.environ.get('VIERA_SOCKET')
+    if path:
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'panasonic-viera.sock')
+    return '/tmp/panasonic-viera-{}.sock'.format(os.getuid())
+
+
+def encodeMessage(message):
+    """Encode a request or a reply as one JSON line
+
+    @param [dict] message  the message
+    @return [bytes] the line
+    """
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def decodeMessage(line):
+    """Decode a JSON line
+
+    @param [bytes] line  the line
+    @return [dict] the message
+    @raise ValueError if the line is not a JSON object
+    """
+    message = json.loads(line.decode('utf-8'))
+    if not isinstance(message, dict):
+        raise ValueError("A message must be a JSON object")
+    return message
+
+
+def sendRequest(request, path=None, timeout=None):
+    """Send one request to the daemon and wait for its reply
+
+    @param [dict] request  the request, see ControllerDaemon.execute
+    @param [str] OPTIONAL path  the path of the daemon socket
+    @param [float] OPTIONAL timeout  the max time to wait for the reply
+    @return [dict] the reply
+    @raise DaemonUnavailableError if the daemon is not reachable
+    @raise socket.error if the connection is lost once the request is sent
+    @raise ValueError if the reply is not a JSON object
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path or getSocketPath())
+        except socket.error as e:
+            raise DaemonUnavailableError(str(e))
+        sock.sendall(encodeMessage(request))
+        chunks = []
+        size = 0
+        while size < MAX_REPLY_SIZE:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if chunk.endswith(b'\n'):
+                break
+        return decodeMessage(b''.join(chunks))
+    finally:
+        sock.close()
+
+
+def parseArguments(argv):
+    """Build the request matching the command line
+
+    @param [list] argv  the command line arguments
+    @return [tuple] the socket path and the request, the request is None
+                    if the arguments are invalid
+    """
+    path = None
+    port = None
+    args = list(argv)
+    while args and args[0].startswith('-'):
+        option = args.pop(0)
+        if option in ('-s', '--socket') and args:
+            path = args.pop(0)
+        elif option in ('-p', '--port') and args:
+            port = int(args.pop(0))
+        else:
+            return path, None
+    if len(args) == 1 and args[0] in ('find', 'ping'):
+        return path, dict(method=args[0])
+    if len(args) < 2:
+        return path, None
+
+    host, command, values = args[0], args[1], args[2:]
+    request = dict(host=host)
+    if port is not None:
+        request['port'] = port
+    if command == 'key' and len(values) == 1:
+        request.update(method='sendKey', args=values)
+    elif command == 'volume' and not values:
+        request['method'] = 'getVolume'
+    elif command == 'volume' and len(values) == 1:
+        request.update(method='setVolume', args=[int(values[0])])
+    elif command == 'mute' and not values:
+        request['method'] = 'getMute'
+    elif command == 'mute' and len(values) == 1 and values[0] in ('on', 'off'):
+        request.update(method='setMute', args=[values[0] == 'on'])
+    else:
+        return path, None
+    return path, request
+
+
+def printResult(method, result):
+    if method == 'find':
+        for tv in result:
+            print('{} {} {}'.format(tv.get('address'), tv.get('mac') or '-', tv.get('name') or ''))
+    elif result is not None:
+        print(json.dumps(result))
+
+
+def runRequest(request):
+    """Run a request in this process, with a plain RemoteControl
+
+    @param [dict] request  the request, see ControllerDaemon.execute
+    @return [dict] the reply
+    """
+    from .daemon import executeRequest
+    from .remote_control import RemoteControl
+    return executeRequest(request, RemoteControl, lambda: RemoteControl().find(records=True))
+
+
+def main(argv=None):
+    try:
+        path, request = parseArguments(sys.argv[1:] if argv is None else argv)
+    except ValueError:
+        request = None
+    if request is None:
+        sys.stderr.write(USAGE + '\n')
+        return 2
+
+    try:
+        reply = sendRequest(request, path)
+    except DaemonUnavailableError:
+        # no daemon is running, do the work in this process
+        reply = runRequest(request)
+    except socket.error as e:
+        # the daemon may have run the command, it must not be sent twice
+        reply = dict(error='connection to the daemon lost : {}'.format(e))
+    except ValueError:
+        reply = dict(error='invalid reply from the daemon')
+
+    if 'error' in reply:
+        sys.stderr.write('error: {}\n'.format(reply['error']))
+        return 1
+    printResult(request['method'], reply.get('result'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+from concurrent.futures import Future, wait
+import threading
+
+# Project imports
+from .constants import Keys
+from .remote_control import checkVolume, getKeyValue
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_WINDOW = 0.1
+
+# Volume change made by one key press
+VOLUME_STEPS = {
+    getKeyValue(Keys.VOLUME_UP): 1,
+    getKeyValue(Keys.VOLUME_DOWN): -1,
+}
+
+
+class _KeyCommand:
+    """A key which cannot be merged with others
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.futures = [Future()]
+
+    def run(self, rc):
+        return rc.sendKey(self.key)
+
+
+class _VolumeCommand:
+    """A burst of volume keys and SetVolume calls merged in one request
+
+    'base' is the absolute volume given by the last setVolume call, or None
+    to start from the current volume of the TV, 'delta' is the sum of the
+    key presses sent after it.
+    """
+
+    def __init__(self):
+        self.base = None
+        self.delta = 0
+        self.futures = []
+
+    def run(self, rc):
+        base = self.base
+        if base is None:
+            base = rc.getVolume()
+        volume = max(0, min(100, base + self.delta))
+        rc.setVolume(volume)
+        return volume
+
+
+class CommandCoalescer:
+    """This is a command queue which merges bursts of volume commands
+
+    Commands are sent by a worker thread 'window' seconds after the first
+    pending one. Consecutive VOLUME_UP/VOLUME_DOWN keys and setVolume calls
+    are merged into a single absolute SetVolume request, computed from the
+    current volume of the TV, and a setVolume call supersedes the pending
+    ones. Other keys are never merged and keep their order.
+
+    Give the remote control a StateCache so that the current volume is not
+    read on the TV for each burst.
+
+    Usage:
+
+    >>> queue = CommandCoalescer(rc)
+    >>> for i in range(10):
+    ...     queue.sendKey(Keys.VOLUME_UP)
+    >>> queue.flush()
+    """
+
+    def __init__(self, rc, window=DEFAULT_WINDOW):
+        """Default constructor
+
+        @param [RemoteControl] rc  the remote control of the TV
+        @param [float] OPTIONAL window  the delay in seconds during which
+                    the commands are gathered before being sent
+        """
+        self.__rc = rc
+        self.__window = window
+        self.__pending = []
+        self.__first = None
+        self.__flushing = False
+        self.__closed = False
+        self.__cond = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name='viera-coalescer')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def sendKey(self, key):
+        """Queue a key command
+
+        @param [str] key a predefined keys from Keys enum
+        @return [Future] resolved once the command has been sent
+        """
+        step = VOLUME_STEPS.get(getKeyValue(key))
+        with self.__cond:
+            if step is not None:
+                command, future = self.__volumeCommand()
+                command.delta += step
+                return future
+            command = _KeyCommand(key)
+            self.__push(command)
+            return command.futures[0]
+
+    def setVolume(self, volume):
+        """Queue a new volume level, replacing the pending volume changes
+
+        @param [int] the new value for volume
+        @return [Future] resolved with the volume sent to the TV
+        """
+        checkVolume(volume)
+        with self.__cond:
+            command, future = self.__volumeCommand()
+            command.base = volume
+            command.delta = 0
+            return future
+
+    def flush(self, timeout=None):
+        """Send the pending commands now and wait for them
+
+        @param [float] OPTIONAL timeout  the max time to wait in seconds
+        """
+        with self.__cond:
+            futures = [future for command in self.__pending for future in command.futures]
+            if futures:
+                self.__flushing = True
+                self.__cond.notify()
+        wait(futures, timeout=timeout)
+
+    def close(self, timeout=None):
+        """Send the pending commands and stop the worker thread
+        """
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify()
+        self.__thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __checkOpen(self):
+        if self.__closed:
+            raise RuntimeError("The command queue is closed")
+
+    def __push(self, command):
+        self.__checkOpen()
+        if not self.__pending:
+            self.__first = monotonic()
+        self.__pending.append(command)
+        self.__cond.notify()
+
+    def __volumeCommand(self):
+        """Return the last pending command if it is a volume one, else a new one
+
+        The worker takes the whole pending list under the lock, so a pending
+        command has not been dispatched yet and may still be changed. Once
+        dispatched, the next volume call starts a new command.
+        """
+        self.__checkOpen()
+        if self.__pending and isinstance(self.__pending[-1], _VolumeCommand):
+            command = self.__pending[-1]
+        else:
+            command = _VolumeCommand()
+            self.__push(command)
+        future = Future()
+        command.futures.append(future)
+        return command, future
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                while not self.__pending and not self.__closed:
+                    self.__cond.wait()
+                if not self.__pending:
+                    return
+                while not (self.__flushing or self.__closed):
+                    remaining = self.__first + self.__window - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__cond.wait(remaining)
+                batch = self.__pending
+                self.__pending = []
+                self.__flushing = False
+            for command in batch:
+                self.__execute(command)
+
+    def __execute(self, command):
+        try:
+            result = command.run(self.__rc)
+        except Exception as e:
+            g_logger.error("Queued command has failed : %s", str(e))
+            for future in command.futures:
+                future.set_exception(e)
+        else:
+            for future in command.futures:
+                future.set_result(result)
@@ -96,3 +96,24 @@ class Keys(Enum):
     VIERA_LINK = 'NRC_VIERA_LINK-ONOFF'
     VIERA_TOOLS = 'NRC_VTOOLS-ONOFF'
     YELLOW = 'NRC_YELLOW-ONOFF'
+
+class CircuitState(Enum):
+    """List of circuit breaker states
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+class Priority(Enum):
+    """List of command priorities, lower values are sent first
+    """
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+class DeviceEvent(Enum):
+    """List of changes notified by a TV registry
+    """
+    ADDED = 'added'
+    UPDATED = 'updated'
+    REMOVED = 'removed'
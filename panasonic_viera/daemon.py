@@ -0,0 +1,297 @@
+# -*- coding: utf8 -*-
+
+"""
+    Long running controller serving the TVs over a Unix domain socket
+
+    The remote controls, their keep-alive connections, the cached
+    descriptions and states stay warm between the commands. Each request
+    is one JSON line, like {"host": "192.168.1.2", "method": "sendKey",
+    "args": ["MUTE"]}, and gets one JSON line reply, {"result": ...} or
+    {"error": "...", "code": 408}.
+
+    Usage:
+
+        python -m panasonic_viera.daemon --socket /run/viera.sock
+"""
+
+# Systems imports
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+if sys.version_info[0] == 3:
+    from socketserver import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+    STRING_TYPES = (str,)
+else:
+    from SocketServer import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+    STRING_TYPES = (basestring,)
+
+# Project imports
+from .breaker import CircuitBreaker
+from .cache import DescriptionCache
+from .cli import getSocketPath, encodeMessage, decodeMessage, MAX_REPLY_SIZE
+from .constants import Keys
+from .exceptions import RemoteControlException
+from .pool import ConnectionPool
+from .registry import DiscoveryService
+from .remote_control import RemoteControl, DEFAULT_PORT, DEFAULT_TIMEOUT
+from .state import StateCache
+from .trace import TraceRecorder
+from .utils import getLogger
+
+# Global vars
+g_logger = getLogger()
+
+# Methods which may be called on a TV
+TV_METHODS = ('sendKey', 'getVolume', 'setVolume', 'getMute', 'setMute')
+
+# Types of the arguments of the methods which take some
+ARGUMENT_TYPES = {
+    'sendKey': STRING_TYPES,
+    'setVolume': (int,),
+    'setMute': (bool,),
+}
+
+# Lifetime of the volume and mute values served without asking the TV
+DEFAULT_STATE_MAX_AGE = 1.0
+
+
+def resolveKey(name):
+    """Return the key matching a name of the Keys enum, like 'MUTE'
+
+    @param [str] name  the key name or the raw key value
+    @return [Keys|str] the key
+    @raise TypeError if the name is not a string
+    """
+    if not isinstance(name, STRING_TYPES):
+        raise TypeError("a key must be a string, not {}".format(type(name).__name__))
+    key = getattr(Keys, name.upper(), None) if not name.startswith('_') else None
+    return key if key is not None else name
+
+
+def checkArguments(method, args):
+    """Check the types of the arguments of a TV method, as decoded from JSON
+
+    @param [str] method  the method name, one of TV_METHODS
+    @param [list] args  the arguments
+    @raise TypeError if an argument has not the expected type
+    """
+    types = ARGUMENT_TYPES.get(method)
+    if types is None:
+        return
+    for arg in args:
+        # a JSON boolean is an int for python
+        if not isinstance(arg, types) or (isinstance(arg, bool) and bool not in types):
+            raise TypeError("{} does not accept {!r}".format(method, arg))
+
+
+def describeDevice(tv):
+    """Return the summary of a discovered TV sent in the 'find' replies
+
+    @param [TVDevice] tv  the TV
+    @return [dict] its address, port, mac and computed fields
+    """
+    result = dict(address=tv['address'], port=tv['port'], mac=tv['mac'])
+    result.update(tv['computed'])
+    return result
+
+
+def executeRequest(request, getRemoteControl, find):
+    """Run one request
+
+    @param [dict] request  with keys 'method', 'host', 'port' and 'args'
+    @param [callable] getRemoteControl  return the RemoteControl of a
+                (host, port) couple
+    @param [callable] find  return the discovered TVs as TVDevice records
+    @return [dict] the reply, with a 'result' or an 'error' key
+    """
+    method = request.get('method')
+    args = request.get('args') or []
+    if not isinstance(args, list):
+        return dict(error='invalid arguments : args must be a list')
+    try:
+        if method == 'ping':
+            return dict(result='pong')
+        if method == 'find':
+            return dict(result=[describeDevice(tv) for tv in find()])
+        if method not in TV_METHODS:
+            return dict(error='unknown method {!r}'.format(method))
+        if not request.get('host'):
+            return dict(error='a host is required')
+        if not isinstance(request['host'], STRING_TYPES):
+            return dict(error='invalid host {!r}'.format(request['host']))
+        rc = getRemoteControl(request['host'], int(request.get('port') or DEFAULT_PORT))
+        checkArguments(method, args)
+        if method == 'sendKey':
+            args = [resolveKey(arg) for arg in args]
+        return dict(result=getattr(rc, method)(*args))
+    except RemoteControlException as e:
+        return dict(error=str(e), code=e.getCode())
+    except (TypeError, ValueError) as e:
+        return dict(error='invalid arguments : {}'.format(e))
+
+
+class _DaemonServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class _RequestHandler(StreamRequestHandler):
+    """Serve the requests of one client connection
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REPLY_SIZE)
+            if not line:
+                return
+            if not line.endswith(b'\n'):
+                # the line is too long or the client has gone, the rest of
+                # the stream cannot be split into requests any more
+                if len(line) >= MAX_REPLY_SIZE:
+                    self.wfile.write(encodeMessage(dict(error='request too long')))
+                return
+            try:
+                request = decodeMessage(line)
+            except ValueError as e:
+                reply = dict(error='invalid request : {}'.format(e))
+            else:
+                reply = self.server.controller.execute(request)
+            self.wfile.write(encodeMessage(reply))
+            self.wfile.flush()
+
+
+class ControllerDaemon:
+    """This is the controller which keeps the TV clients warm
+
+    All remote controls share one connection pool, one description cache,
+    one state cache and one circuit breaker.
+    """
+
+    def __init__(self, path=None, timeout=DEFAULT_TIMEOUT, state_max_age=DEFAULT_STATE_MAX_AGE,
+                 discovery=False, recorder=None):
+        """Default constructor
+
+        @param [str] OPTIONAL path  the path of the Unix socket
+        @param [float] OPTIONAL timeout  the network timeout of each request
+        @param [float] OPTIONAL state_max_age  the max age of the cached
+                    volume and mute values
+        @param [bool] OPTIONAL discovery  run a DiscoveryService while
+                    serving, so 'find' answers from the live registry
+        @param [TraceRecorder] OPTIONAL recorder  the recorder of the
+                    requests sent to the TVs
+        """
+        self.__path = path or getSocketPath()
+        self.__timeout = timeout
+        self.__pool = ConnectionPool()
+        self.__description_cache = DescriptionCache()
+        self.__state_cache = StateCache(state_max_age)
+        self.__breaker = CircuitBreaker()
+        self.__recorder = recorder
+        self.__remotes = dict()
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__discovery = None
+        if discovery:
+            self.__discovery = DiscoveryService(RemoteControl(
+                timeout=timeout, description_cache=self.__description_cache))
+
+    def getPath(self):
+        return self.__path
+
+    def getRemoteControl(self, host, port=DEFAULT_PORT):
+        """Return the remote control of a TV, created on first use
+        """
+        with self.__lock:
+            rc = self.__remotes.get((host, port))
+            if rc is None:
+                rc = self.__remotes[(host, port)] = RemoteControl(
+                    host, port, self.__timeout, pool=self.__pool,
+                    description_cache=self.__description_cache,
+                    breaker=self.__breaker, state_cache=self.__state_cache,
+                    recorder=self.__recorder)
+            return rc
+
+    def execute(self, request):
+        """Run one request with the warm remote controls
+
+        @param [dict] request  see executeRequest
+        @return [dict] the reply, with a 'result' or an 'error' key
+        """
+        return executeRequest(request, self.getRemoteControl, self.__find)
+
+    def __find(self):
+        if self.__discovery is not None:
+            return self.__discovery.getRegistry().getDevices()
+        rc = RemoteControl(timeout=self.__timeout, description_cache=self.__description_cache)
+        return rc.find(records=True)
+
+    def serveForever(self):
+        """Listen on the Unix socket until shutdown() is called
+        """
+        if os.path.exists(self.__path):
+            # remove the socket left by a previous daemon if it is dead
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.__path)
+            except socket.error:
+                os.unlink(self.__path)
+            else:
+                raise RuntimeError("A daemon is already listening on {}".format(self.__path))
+            finally:
+                probe.close()
+        self.__server = _DaemonServer(self.__path, _RequestHandler)
+        self.__server.controller = self
+        os.chmod(self.__path, 0o600)
+        g_logger.info("Listening on %s", self.__path)
+        if self.__discovery is not None:
+            self.__discovery.start()
+        try:
+            self.__server.serve_forever()
+        finally:
+            if self.__discovery is not None:
+                self.__discovery.stop()
+            self.__server.server_close()
+            self.__pool.close()
+            if os.path.exists(self.__path):
+                os.unlink(self.__path)
+
+    def shutdown(self):
+        """Stop serving, from another thread
+        """
+        if self.__server is not None:
+            self.__server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the Viera TVs over a Unix socket')
+    parser.add_argument('-s', '--socket', default=getSocketPath(),
+                        help='path of the Unix socket')
+    parser.add_argument('-t', '--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='network timeout in seconds')
+    parser.add_argument('--state-max-age', type=float, default=DEFAULT_STATE_MAX_AGE,
+                        help='max age in seconds of the cached volume and mute values')
+    parser.add_argument('-d', '--discovery', action='store_true',
+                        help='keep a live list of the TVs for the find command')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='record the requests and dump them in PATH on SIGUSR1')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log the requests')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    recorder = None
+    if args.trace:
+        recorder = TraceRecorder()
+        recorder.dumpOnSignal(args.trace)
+    daemon = ControllerDaemon(args.socket, args.timeout, args.state_max_age, args.discovery, recorder)
+    try:
+        daemon.serveForever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
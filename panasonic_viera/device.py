@@ -0,0 +1,290 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import copy
+import re
+import sys
+if sys.version_info[0] == 3:
+    from sys import intern
+    from collections.abc import Mapping
+else:
+    from collections import Mapping
+
+# Project imports
+from .cache import getHeader
+from .utils import getLogger, extractUUID, parseXMLInformationsFromBytes, getNeighborTable
+
+# Global vars
+g_logger = getLogger()
+
+# The device fields read from the description, the first match is the root device
+RE_DEVICE_FIELDS = re.compile(br'<(deviceType|friendlyName|manufacturer|modelName|modelNumber|UDN)>([^<]*)</\1>')
+
+DEVICE_FIELDS = {
+    b'deviceType': 'device_type',
+    b'friendlyName': 'name',
+    b'manufacturer': 'manufacturer',
+    b'modelName': 'model_name',
+    b'modelNumber': 'model_number',
+    b'UDN': 'uuid',
+}
+
+# Encoding declared in the XML declaration of the description
+RE_XML_ENCODING = re.compile(br'<\?xml[^>]*?encoding\s*=\s*["\']([^"\']+)["\']')
+
+# Encodings whose bytes the regex scan can decode as UTF-8
+SCANNABLE_ENCODINGS = ('utf-8', 'utf8', 'us-ascii', 'ascii')
+
+# Markup which the regex scan cannot read, entities, CDATA sections and comments
+UNSCANNABLE_MARKUP = (b'&', b'<![CDATA[', b'<!--')
+
+# Keys of the dict view, same as the dicts returned by find() before
+DEVICE_KEYS = ('address', 'port', 'mac', 'discovery', 'informations', 'computed')
+
+# Attributes exposed in the 'computed' key
+COMPUTED_KEYS = ('uuid', 'name', 'model_number', 'model_name', 'manufacturer')
+
+
+def internString(value):
+    """Intern a string so that equal values share one object
+
+    @param [str] value  the string
+    @return [str] the interned string, or the value itself if it cannot be
+    """
+    try:
+        return intern(value)
+    except TypeError:
+        return value
+
+
+def isScannableDescription(data):
+    """Tell if the root device fields of a description can be read by a regex scan
+
+    @param [bytes] data  the content of the description file
+    @return [bool] False when only a XML parser reads the right values
+    """
+    if not data.startswith(b'<'):
+        # byte order mark, other encodings or leading spaces
+        return False
+    match = RE_XML_ENCODING.match(data)
+    if match is not None and match.group(1).lower().decode('ascii', 'replace') not in SCANNABLE_ENCODINGS:
+        return False
+    for markup in UNSCANNABLE_MARKUP:
+        if markup in data:
+            return False
+    return True
+
+
+def parseDescriptionFields(data):
+    """Extract the root device fields of a description with the XML parser
+
+    @param [bytes] data  the content of the description file
+    @return [dict] the values by attribute name, like {'name': 'TV'}
+    """
+    infos = parseXMLInformationsFromBytes(data)
+    device = infos.get('device') if isinstance(infos, dict) else None
+    fields = dict()
+    if not isinstance(device, dict):
+        return fields
+    for tag, name in DEVICE_FIELDS.items():
+        value = device.get(tag.decode('ascii'))
+        if isinstance(value, (dict, list)):
+            continue
+        value = (value or '').strip()
+        fields[name] = internString(value) if value else None
+    return fields
+
+
+def scanDescription(data):
+    """Extract the root device fields of a description in one pass
+
+    The fields are read by a regex scan of the raw bytes, or by the XML
+    parser when the description uses markup the scan cannot read, see
+    isScannableDescription, so both ways return the same values. The scan
+    stops at the list of the embedded devices, and the parser is used when
+    a root field is missing before it.
+
+    @param [bytes] data  the content of the description file
+    @return [dict] the values by attribute name, like {'name': 'TV'}, empty
+                values are None
+    """
+    if not isScannableDescription(data):
+        return parseDescriptionFields(data)
+    # the fields of the embedded devices follow this tag
+    end = data.find(b'<deviceList')
+    fields = dict()
+    try:
+        for match in RE_DEVICE_FIELDS.finditer(data, 0, len(data) if end < 0 else end):
+            name = DEVICE_FIELDS[match.group(1)]
+            if name not in fields:
+                value = match.group(2).decode('utf-8').strip()
+                fields[name] = internString(value) if value else None
+                if len(fields) == len(DEVICE_FIELDS):
+                    break
+    except UnicodeDecodeError:
+        return parseDescriptionFields(data)
+    if end >= 0 and len(fields) < len(DEVICE_FIELDS):
+        return parseDescriptionFields(data)
+    return fields
+
+
+class TVDevice(object):
+    """This is the compact record of a discovered TV
+
+    The device fields are read from the description with a single scan and
+    the repeated strings are interned. The full description tree is parsed
+    only when 'informations' is accessed. The record is registered as a
+    Mapping with the keys of the dicts returned by find(), so tv['address']
+    or tv['computed']['name'] still work. It is not a dict though: the
+    'computed' value is built on each access, so changes made in it are
+    lost, and json cannot serialize the record. toDict() returns a plain
+    dict copy.
+    """
+
+    __slots__ = ('address', 'port', '_mac', 'uuid', 'name', 'model_number',
+                 'model_name', 'manufacturer', 'device_type',
+                 '_discovery', '_description', '_informations')
+
+    def __init__(self, address, port, mac=None, discovery=None, description=None):
+        """Default constructor
+
+        @param [str] address  the IP address of the TV
+        @param [int] port  the port which has answered the discovery
+        @param [str] OPTIONAL mac  the MAC address of the TV, looked up
+                    later in the neighbor table when not known yet
+        @param [dict] OPTIONAL discovery  the SSDP headers
+        @param [bytes] OPTIONAL description  the content of the description file
+        """
+        self.address = internString(address)
+        self.port = port
+        self._mac = mac
+        self._discovery = None
+        self._description = description
+        self._informations = None
+        self.setDiscovery(discovery)
+
+        fields = scanDescription(description) if description is not None else dict()
+        self.device_type = fields.get('device_type')
+        self.name = fields.get('name')
+        self.manufacturer = fields.get('manufacturer')
+        self.model_name = fields.get('model_name')
+        self.model_number = fields.get('model_number')
+        uuid = None
+        if self._discovery:
+            uuid = extractUUID(getHeader(self._discovery, 'USN') or '')
+        if uuid is None and fields.get('uuid'):
+            uuid = extractUUID(fields['uuid'])
+        self.uuid = internString(uuid) if uuid is not None else None
+
+    def __repr__(self):
+        return '<TVDevice {} {!r}>'.format(self.address, self.name)
+
+    def setDiscovery(self, discovery):
+        """Replace the SSDP headers of this TV
+        """
+        if discovery:
+            self._discovery = dict((internString(key), internString(value))
+                                   for key, value in discovery.items())
+        else:
+            self._discovery = None
+
+    @property
+    def mac(self):
+        """The MAC address, looked up in the neighbor table until it is known
+        """
+        if self._mac is None:
+            self._mac = getNeighborTable().get(self.address)
+        return self._mac
+
+    @mac.setter
+    def mac(self, mac):
+        self._mac = mac
+
+    @property
+    def discovery(self):
+        """The SSDP headers, empty when the TV has not been found by SSDP
+        """
+        return self._discovery if self._discovery is not None else dict()
+
+    @property
+    def description(self):
+        """The content of the description file
+        """
+        return self._description
+
+    @property
+    def informations(self):
+        """The parsed description, see RemoteControl.informations
+        """
+        if self._informations is None and self._description is not None:
+            self._informations = dict(general=parseXMLInformationsFromBytes(self._description))
+        return self._informations
+
+    @property
+    def computed(self):
+        """The main device fields, see fillComputedValues
+        """
+        computed = dict()
+        for key in COMPUTED_KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                computed[key] = value
+        return computed
+
+    def toDict(self):
+        """Return a plain dict copy of this record, as returned by find()
+
+        @return [dict] a dict which does not share any value with the record
+        """
+        tv = dict(address=self.address, port=self.port, mac=self.mac,
+                  discovery=dict(self.discovery), computed=self.computed)
+        if 'informations' in self:
+            tv['informations'] = copy.deepcopy(self.informations)
+        return tv
+
+    # dict compatible view
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key in ('address', 'port', 'mac'):
+            setattr(self, key, value)
+        elif key == 'discovery':
+            self.setDiscovery(value)
+        elif key == 'informations':
+            self._informations = value
+        else:
+            raise KeyError("TVDevice does not support the key '{}'".format(key))
+
+    def __contains__(self, key):
+        if key == 'informations':
+            # without parsing the description
+            return self._description is not None or self._informations is not None
+        return key in DEVICE_KEYS
+
+    def __iter__(self):
+        return iter([key for key in DEVICE_KEYS if key in self])
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(iter(self))
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+
+Mapping.register(TVDevice)
@@ -0,0 +1,321 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import sys
+import threading
+import xml.etree.ElementTree as xml_elm
+if sys.version_info[0] == 3:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+else:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+# Project imports
+from .exceptions import RemoteControlException
+from .remote_control import DEFAULT_SUBSCRIPTION_TIMEOUT
+from .state import getStateKey
+from .utils import getLogger, monotonic, stripNamespace, getLocalAddress
+
+# Global vars
+g_logger = getLogger()
+
+# Delay before a new attempt when a subscription cannot be renewed
+RENEW_RETRY_DELAY = 10
+
+# Conversion of the LastChange variables into TV states
+STATE_VARIABLES = {
+    'Volume': ('volume', int),
+    'Mute': ('mute', lambda value: value in ('1', 'true', 'True')),
+}
+
+
+def parseLastChange(body):
+    """Extract the state variables of a RenderingControl event
+
+    Only the variables of the instance 0 and of the Master channel are kept.
+
+    @param [bytes] body  the body of a NOTIFY request
+    @return [dict] the raw values by variable name, like {'Volume': '12'}
+    """
+    variables = dict()
+    for prop in xml_elm.fromstring(body):
+        for child in prop:
+            if stripNamespace(child.tag) != 'LastChange' or not child.text:
+                continue
+            event = xml_elm.fromstring(child.text.encode('utf-8'))
+            for instance in event:
+                if instance.get('val', '0') != '0':
+                    continue
+                for variable in instance:
+                    if variable.get('channel', 'Master') == 'Master' and 'val' in variable.attrib:
+                        variables[stripNamespace(variable.tag)] = variable.get('val')
+    return variables
+
+
+def convertStates(variables):
+    """Convert the LastChange variables into TV states
+
+    @param [dict] variables  as returned by parseLastChange
+    @return [dict] the states, like {'volume': 12, 'mute': False}
+    """
+    states = dict()
+    for variable, value in variables.items():
+        if variable in STATE_VARIABLES:
+            name, convert = STATE_VARIABLES[variable]
+            try:
+                states[name] = convert(value)
+            except ValueError:
+                g_logger.warning("Invalid value '%s' for event variable %s", value, variable)
+    return states
+
+
+class _Subscription:
+    """An event subscription of one TV
+    """
+
+    def __init__(self, rc, callback, state_cache):
+        self.rc = rc
+        self.callback = callback
+        self.state_cache = state_cache
+        self.sid = None
+        self.seq = None
+        self.renew_at = 0.0
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _EventHandler(BaseHTTPRequestHandler):
+    """Receive the NOTIFY requests of the TVs
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        g_logger.debug("EventListener %s : " + format, self.client_address[0], *args)
+
+    def do_NOTIFY(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        status = self.server.listener.dispatch(self.headers.get('SID'),
+                                               self.headers.get('SEQ'), body)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class EventListener:
+    """This is a receiver of the UPnP events of the TVs
+
+    It runs a small HTTP server which receives the NOTIFY requests sent by
+    the RenderingControl service of the subscribed TVs, and renews the
+    subscriptions before they expire. Each volume or mute change is given to
+    the callback as callback(rc, states) and stored in the state cache, so
+    the values are known without polling the TVs.
+
+    Usage:
+
+    >>> listener = EventListener()
+    >>> listener.start()
+    >>> listener.subscribe(rc, callback=lambda rc, states: print(states))
+    """
+
+    def __init__(self, host='0.0.0.0', port=0, advertise_address=None,
+                 timeout=DEFAULT_SUBSCRIPTION_TIMEOUT):
+        """Default constructor
+
+        @param [str] OPTIONAL host  the local address to listen on
+        @param [int] OPTIONAL port  the local port, 0 for an ephemeral one
+        @param [str] OPTIONAL advertise_address  the address given to the
+                    TVs in the callback url, by default the local address
+                    of the route to each TV
+        @param [int] OPTIONAL timeout  the requested subscription lifetime
+        """
+        self.__advertise_address = advertise_address
+        self.__timeout = timeout
+        self.__subscriptions = dict()
+        self.__lock = threading.Lock()
+        self.__subscribe_lock = threading.Lock()
+        self.__cond = threading.Condition(self.__lock)
+        self.__http = _ThreadingHTTPServer((host, port), _EventHandler)
+        self.__http.listener = self
+        self.__threads = []
+        self.__running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def getAddress(self):
+        """Return the (host, port) couple of the callback server
+        """
+        return self.__http.server_address[:2]
+
+    def start(self):
+        """Start the callback server and the renewal thread
+        """
+        self.__running = True
+        for target in (self.__http.serve_forever, self.__renewLoop):
+            thread = threading.Thread(target=target, name='viera-events')
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        """Cancel all subscriptions and stop the callback server
+        """
+        with self.__cond:
+            self.__running = False
+            subscriptions = list(self.__subscriptions.values())
+            self.__subscriptions.clear()
+            self.__cond.notify_all()
+        for subscription in subscriptions:
+            try:
+                subscription.rc.unsubscribe(subscription.sid)
+            except RemoteControlException as e:
+                g_logger.warning("Unable to unsubscribe from %s : %s", subscription.rc.getHost(), str(e))
+        if self.__threads:
+            # shutdown() waits for serve_forever(), forever if it never ran
+            self.__http.shutdown()
+        self.__http.server_close()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def getCallbackUrl(self, remote):
+        """Return the callback url given to a TV
+
+        @param [str] remote  the address of the TV
+        """
+        address = self.__advertise_address or getLocalAddress(remote)
+        return 'http://{}:{}/'.format(address, self.getAddress()[1])
+
+    def subscribe(self, rc, callback=None, state_cache=None):
+        """Subscribe to the volume and mute changes of a TV
+
+        @param [RemoteControl] rc  the remote control of the TV
+        @param [callable] OPTIONAL callback  called as callback(rc, states)
+        @param [StateCache] OPTIONAL state_cache  the cache which receives
+                    the new values, by default the cache of the remote control
+
+        @return [str] the subscription id
+        @raise RemoteControlException if the TV refuses the subscription
+        """
+        if state_cache is None:
+            state_cache = rc.getStateCache()
+        subscription = _Subscription(rc, callback, state_cache)
+        # the first event may arrive before the subscription id is known
+        with self.__subscribe_lock:
+            self.__subscribe(subscription)
+        return subscription.sid
+
+    def unsubscribe(self, sid):
+        """Cancel a subscription
+
+        @param [str] sid  the subscription id
+        """
+        with self.__cond:
+            subscription = self.__subscriptions.pop(sid, None)
+        if subscription is not None:
+            subscription.rc.unsubscribe(sid)
+
+    def dispatch(self, sid, seq, body):
+        """Handle a NOTIFY request
+
+        @param [str] sid  the subscription id
+        @param [str] seq  the event sequence number
+        @param [bytes] body  the request body
+        @return [int] the HTTP status of the reply
+        """
+        subscription = self.__subscriptions.get(sid)
+        if subscription is None:
+            with self.__subscribe_lock:
+                subscription = self.__subscriptions.get(sid)
+            if subscription is None:
+                g_logger.debug("Event for unknown subscription %s", sid)
+                return 412
+        try:
+            states = convertStates(parseLastChange(body))
+        except xml_elm.ParseError as e:
+            g_logger.warning("Invalid event from %s : %s", subscription.rc.getHost(), str(e))
+            return 400
+        self.__checkSequence(subscription, seq)
+        if not states:
+            return 200
+        g_logger.debug("Event from %s : %s", subscription.rc.getHost(), states)
+        if subscription.state_cache is not None:
+            for name, value in states.items():
+                key = getStateKey(subscription.rc.getHost(), subscription.rc.getPort(), name)
+                subscription.state_cache.set(key, value)
+        if subscription.callback is not None:
+            try:
+                subscription.callback(subscription.rc, states)
+            except Exception as e:
+                g_logger.error("Event callback %r has failed : %s", subscription.callback, str(e))
+        return 200
+
+    @staticmethod
+    def __checkSequence(subscription, seq):
+        try:
+            seq = int(seq)
+        except (TypeError, ValueError):
+            return
+        if subscription.seq is not None and seq != subscription.seq + 1:
+            g_logger.warning("Events lost from %s : sequence %d after %d",
+                             subscription.rc.getHost(), seq, subscription.seq)
+        subscription.seq = seq
+
+    def __subscribe(self, subscription):
+        rc = subscription.rc
+        sid, timeout = rc.subscribe(self.getCallbackUrl(rc.getHost()), self.__timeout)
+        g_logger.info("Subscribed to events of %s for %ds", rc.getHost(), timeout)
+        with self.__cond:
+            if subscription.sid is not None:
+                self.__subscriptions.pop(subscription.sid, None)
+            subscription.sid = sid
+            subscription.seq = None
+            subscription.renew_at = monotonic() + timeout / 2.0
+            self.__subscriptions[sid] = subscription
+            self.__cond.notify_all()
+
+    def __renew(self, subscription):
+        """Renew a subscription, or make a new one if the TV has lost it
+        """
+        rc = subscription.rc
+        with self.__cond:
+            if self.__subscriptions.get(subscription.sid) is not subscription:
+                return
+        try:
+            timeout = rc.renewSubscription(subscription.sid, self.__timeout)
+            with self.__cond:
+                subscription.renew_at = monotonic() + timeout / 2.0
+            return
+        except RemoteControlException as e:
+            g_logger.warning("Unable to renew subscription to %s : %s", rc.getHost(), str(e))
+        try:
+            with self.__subscribe_lock:
+                self.__subscribe(subscription)
+        except RemoteControlException as e:
+            g_logger.error("Unable to subscribe again to %s : %s", rc.getHost(), str(e))
+            with self.__cond:
+                subscription.renew_at = monotonic() + RENEW_RETRY_DELAY
+
+    def __renewLoop(self):
+        while True:
+            with self.__cond:
+                while True:
+                    if not self.__running:
+                        return
+                    now = monotonic()
+                    due = [s for s in self.__subscriptions.values() if s.renew_at <= now]
+                    if due:
+                        break
+                    timeouts = [s.renew_at - now for s in self.__subscriptions.values()]
+                    self.__cond.wait(min(timeouts) if timeouts else None)
+            for subscription in due:
+                self.__renew(subscription)
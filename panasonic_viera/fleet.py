@@ -0,0 +1,175 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Project imports
+from .constants import ErrorCodes
+from .exceptions import RemoteControlException
+from .pool import ConnectionPool
+from .remote_control import RemoteControl, DEFAULT_PORT, DEFAULT_TIMEOUT
+from .utils import getLogger
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_MAX_WORKERS = 16
+
+
+class HostResult:
+    """The outcome of one command on one TV
+    """
+
+    def __init__(self, host, value=None, error=None):
+        self.host = host
+        self.value = value
+        self.error = error
+
+    def isSuccess(self):
+        """Return True if the command has succeeded on this TV
+        """
+        return self.error is None
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<HostResult {} error={!r}>'.format(self.host, self.error)
+        return '<HostResult {} value={!r}>'.format(self.host, self.value)
+
+
+class RemoteControlGroup:
+    """This is a remote control for a group of TVs
+
+    Each command is run on all TVs concurrently with a bounded number of
+    worker threads, so the whole group answers in about the time of the
+    slowest TV.
+
+    Usage:
+
+    >>> group = RemoteControlGroup(["192.168.1.2", "192.168.1.3"], deadline=3)
+    >>> results = group.setMute(True)
+    >>> [host for host, res in results.items() if not res.isSuccess()]
+    """
+
+    def __init__(self, hosts, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT,
+                 max_workers=DEFAULT_MAX_WORKERS, deadline=None, pool=None,
+                 breaker=None):
+        """Default constructor
+
+        @param [list] hosts  the hostnames/ip addresses of the TVs
+        @param [int] OPTIONAL port  the port of the TVs
+        @param [float] OPTIONAL timeout  the network timeout of each request
+        @param [int] OPTIONAL max_workers  the max number of TVs contacted
+                    at the same time
+        @param [float] OPTIONAL deadline  the max duration of a whole group
+                    command in seconds, None to wait for all TVs
+        @param [ConnectionPool|bool] OPTIONAL pool  the connection pool
+                    shared by all remote controls of the group, True to
+                    create one for the group
+        @param [CircuitBreaker] OPTIONAL breaker  the circuit breaker shared
+                    by all remote controls, dead TVs then fail immediately
+        """
+        self.__max_workers = max_workers
+        self.__deadline = deadline
+        self.__remotes = OrderedDict()
+        if pool is True:
+            pool = ConnectionPool()
+        for host in hosts:
+            self.__remotes[host] = RemoteControl(host, port, timeout, pool=pool,
+                                                 breaker=breaker)
+
+    def getHosts(self):
+        """Return the list of hosts of this group
+        """
+        return list(self.__remotes.keys())
+
+    def getRemoteControl(self, host):
+        """Return the remote control of one TV of the group
+        """
+        return self.__remotes[host]
+
+    def setDeadline(self, deadline):
+        self.__deadline = deadline
+
+    def execute(self, method, *args):
+        """Run a RemoteControl method on all TVs of the group
+
+        @param [str] method  the name of the RemoteControl method
+        @param [list] args  the arguments given to the method
+
+        @return [OrderedDict] a HostResult per host
+            The TVs which have not answered before the deadline get a
+            TV_UNREACHEABLE error
+
+        The deadline bounds the time until the results are returned. The
+        commands not yet sent are cancelled, but a request in flight cannot
+        be interrupted: it goes on in the background for at most the
+        network timeout and may still be applied by its TV.
+        """
+        results = OrderedDict()
+        if not self.__remotes:
+            return results
+        executor = ThreadPoolExecutor(max_workers=min(self.__max_workers, len(self.__remotes)))
+        futures = dict()
+        for host, rc in self.__remotes.items():
+            futures[executor.submit(getattr(rc, method), *args)] = host
+        done, not_done = wait(futures, timeout=self.__deadline)
+        cancelled = set(future for future in not_done if future.cancel())
+        executor.shutdown(wait=False)
+
+        for host in self.__remotes:
+            results[host] = HostResult(host)
+        for future in done:
+            host = futures[future]
+            try:
+                results[host].value = future.result()
+            except Exception as e:
+                results[host].error = e
+        for future in not_done:
+            host = futures[future]
+            if future in cancelled:
+                g_logger.error("Deadline exceeded before %s was sent to %s", method, host)
+                message = "The command has not been sent before the deadline."
+            else:
+                g_logger.error("Deadline exceeded for %s on %s", method, host)
+                message = "The TV has not answered before the deadline."
+            results[host].error = RemoteControlException(message, ErrorCodes.TV_UNREACHEABLE)
+        return results
+
+    def sendKey(self, key):
+        """Send a key command to all TVs
+
+        @param [str] key a predefined keys from Keys enum
+        @return [OrderedDict] a HostResult per host
+        """
+        return self.execute('sendKey', key)
+
+    def getVolume(self):
+        """Return the current volume level of all TVs
+
+        @return [OrderedDict] a HostResult per host
+        """
+        return self.execute('getVolume')
+
+    def setVolume(self, volume):
+        """Set a new volume level on all TVs
+
+        @param [int] the new value for volume
+        @return [OrderedDict] a HostResult per host
+        """
+        return self.execute('setVolume', volume)
+
+    def getMute(self):
+        """Return the mute status of all TVs
+
+        @return [OrderedDict] a HostResult per host
+        """
+        return self.execute('getMute')
+
+    def setMute(self, enable):
+        """Mute or unmute all TVs
+
+        @param [bool] true if mute must be enabled, false if not
+        @return [OrderedDict] a HostResult per host
+        """
+        return self.execute('setMute', enable)
@@ -0,0 +1,430 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+from concurrent.futures import Future, ThreadPoolExecutor
+import concurrent.futures
+import heapq
+import itertools
+import threading
+
+# Project imports
+from .remote_control import (getKeyTemplate, getKeyValue, checkVolume, STATE_KEYS,
+                             SET_VOLUME_TEMPLATE, SET_MUTE_TEMPLATES)
+from .state import getStateKey
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+# Default delay between two steps whose delay is not given
+DEFAULT_INTERVAL = 0.0
+
+# Raised when a cancelled future is resolved
+InvalidStateError = getattr(concurrent.futures, 'InvalidStateError', RuntimeError)
+
+
+class MacroStep:
+    """A compiled step of a macro
+
+    The SOAP request is built when the step is added to the macro, so
+    running a step only writes the precomputed bytes. 'offset' is the time
+    in seconds between the start of the macro and the start of this step.
+    """
+
+    def __init__(self, action, offset, template=None, value=None, states=None):
+        """Default constructor
+
+        @param [str] action  a description of the step, like 'NRC_MUTE-ONOFF'
+        @param [float] offset  the start time of the step in the macro
+        @param [SoapTemplate] OPTIONAL template  the request, None to only wait
+        @param [object] OPTIONAL value  the variable argument of the template
+        @param [dict] OPTIONAL states  the cached states changed by the step,
+                    a None value invalidates the state
+        """
+        self.action = action
+        self.offset = offset
+        self.template = template
+        self.value = value
+        self.states = states or dict()
+
+    def __repr__(self):
+        return '<MacroStep {} at +{:.3f}s>'.format(self.action, self.offset)
+
+    def run(self, rc):
+        """Send the request of this step to a TV
+
+        @param [RemoteControl] rc  the remote control of the TV
+        """
+        if self.template is None:
+            return
+        cache = rc.getStateCache()
+        try:
+            rc.sendTemplate(self.template, self.value)
+        except Exception:
+            if cache is not None:
+                for name in self.states:
+                    cache.invalidate(getStateKey(rc.getHost(), rc.getPort(), name))
+            raise
+        if cache is not None:
+            for name, value in self.states.items():
+                key = getStateKey(rc.getHost(), rc.getPort(), name)
+                if value is None:
+                    cache.invalidate(key)
+                else:
+                    cache.set(key, value)
+
+
+class Macro:
+    """This is a sequence of keys, volume and mute actions with their delays
+
+    Each step is compiled into its SOAP request when it is added. The delay
+    of a step is counted from the start of the previous step, so the time
+    taken by the network is not added to the waits when the macro is run by
+    a MacroRunner.
+
+    Usage:
+
+    >>> macro = Macro(interval=0.3)
+    >>> macro.keys([Keys.NUM_1, Keys.NUM_2]).key(Keys.ENTER, delay=0.5)
+    >>> macro.setVolume(20)
+    """
+
+    def __init__(self, name=None, interval=DEFAULT_INTERVAL):
+        """Default constructor
+
+        @param [str] OPTIONAL name  the name of the macro, used in the logs
+        @param [float] OPTIONAL interval  the delay used for the steps added
+                    without one, the first step starts at once
+        """
+        self.__name = name
+        self.__interval = interval
+        self.__steps = []
+        self.__offset = 0.0
+        self.__pending_delay = 0.0
+
+    def __repr__(self):
+        return '<Macro {} with {} steps>'.format(self.__name, len(self.__steps))
+
+    def __len__(self):
+        return len(self.getSteps())
+
+    def getName(self):
+        return self.__name
+
+    def getSteps(self):
+        """Return the compiled steps
+
+        @return [list] the MacroStep, a last step without request is added
+                    when the macro ends with a wait
+        """
+        if self.__pending_delay > 0:
+            return self.__steps + [MacroStep('wait', self.__offset + self.__pending_delay)]
+        return list(self.__steps)
+
+    def getDuration(self):
+        """Return the planned duration of the macro in seconds, network excluded
+        """
+        steps = self.getSteps()
+        return steps[-1].offset if steps else 0.0
+
+    def wait(self, delay):
+        """Add a delay before the next step
+
+        @param [float] delay  the delay in seconds
+        @return [Macro] this macro
+        """
+        if delay < 0:
+            raise ValueError("A delay cannot be negative")
+        self.__pending_delay += delay
+        return self
+
+    def key(self, key, delay=None):
+        """Add a key press
+
+        @param [Keys|str] key  the key to send
+        @param [float] OPTIONAL delay  the delay from the previous step
+        @return [Macro] this macro
+        """
+        states = dict.fromkeys(STATE_KEYS.get(getKeyValue(key), ()))
+        return self.__add(getKeyValue(key), delay, getKeyTemplate(key), None, states)
+
+    def keys(self, keys, delay=None):
+        """Add several key presses
+
+        @param [list] keys  the keys to send
+        @param [float] OPTIONAL delay  the delay before each key
+        @return [Macro] this macro
+        """
+        for key in keys:
+            self.key(key, delay)
+        return self
+
+    def setVolume(self, volume, delay=None):
+        """Add a volume change
+
+        @param [int] volume  the new value for volume
+        @param [float] OPTIONAL delay  the delay from the previous step
+        @return [Macro] this macro
+        """
+        checkVolume(volume)
+        return self.__add('SetVolume', delay, SET_VOLUME_TEMPLATE, volume,
+                          dict(volume=volume))
+
+    def setMute(self, enable, delay=None):
+        """Add a mute change
+
+        @param [bool] enable  true if mute must be enabled, false if not
+        @param [float] OPTIONAL delay  the delay from the previous step
+        @return [Macro] this macro
+        """
+        return self.__add('SetMute', delay, SET_MUTE_TEMPLATES[bool(enable)], None,
+                          dict(mute=bool(enable)))
+
+    def __add(self, action, delay, template, value, states):
+        if delay is None:
+            delay = self.__interval if self.__steps else 0.0
+        elif delay < 0:
+            raise ValueError("A delay cannot be negative")
+        if self.__steps or self.__pending_delay:
+            self.__offset += self.__pending_delay + delay
+        else:
+            self.__offset = delay
+        self.__pending_delay = 0.0
+        self.__steps.append(MacroStep(action, self.__offset, template, value, states))
+        return self
+
+
+class StepTiming:
+    """The timing report of a macro step
+
+    The times come from the monotonic clock.
+    """
+
+    def __init__(self, index, action, scheduled, started, finished, error=None):
+        self.index = index
+        self.action = action
+        self.scheduled = scheduled
+        self.started = started
+        self.finished = finished
+        self.error = error
+
+    def __repr__(self):
+        return '<StepTiming {} {} late {:.3f}s took {:.3f}s{}>'.format(
+            self.index, self.action, self.getLateness(), self.getDuration(),
+            ' failed' if self.error is not None else '')
+
+    def getLateness(self):
+        """Return the delay in seconds between the planned and the real start
+        """
+        return self.started - self.scheduled
+
+    def getDuration(self):
+        """Return the time in seconds taken by the request
+        """
+        return self.finished - self.started
+
+
+class _Execution:
+    """A macro being run on a TV
+    """
+
+    def __init__(self, rc, macro, start, on_step, stop_on_error):
+        self.rc = rc
+        self.name = macro.getName()
+        self.steps = macro.getSteps()
+        self.start = start
+        self.on_step = on_step
+        self.stop_on_error = stop_on_error
+        self.index = 0
+        self.timings = []
+        self.future = Future()
+
+    def getDeadline(self):
+        return self.start + self.steps[self.index].offset
+
+
+class MacroRunner:
+    """This is a timer running many macros on many TVs from one thread
+
+    Each step starts at the start time of its macro plus its offset, so the
+    time spent in the previous requests is subtracted from the waits. A late
+    step is sent at once and the lateness is reported in its StepTiming.
+    The steps of a macro are always sent in order. By default the requests
+    are sent by the timer thread itself; give 'max_workers' to send them
+    from a thread pool so a slow TV does not delay the other macros.
+
+    Each run returns a Future resolved with the list of StepTiming once the
+    macro has ended. Cancelling the future stops the macro before its next
+    step.
+
+    Usage:
+
+    >>> runner = MacroRunner()
+    >>> future = runner.run(rc, macro, on_step=print)
+    >>> future.cancel()
+    """
+
+    def __init__(self, max_workers=0):
+        """Default constructor
+
+        @param [int] OPTIONAL max_workers  the number of threads sending the
+                    requests, 0 to send them from the timer thread
+        """
+        self.__heap = []
+        self.__counter = itertools.count()
+        self.__active = set()
+        self.__closed = False
+        self.__purge = False
+        self.__cond = threading.Condition()
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers else None
+        self.__thread = threading.Thread(target=self.__run, name='viera-macro')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def getActiveCount(self):
+        """Return the number of macros scheduled or running
+        """
+        with self.__cond:
+            return len(self.__active)
+
+    def run(self, rc, macro, on_step=None, delay=0.0, stop_on_error=True):
+        """Schedule a macro on a TV
+
+        @param [RemoteControl] rc  the remote control of the TV
+        @param [Macro] macro  the macro to run
+        @param [callable] OPTIONAL on_step  called as on_step(rc, timing) after
+                    each step, from the thread which has sent it
+        @param [float] OPTIONAL delay  the delay in seconds before the first step
+        @param [bool] OPTIONAL stop_on_error  end the macro with the error of
+                    the first failed step, else go on and only report it
+        @return [Future] resolved with the list of StepTiming
+        """
+        execution = _Execution(rc, macro, monotonic() + delay, on_step, stop_on_error)
+        if not execution.steps:
+            execution.future.set_result([])
+            return execution.future
+        execution.future.add_done_callback(self.__onDone)
+        with self.__cond:
+            if self.__closed:
+                raise RuntimeError("The macro runner is closed")
+            self.__active.add(execution)
+            heapq.heappush(self.__heap, (execution.getDeadline(), next(self.__counter), execution))
+            self.__cond.notify()
+        return execution.future
+
+    def cancelAll(self):
+        """Cancel all the macros scheduled or running
+        """
+        with self.__cond:
+            executions = list(self.__active)
+        for execution in executions:
+            execution.future.cancel()
+
+    def close(self, timeout=None):
+        """Let the scheduled macros end and stop the timer thread
+        """
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify()
+        self.__thread.join(timeout)
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+
+    def __onDone(self, future):
+        if future.cancelled():
+            with self.__cond:
+                self.__purge = True
+                self.__cond.notify()
+
+    def __next(self):
+        """Wait for the next due step
+
+        @return [tuple] the deadline and the execution, None when closed
+        """
+        with self.__cond:
+            while True:
+                if self.__purge:
+                    self.__purge = False
+                    self.__dropCancelled()
+                if self.__heap:
+                    deadline, _, execution = self.__heap[0]
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        heapq.heappop(self.__heap)
+                        return deadline, execution
+                    self.__cond.wait(remaining)
+                elif self.__closed and not self.__active:
+                    return None
+                else:
+                    self.__cond.wait()
+
+    def __dropCancelled(self):
+        heap = []
+        for item in self.__heap:
+            if item[2].future.cancelled():
+                g_logger.debug("Macro %s cancelled on %s", item[2].name, item[2].rc.getHost())
+                self.__active.discard(item[2])
+            else:
+                heap.append(item)
+        heapq.heapify(heap)
+        self.__heap = heap
+
+    def __run(self):
+        while True:
+            item = self.__next()
+            if item is None:
+                return
+            deadline, execution = item
+            if self.__executor is None:
+                self.__step(execution, deadline)
+            else:
+                self.__executor.submit(self.__step, execution, deadline)
+
+    def __step(self, execution, deadline):
+        step = execution.steps[execution.index]
+        started = monotonic()
+        error = None
+        try:
+            step.run(execution.rc)
+        except Exception as e:
+            g_logger.error("Macro %s step %d has failed on %s : %s",
+                           execution.name, execution.index, execution.rc.getHost(), str(e))
+            error = e
+        timing = StepTiming(execution.index, step.action, deadline, started, monotonic(), error)
+        execution.timings.append(timing)
+        if execution.on_step is not None:
+            try:
+                execution.on_step(execution.rc, timing)
+            except Exception as e:
+                g_logger.error("Macro step callback %r has failed : %s", execution.on_step, str(e))
+
+        execution.index += 1
+        resolve = None
+        with self.__cond:
+            if execution.future.cancelled():
+                self.__active.discard(execution)
+            elif error is not None and execution.stop_on_error:
+                self.__active.discard(execution)
+                resolve = (execution.future.set_exception, error)
+            elif execution.index >= len(execution.steps):
+                self.__active.discard(execution)
+                resolve = (execution.future.set_result, execution.timings)
+            else:
+                heapq.heappush(self.__heap, (execution.getDeadline(), next(self.__counter), execution))
+            self.__cond.notify()
+        if resolve is not None:
+            self.__resolve(*resolve)
+
+    @staticmethod
+    def __resolve(method, value):
+        try:
+            method(value)
+        except InvalidStateError:
+            # cancelled during the last step
+            pass
@@ -0,0 +1,227 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import bisect
+import threading
+import time
+
+# Project imports
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+OUTCOME_SUCCESS = 'success'
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def getCodeName(code):
+    """Return the name of an ErrorCodes member
+
+    @param [ErrorCodes] code  the error code
+    @return [str] the name, like 'TV_UNREACHEABLE'
+    """
+    return getattr(code, 'name', str(code))
+
+
+def escapeLabel(value):
+    """Escape a label value of the Prometheus text format
+
+    @param [object] value  the label value
+    @return [str] the value with its backslashes, double quotes and line
+                  feeds escaped
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def getOutcome(exception):
+    """Return the outcome name of a failed request
+
+    @param [RemoteControlException] exception  the raised exception
+    @return [str] the name of the error code, like 'TV_UNREACHEABLE'
+    """
+    if len(exception.args) > 1:
+        return getCodeName(exception.args[1])
+    return type(exception).__name__
+
+
+class RequestEvent:
+    """The measures of one request sent to a TV
+
+    Timings are in seconds, measured on the monotonic clock, and start is
+    the wall clock time of the request, only used as a timestamp.
+    connect_time is None when an already opened
+    connection has been used or when the transport cannot measure it.
+    bytes_sent is the full request for pooled connections and HTTP GET
+    requests, without the headers added by urllib, and the body only for
+    urllib SOAP requests. retries is the number of new attempts made
+    by the AdaptivePolicy.
+    """
+
+    def __init__(self, host, action, urn=None):
+        self.host = host
+        self.action = action
+        self.urn = urn
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connect_time = None
+        self.ttfb = None
+        self.total_time = None
+        self.outcome = None
+        self.retries = 0
+        self.start = time.time()
+        self.__clock = monotonic()
+
+    def getElapsed(self):
+        """Return the time in seconds since the request has started
+        """
+        return monotonic() - self.__clock
+
+    def finish(self, outcome, bytes_received=0):
+        """Set the final measures of the request
+        """
+        self.total_time = self.getElapsed()
+        self.outcome = outcome
+        self.bytes_received = bytes_received
+
+
+class Instrumentation:
+    """This is a set of hooks called around each request
+
+    Pre request hooks receive the RequestEvent before anything is sent,
+    post request hooks receive it once the outcome is known. Errors raised
+    by hooks are logged and never reach the caller.
+    """
+
+    def __init__(self):
+        self.__pre_hooks = []
+        self.__post_hooks = []
+
+    def addPreRequestHook(self, callback):
+        self.__pre_hooks.append(callback)
+
+    def addPostRequestHook(self, callback):
+        self.__post_hooks.append(callback)
+
+    def removeHook(self, callback):
+        for hooks in (self.__pre_hooks, self.__post_hooks):
+            if callback in hooks:
+                hooks.remove(callback)
+
+    def before(self, event):
+        self.__call(self.__pre_hooks, event)
+
+    def after(self, event):
+        self.__call(self.__post_hooks, event)
+
+    @staticmethod
+    def __call(hooks, event):
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                g_logger.error("Instrumentation hook %r has failed : %s", hook, str(e))
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In process metrics of the requests sent to the TVs
+
+    It keeps a latency histogram per (host, action) and counters of
+    requests per outcome. Register it with an Instrumentation:
+
+    >>> registry = MetricsRegistry()
+    >>> instrumentation.addPostRequestHook(registry.observe)
+    >>> print(registry.exportPrometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.__buckets = buckets
+        self.__lock = threading.Lock()
+        self.__histograms = dict()
+        self.__requests = dict()
+        self.__bytes_sent = dict()
+        self.__bytes_received = dict()
+        self.__retries = dict()
+
+    def observe(self, event):
+        """Record a finished RequestEvent
+        """
+        key = (event.host, event.action)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram(self.__buckets)
+            if event.total_time is not None:
+                histogram.observe(event.total_time)
+            outcome_key = key + (event.outcome,)
+            self.__requests[outcome_key] = self.__requests.get(outcome_key, 0) + 1
+            self.__bytes_sent[key] = self.__bytes_sent.get(key, 0) + event.bytes_sent
+            self.__bytes_received[key] = self.__bytes_received.get(key, 0) + event.bytes_received
+            if event.retries:
+                self.__retries[key] = self.__retries.get(key, 0) + event.retries
+
+    def getRequestCount(self, host=None, action=None, outcome=None):
+        """Return the number of requests matching the given labels
+        """
+        with self.__lock:
+            return sum(count for (h, a, o), count in self.__requests.items()
+                       if (host is None or h == host) and
+                          (action is None or a == action) and
+                          (outcome is None or o == outcome))
+
+    def getHistogram(self, host, action):
+        """Return the latency Histogram of an action on a TV, or None
+        """
+        return self.__histograms.get((host, action))
+
+    def exportPrometheus(self):
+        """Export all metrics in the Prometheus text format
+
+        @return [str] the exposition text
+        """
+        lines = []
+        with self.__lock:
+            lines.append('# HELP viera_request_duration_seconds Duration of the requests sent to the TVs')
+            lines.append('# TYPE viera_request_duration_seconds histogram')
+            for (host, action), histogram in sorted(self.__histograms.items()):
+                labels = 'host="{}",action="{}"'.format(escapeLabel(host), escapeLabel(action))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('viera_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, cumulative))
+                lines.append('viera_request_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, histogram.count))
+                lines.append('viera_request_duration_seconds_sum{{{}}} {}'.format(labels, histogram.sum))
+                lines.append('viera_request_duration_seconds_count{{{}}} {}'.format(labels, histogram.count))
+
+            lines.append('# HELP viera_requests_total Requests sent to the TVs by outcome')
+            lines.append('# TYPE viera_requests_total counter')
+            for (host, action, outcome), count in sorted(self.__requests.items()):
+                lines.append('viera_requests_total{{host="{}",action="{}",outcome="{}"}} {}'.format(
+                    escapeLabel(host), escapeLabel(action), escapeLabel(outcome), count))
+
+            for name, values in (('viera_request_bytes_sent_total', self.__bytes_sent),
+                                 ('viera_response_bytes_received_total', self.__bytes_received),
+                                 ('viera_request_retries_total', self.__retries)):
+                lines.append('# TYPE {} counter'.format(name))
+                for (host, action), count in sorted(values.items()):
+                    lines.append('{}{{host="{}",action="{}"}} {}'.format(
+                        name, escapeLabel(host), escapeLabel(action), count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,431 @@
+# -*- coding: utf8 -*-
+
+"""
+    A local stand-in for a Panasonic Viera TV
+
+    It serves the SOAP control endpoints, the device description and
+    answers SSDP M-SEARCH requests, with configurable latency and failures.
+
+    Usage:
+
+    >>> from panasonic_viera.mock import MockTV
+    >>> with MockTV(latency=0.01) as tv:
+    ...     rc = panasonic_viera.RemoteControl(*tv.getAddress())
+    ...     rc.setVolume(12)
+"""
+
+# Systems imports
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from uuid import uuid4
+from xml.sax.saxutils import escape
+if sys.version_info[0] == 3:
+    from http.client import HTTPConnection, HTTPException
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse
+else:
+    from httplib import HTTPConnection, HTTPException
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse
+
+# Project imports
+from .remote_control import (URL_CONTROL_DMR, URL_CONTROL_NRC, URL_INFORMATION,
+                             URL_EVENT_DMR, SSDP_SEARCH_TARGET)
+from .utils import getLogger
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_MOCK_UUID = '4d454930-0200-1000-8001-a81374c9c2b6'
+
+# Delay between two checks of the stop flag by the SSDP thread
+SSDP_POLL_INTERVAL = 0.2
+
+RE_SOAP_ACTION = re.compile(r'#(\w+)')
+RE_KEY_EVENT = re.compile(br'<X_KeyEvent>([^<]*)</X_KeyEvent>')
+RE_DESIRED_VOLUME = re.compile(br'<DesiredVolume>(\d+)</DesiredVolume>')
+RE_DESIRED_MUTE = re.compile(br'<DesiredMute>([01])</DesiredMute>')
+RE_CALLBACK = re.compile(r'<([^>]+)>')
+
+DESCRIPTION = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<root xmlns="urn:schemas-upnp-org:device-1-0"'
+    ' xmlns:pana="urn:schemas-panasonic-com:pana">'
+    '<specVersion><major>1</major><minor>0</minor></specVersion>'
+    '<device>'
+    '<deviceType>urn:panasonic-com:device:p00RemoteController:1</deviceType>'
+    '<friendlyName>{name}</friendlyName>'
+    '<manufacturer>Panasonic</manufacturer>'
+    '<modelName>Panasonic VIErA</modelName>'
+    '<modelNumber>TX-MOCK</modelNumber>'
+    '<UDN>uuid:{uuid}</UDN>'
+    '<serviceList>'
+    '<service>'
+    '<serviceType>urn:panasonic-com:service:p00NetworkControl:1</serviceType>'
+    '<serviceId>urn:upnp-org:serviceId:p00NetworkControl</serviceId>'
+    '<SCPDURL>/nrc/sdd_0.xml</SCPDURL>'
+    '<controlURL>/nrc/control_0</controlURL>'
+    '<eventSubURL>/nrc/event_0</eventSubURL>'
+    '</service>'
+    '</serviceList>'
+    '</device>'
+    '</root>'
+)
+
+RESPONSE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+    ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    '<s:Body>'
+    '<u:{action}Response xmlns:u="urn:{urn}">'
+    '{params}'
+    '</u:{action}Response>'
+    '</s:Body>'
+    '</s:Envelope>'
+)
+
+FAULT = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+    ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    '<s:Body><s:Fault><faultcode>s:Client</faultcode>'
+    '<faultstring>UPnPError</faultstring><detail>'
+    '<UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+    '<errorCode>{code}</errorCode><errorDescription>{reason}</errorDescription>'
+    '</UPnPError></detail></s:Fault></s:Body></s:Envelope>'
+)
+
+
+LAST_CHANGE = (
+    '<Event xmlns="urn:schemas-upnp-org:metadata-1-0/RCS/">'
+    '<InstanceID val="0">'
+    '<Volume channel="Master" val="{volume}"/>'
+    '<Mute channel="Master" val="{mute}"/>'
+    '</InstanceID>'
+    '</Event>'
+)
+
+PROPERTY_SET = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0">'
+    '<e:property><LastChange>{}</LastChange></e:property>'
+    '</e:propertyset>'
+)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # the benchmarks open many connections at once
+    request_queue_size = 128
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Serve the requests of one connection to the mock TV
+    """
+    protocol_version = 'HTTP/1.1'
+    # write each response with a single send
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        g_logger.debug("MockTV %s : " + format, self.client_address[0], *args)
+
+    def do_GET(self):
+        tv = self.server.tv
+        if not tv.delay(self):
+            return
+        if self.path.lstrip('/') != URL_INFORMATION:
+            self.reply(404, b'')
+            return
+        self.reply(200, tv.description)
+
+    def do_POST(self):
+        tv = self.server.tv
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if not tv.delay(self):
+            return
+        match = RE_SOAP_ACTION.search(self.headers.get('SOAPAction', ''))
+        action = match.group(1) if match else None
+        status, res = tv.handle(self.path.lstrip('/'), action, body)
+        self.reply(status, res)
+        if status == 200 and action in ('SetVolume', 'SetMute'):
+            tv.publish()
+
+    def do_SUBSCRIBE(self):
+        tv = self.server.tv
+        if self.path.lstrip('/') != URL_EVENT_DMR:
+            self.reply(404, b'')
+            return
+        match = RE_CALLBACK.search(self.headers.get('CALLBACK', ''))
+        sid = tv.subscribe(self.headers.get('SID'), match.group(1) if match else None)
+        if sid is None:
+            self.reply(412, b'')
+            return
+        self.send_response(200)
+        self.send_header('SID', sid)
+        self.send_header('TIMEOUT', self.headers.get('TIMEOUT', 'Second-300'))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        if self.headers.get('SID') is None:
+            tv.publish([sid])
+
+    def do_UNSUBSCRIBE(self):
+        tv = self.server.tv
+        self.reply(200 if tv.unsubscribe(self.headers.get('SID')) else 412, b'')
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset="utf-8"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockTV:
+    """This is a fake TV listening on a local address
+
+    The behaviour is tuned with:
+        latency     the delay in seconds added before each response
+        error_rate  the probability for a SOAP request to fail with HTTP 500
+        drop_rate   the probability for a request to have its connection
+                    closed without any response
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, ssdp_port=0, latency=0.0,
+                 error_rate=0.0, drop_rate=0.0, volume=10, mute=False,
+                 uuid=DEFAULT_MOCK_UUID, name='Mock Viera'):
+        """Default constructor
+
+        @param [str] OPTIONAL host  the local address to listen on
+        @param [int] OPTIONAL port  the HTTP port, 0 for an ephemeral one
+        @param [int] OPTIONAL ssdp_port  the SSDP port, 0 for an ephemeral one
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.volume = volume
+        self.mute = mute
+        self.keys = []
+        self.requests = 0
+        self.uuid = uuid
+        self.description = DESCRIPTION.format(name=name, uuid=uuid).encode('utf-8')
+        self.__lock = threading.Lock()
+        self.__random = random.Random()
+        self.__boot_id = int(time.time())
+        self.__subscribers = dict()
+
+        self.__http = _ThreadingHTTPServer((host, port), _MockHandler)
+        self.__http.tv = self
+        self.__ssdp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__ssdp.bind((host, ssdp_port))
+        self.__ssdp.settimeout(SSDP_POLL_INTERVAL)
+        self.__threads = []
+        self.__running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def getAddress(self):
+        """Return the (host, port) couple of the HTTP server
+        """
+        return self.__http.server_address[:2]
+
+    def getSsdpAddress(self):
+        """Return the (host, port) couple which answers M-SEARCH requests
+        """
+        return self.__ssdp.getsockname()[:2]
+
+    def start(self):
+        """Start serving in background threads
+        """
+        self.__running = True
+        for target in (self.__http.serve_forever, self.__serveSsdp):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        """Stop the servers
+        """
+        self.__running = False
+        if self.__threads:
+            # shutdown() waits for serve_forever(), forever if it never ran
+            self.__http.shutdown()
+        self.__http.server_close()
+        self.__ssdp.close()
+
+    def delay(self, handler):
+        """Apply latency and connection drops to a request
+
+        @return [bool] False if the connection has been dropped
+        """
+        with self.__lock:
+            self.requests += 1
+            drop = self.__random.random() < self.drop_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if drop:
+            handler.close_connection = True
+            handler.connection.shutdown(socket.SHUT_RDWR)
+            return False
+        return True
+
+    def handle(self, url, action, body):
+        """Execute a SOAP action
+
+        @return [tuple] the HTTP status and the response body
+        """
+        with self.__lock:
+            if self.__random.random() < self.error_rate:
+                return 500, FAULT.format(code=501, reason='Action Failed').encode('utf-8')
+            if url == URL_CONTROL_NRC and action == 'X_SendKey':
+                match = RE_KEY_EVENT.search(body)
+                if match is None:
+                    return 500, FAULT.format(code=402, reason='Invalid Args').encode('utf-8')
+                self.keys.append(match.group(1).decode('utf-8'))
+                return 200, self.__response(action, 'panasonic-com:service:p00NetworkControl:1', '')
+            if url != URL_CONTROL_DMR:
+                return 404, b''
+            urn = 'schemas-upnp-org:service:RenderingControl:1'
+            if action == 'GetVolume':
+                return 200, self.__response(action, urn, '<CurrentVolume>{}</CurrentVolume>'.format(self.volume))
+            if action == 'SetVolume':
+                match = RE_DESIRED_VOLUME.search(body)
+                if match is None:
+                    return 500, FAULT.format(code=402, reason='Invalid Args').encode('utf-8')
+                self.volume = int(match.group(1))
+                return 200, self.__response(action, urn, '')
+            if action == 'GetMute':
+                return 200, self.__response(action, urn, '<CurrentMute>{}</CurrentMute>'.format(int(self.mute)))
+            if action == 'SetMute':
+                match = RE_DESIRED_MUTE.search(body)
+                if match is None:
+                    return 500, FAULT.format(code=402, reason='Invalid Args').encode('utf-8')
+                self.mute = match.group(1) == b'1'
+                return 200, self.__response(action, urn, '')
+        return 500, FAULT.format(code=401, reason='Invalid Action').encode('utf-8')
+
+    def subscribe(self, sid, callback):
+        """Register or renew an event subscriber
+
+        @param [str] sid  the subscription id of a renewal, else None
+        @param [str] callback  the url of a new subscriber
+        @return [str] the subscription id or None if the request is invalid
+        """
+        with self.__lock:
+            if sid is not None:
+                return sid if sid in self.__subscribers else None
+            if callback is None:
+                return None
+            sid = 'uuid:{}'.format(uuid4())
+            self.__subscribers[sid] = [callback, 0]
+        return sid
+
+    def unsubscribe(self, sid):
+        """Remove an event subscriber
+
+        @return [bool] False if the subscription is unknown
+        """
+        with self.__lock:
+            return self.__subscribers.pop(sid, None) is not None
+
+    def publish(self, sids=None):
+        """Send the current volume and mute to the event subscribers
+
+        @param [list] OPTIONAL sids  the subscriptions to notify, all by default
+        """
+        with self.__lock:
+            body = PROPERTY_SET.format(escape(LAST_CHANGE.format(
+                volume=self.volume, mute=int(self.mute)))).encode('utf-8')
+            messages = []
+            for sid, subscriber in self.__subscribers.items():
+                if sids is None or sid in sids:
+                    messages.append((sid, subscriber[0], subscriber[1]))
+                    subscriber[1] += 1
+        thread = threading.Thread(target=self.__sendEvents, args=(messages, body))
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def __sendEvents(messages, body):
+        for sid, callback, seq in messages:
+            url = urlparse(callback)
+            conn = HTTPConnection(url.hostname, url.port, timeout=2)
+            try:
+                conn.request('NOTIFY', url.path or '/', body, {
+                    'Content-Type': 'text/xml; charset="utf-8"',
+                    'NT': 'upnp:event',
+                    'NTS': 'upnp:propchange',
+                    'SID': sid,
+                    'SEQ': str(seq),
+                })
+                conn.getresponse().read()
+            except (socket.error, HTTPException) as e:
+                g_logger.debug("MockTV event to %s has failed : %s", callback, str(e))
+            finally:
+                conn.close()
+
+    @staticmethod
+    def __response(action, urn, params):
+        return RESPONSE.format(action=action, urn=urn, params=params).encode('utf-8')
+
+    def notify(self, addr, nts='ssdp:alive', max_age=1800):
+        """Send a SSDP NOTIFY message as a TV does on the multicast group
+
+        @param [tuple] addr  the (address, port) couple of the receiver
+        @param [str] OPTIONAL nts  'ssdp:alive' or 'ssdp:byebye'
+        @param [int] OPTIONAL max_age  the announced lifetime in seconds
+        """
+        message = self.__ssdpMessage('NOTIFY * HTTP/1.1',
+                                     'NT: {}\r\nNTS: {}'.format(SSDP_SEARCH_TARGET, nts),
+                                     max_age)
+        self.__ssdp.sendto(message, addr)
+
+    def __ssdpMessage(self, start_line, extra, max_age=1800):
+        host, port = self.getAddress()
+        return (
+            '{start_line}\r\n'
+            'CACHE-CONTROL: max-age={max_age}\r\n'
+            'EXT:\r\n'
+            'LOCATION: http://{host}:{port}/{url}\r\n'
+            'SERVER: Linux/4.0 UPnP/1.1 Panasonic-MIL-DLNA-SV/1.0\r\n'
+            '{extra}\r\n'
+            'USN: uuid:{uuid}::{target}\r\n'
+            'BOOTID.UPNP.ORG: {boot_id}\r\n'
+            '\r\n'
+        ).format(start_line=start_line, max_age=max_age, host=host, port=port,
+                 url=URL_INFORMATION, extra=extra, target=SSDP_SEARCH_TARGET,
+                 uuid=self.uuid, boot_id=self.__boot_id).encode('utf-8')
+
+    def __serveSsdp(self):
+        """Answer the M-SEARCH requests
+        """
+        while self.__running:
+            try:
+                data, addr = self.__ssdp.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            if not data.startswith(b'M-SEARCH'):
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            reply = self.__ssdpMessage('HTTP/1.1 200 OK', 'ST: {}'.format(SSDP_SEARCH_TARGET))
+            try:
+                self.__ssdp.sendto(reply, addr)
+            except socket.error:
+                break
@@ -0,0 +1,173 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import random
+import threading
+
+# Project imports
+from .remote_control import DEFAULT_TIMEOUT, URL_INFORMATION
+from .utils import getLogger
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_MIN_TIMEOUT = 0.2
+DEFAULT_MAX_TIMEOUT = 5.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BUDGET = 5.0
+DEFAULT_RETRY_BACKOFF = 0.05
+DEFAULT_MAX_RETRY_BACKOFF = 1.0
+
+# Gains of the latency estimators and variance factor, as in RFC 6298
+RTT_ALPHA = 1.0 / 8
+RTT_BETA = 1.0 / 4
+RTT_K = 4
+
+# Actions which can be sent twice without changing the TV
+IDEMPOTENT_ACTIONS = frozenset(('GetVolume', 'GetMute', URL_INFORMATION))
+
+# Action of the key requests, retried only on demand
+KEY_ACTION = 'X_SendKey'
+
+
+class _HostEstimate:
+    """The latency estimate of one TV
+    """
+
+    def __init__(self, timeout):
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = timeout
+        self.samples = 0
+        self.failures = 0
+
+
+class AdaptivePolicy:
+    """This is a timeout and retry policy which follows the latency of each TV
+
+    The timeout of a TV is computed as the TCP retransmission timeout, from
+    a moving average of its latency and of its variation, bounded by
+    'min_timeout' and 'max_timeout'. Each unreachable error doubles it until
+    the next successful request. Failed requests of the idempotent actions
+    are sent again after a jittered exponential delay, as long as the total
+    time spent stays within 'budget'. Keys are only sent again when
+    'retry_keys' is set, since a repeated key may be applied twice.
+
+    One policy can be shared by many RemoteControl instances.
+
+    Usage:
+
+    >>> policy = AdaptivePolicy(max_retries=2, budget=3.0)
+    >>> rc = RemoteControl("192.168.1.2", pool=True, policy=policy)
+    """
+
+    def __init__(self, initial_timeout=DEFAULT_TIMEOUT, min_timeout=DEFAULT_MIN_TIMEOUT,
+                 max_timeout=DEFAULT_MAX_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 budget=DEFAULT_BUDGET, backoff=DEFAULT_RETRY_BACKOFF,
+                 max_backoff=DEFAULT_MAX_RETRY_BACKOFF, retry_actions=IDEMPOTENT_ACTIONS,
+                 retry_keys=False):
+        """Default constructor
+
+        @param [float] OPTIONAL initial_timeout  the timeout of a TV without
+                    latency samples
+        @param [float] OPTIONAL min_timeout  the lowest timeout
+        @param [float] OPTIONAL max_timeout  the highest timeout
+        @param [int] OPTIONAL max_retries  the max number of new attempts
+        @param [float] OPTIONAL budget  the max time in seconds spent in a
+                    request and its retries
+        @param [float] OPTIONAL backoff  the delay before the first retry,
+                    doubled at each retry
+        @param [float] OPTIONAL max_backoff  the max delay between two attempts
+        @param [iterable] OPTIONAL retry_actions  the actions which may be
+                    retried, SOAP action names or urls
+        @param [bool] OPTIONAL retry_keys  retry the key requests too
+        """
+        self.__initial_timeout = float(initial_timeout)
+        self.__min_timeout = min_timeout
+        self.__max_timeout = max_timeout
+        self.__max_retries = max_retries
+        self.__budget = budget
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__retry_actions = frozenset(retry_actions) | (frozenset([KEY_ACTION]) if retry_keys else frozenset())
+        self.__estimates = dict()
+        self.__lock = threading.Lock()
+        self.__random = random.Random()
+
+    def getEstimate(self, host, port):
+        """Return the latency estimate of a TV
+
+        @return [dict] with keys 'srtt', 'rttvar', 'timeout', 'samples' and
+                    'failures', the latencies are None without samples
+        """
+        with self.__lock:
+            estimate = self.__estimate(host, port)
+            return dict(srtt=estimate.srtt, rttvar=estimate.rttvar, timeout=estimate.timeout,
+                        samples=estimate.samples, failures=estimate.failures)
+
+    def getTimeout(self, host, port, elapsed=0.0):
+        """Return the timeout of the next attempt
+
+        @param [str] host  the address of the TV
+        @param [int] port  the port of the TV
+        @param [float] OPTIONAL elapsed  the time already spent in the request
+        @return [float] the timeout in seconds, cut to the remaining budget
+        """
+        with self.__lock:
+            timeout = self.__estimate(host, port).timeout
+        return max(self.__min_timeout, min(timeout, self.__budget - elapsed))
+
+    def isRetryable(self, action):
+        """Tell if an action may be sent again after a failure
+        """
+        return action in self.__retry_actions
+
+    def getRetryDelay(self, action, attempt, elapsed):
+        """Return the delay before a new attempt
+
+        @param [str] action  the SOAP action or the url of the request
+        @param [int] attempt  the number of retries already made
+        @param [float] elapsed  the time already spent in the request
+        @return [float] the delay in seconds, or None if no retry is allowed
+        """
+        if action not in self.__retry_actions or attempt >= self.__max_retries:
+            return None
+        delay = min(self.__max_backoff, self.__backoff * (2 ** attempt))
+        delay *= self.__random.uniform(0.5, 1.0)
+        # the new attempt needs at least the min timeout to succeed
+        if elapsed + delay + self.__min_timeout > self.__budget:
+            return None
+        return delay
+
+    def recordLatency(self, host, port, latency):
+        """Update the estimate of a TV with the latency of a successful request
+        """
+        with self.__lock:
+            estimate = self.__estimate(host, port)
+            if estimate.srtt is None:
+                estimate.srtt = latency
+                estimate.rttvar = latency / 2.0
+            else:
+                estimate.rttvar = (1 - RTT_BETA) * estimate.rttvar + RTT_BETA * abs(estimate.srtt - latency)
+                estimate.srtt = (1 - RTT_ALPHA) * estimate.srtt + RTT_ALPHA * latency
+            estimate.samples += 1
+            estimate.failures = 0
+            estimate.timeout = self.__bound(estimate.srtt + RTT_K * estimate.rttvar)
+
+    def recordFailure(self, host, port):
+        """Back off the timeout of a TV after an unreachable error
+        """
+        with self.__lock:
+            estimate = self.__estimate(host, port)
+            estimate.failures += 1
+            estimate.timeout = self.__bound(estimate.timeout * 2)
+            g_logger.debug("Timeout of %s:%d backed off to %.3fs", host, port, estimate.timeout)
+
+    def __bound(self, timeout):
+        return max(self.__min_timeout, min(self.__max_timeout, timeout))
+
+    def __estimate(self, host, port):
+        estimate = self.__estimates.get((host, port))
+        if estimate is None:
+            estimate = self.__estimates[(host, port)] = _HostEstimate(self.__bound(self.__initial_timeout))
+        return estimate
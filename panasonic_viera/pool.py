@@ -0,0 +1,171 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import errno
+import socket
+import sys
+import threading
+if sys.version_info[0] == 3:
+    from http.client import HTTPResponse, HTTPException, BadStatusLine
+else:
+    from httplib import HTTPResponse, HTTPException, BadStatusLine
+
+# Project imports
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_POOL_SIZE = 2
+
+# Errors of a write on a socket already closed by the TV
+STALE_SEND_ERRNOS = (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED)
+
+
+class StaleConnectionError(HTTPException):
+    """The TV has closed the connection before reading the request
+    """
+    pass
+
+
+class ConnectionPool:
+    """This is a pool of keep-alive HTTP connections
+
+    Idle sockets are kept per (host, port) couple and reused by the next
+    request sent to the same TV. When the TV has dropped an idle socket,
+    which is detected before any byte of the response is received, the
+    request is sent again once on a fresh connection. A request is never
+    sent twice after a timeout, since the TV may have executed it.
+    """
+
+    def __init__(self, maxsize=DEFAULT_POOL_SIZE):
+        """Default constructor
+
+        @param [int] maxsize  the max number of idle sockets kept per TV
+        """
+        self.__maxsize = maxsize
+        self.__idle = dict()
+        self.__lock = threading.Lock()
+        self.__stats = dict(created=0, reused=0, reconnects=0, closed=0)
+
+    def getStats(self):
+        """Return the usage counters of this pool
+
+        @return [dict] with keys 'created', 'reused', 'reconnects', 'closed'
+        """
+        with self.__lock:
+            return dict(self.__stats)
+
+    def request(self, host, port, data, timeout, event=None):
+        """Send a raw HTTP request and read the response
+
+        @param [str] host  the hostname/ip address of the TV
+        @param [int] port  the port of the TV
+        @param [bytes] data  the full HTTP request (headers and body)
+        @param [float] timeout  the network timeout in seconds
+        @param [RequestEvent] OPTIONAL event  receives the connect time and
+                    the time to first byte
+
+        @return [tuple] the HTTP status code and the response body
+        @raise socket.error, HTTPException on network failures
+        """
+        sock, reused = self.__acquire(host, port, timeout, event)
+        try:
+            status, body, keep = self.__exchange(sock, data, timeout, event)
+        except (socket.error, HTTPException) as e:
+            self.__discard(sock)
+            if not reused or not isinstance(e, StaleConnectionError):
+                raise
+            # the TV has probably closed the idle socket, retry once
+            g_logger.debug("Pooled connection to %s:%d lost (%s), reconnecting", host, port, e)
+            self.__count('reconnects')
+            sock = self.__connect(host, port, timeout, event)
+            try:
+                status, body, keep = self.__exchange(sock, data, timeout, event)
+            except (socket.error, HTTPException):
+                self.__discard(sock)
+                raise
+        if keep:
+            self.__release(host, port, sock)
+        else:
+            self.__discard(sock)
+        return status, body
+
+    def close(self):
+        """Close all idle connections
+        """
+        with self.__lock:
+            idle = self.__idle
+            self.__idle = dict()
+        for sockets in idle.values():
+            for sock in sockets:
+                self.__discard(sock)
+
+    def __count(self, name):
+        with self.__lock:
+            self.__stats[name] += 1
+
+    def __acquire(self, host, port, timeout, event):
+        """Take an idle socket for this TV or open a new one
+        """
+        with self.__lock:
+            sockets = self.__idle.get((host, port))
+            if sockets:
+                self.__stats['reused'] += 1
+                return sockets.pop(), True
+        return self.__connect(host, port, timeout, event), False
+
+    def __connect(self, host, port, timeout, event=None):
+        g_logger.debug("Open new connection to %s:%d", host, port)
+        start = monotonic()
+        sock = socket.create_connection((host, port), timeout)
+        if event is not None:
+            event.connect_time = monotonic() - start
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__count('created')
+        return sock
+
+    def __release(self, host, port, sock):
+        with self.__lock:
+            sockets = self.__idle.setdefault((host, port), [])
+            if len(sockets) < self.__maxsize:
+                sockets.append(sock)
+                return
+        self.__discard(sock)
+
+    def __discard(self, sock):
+        try:
+            sock.close()
+        except socket.error:
+            pass
+        self.__count('closed')
+
+    @staticmethod
+    def __exchange(sock, data, timeout, event):
+        """Write the request on the socket and read the full response
+        """
+        sock.settimeout(timeout)
+        start = monotonic()
+        try:
+            sock.sendall(data)
+        except socket.timeout:
+            raise
+        except socket.error as e:
+            if e.errno in STALE_SEND_ERRNOS:
+                raise StaleConnectionError(str(e))
+            raise
+        res = HTTPResponse(sock, method='POST')
+        try:
+            try:
+                res.begin()
+            except BadStatusLine as e:
+                # an empty status line, the socket was closed without reply
+                if type(e).__name__ == 'RemoteDisconnected' or e.line in ('', "''"):
+                    raise StaleConnectionError(str(e))
+                raise
+            if event is not None:
+                event.ttfb = monotonic() - start
+            body = res.read()
+        finally:
+            res.close()
+        return res.status, body, not res.will_close
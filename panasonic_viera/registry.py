@@ -0,0 +1,353 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+from concurrent.futures import ThreadPoolExecutor
+import select
+import socket
+import threading
+
+# Project imports
+from .cache import getHeader, getMaxAge
+from .constants import DeviceEvent
+from .remote_control import (RemoteControl, buildDiscoveryRequest, parseDiscoveryResponse,
+                             DEFAULT_FIND_MULTICAST_ADDRESS, DEFAULT_FIND_MULTICAST_PORT,
+                             DEFAULT_FIND_WORKERS, DESCRIPTION_ERRORS, SSDP_SEARCH_TARGET,
+                             buildDevice)
+from .utils import getLogger, monotonic, extractUUID, getNeighborTable, isMulticastAddress
+
+# Global vars
+g_logger = getLogger()
+
+# Lifetime of a TV which does not announce its max-age
+DEFAULT_MAX_AGE = 1800
+# Delay between two active M-SEARCH requests
+DEFAULT_SEARCH_INTERVAL = 300
+# Max delay between two checks of the stop flag and of the expired TVs
+SERVICE_POLL_INTERVAL = 0.5
+
+NTS_ALIVE = 'ssdp:alive'
+NTS_BYEBYE = 'ssdp:byebye'
+
+
+def getDeviceKey(tv):
+    """Return the registry key of a TV dict
+
+    @return [str] the UUID of the TV, or its address when unknown
+    """
+    uuid = extractUUID(getHeader(tv['discovery'], 'USN') or '')
+    return uuid or tv['address']
+
+
+class TVRegistry:
+    """This is a live registry of the TVs present on the network
+
+    TVs are indexed by UUID, IP address and MAC address so each lookup is a
+    dict read. Each TV expires once its max-age has elapsed without a new
+    announcement. Listeners are called with a DeviceEvent and the TVDevice,
+    as returned by RemoteControl.find with records=True, on each change.
+    """
+
+    def __init__(self):
+        self.__devices = dict()
+        self.__expires = dict()
+        self.__by_address = dict()
+        self.__by_mac = dict()
+        self.__listeners = []
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__devices)
+
+    def addListener(self, callback):
+        """Register a function called as callback(event, tv) on each change
+        """
+        self.__listeners.append(callback)
+
+    def removeListener(self, callback):
+        if callback in self.__listeners:
+            self.__listeners.remove(callback)
+
+    def getDevices(self):
+        """Return the list of known TVs
+        """
+        with self.__lock:
+            return list(self.__devices.values())
+
+    def getByUUID(self, uuid):
+        """Return the TV dict with this UUID, or None
+        """
+        return self.__devices.get(uuid.lower())
+
+    def getByAddress(self, address):
+        """Return the TV dict with this IP address, or None
+        """
+        key = self.__by_address.get(address)
+        return self.__devices.get(key) if key is not None else None
+
+    def getByMac(self, mac):
+        """Return the TV dict with this MAC address, or None
+        """
+        key = self.__by_mac.get(mac.lower())
+        return self.__devices.get(key) if key is not None else None
+
+    def update(self, tv, max_age=DEFAULT_MAX_AGE):
+        """Add or replace a described TV
+
+        @param [dict] tv  the TV dict
+        @param [int] OPTIONAL max_age  the lifetime of the TV in seconds
+        """
+        key = getDeviceKey(tv)
+        with self.__lock:
+            previous = self.__devices.get(key)
+            if previous is not None:
+                self.__unindex(key, previous)
+            self.__devices[key] = tv
+            self.__expires[key] = monotonic() + max_age
+            self.__by_address[tv['address']] = key
+            if tv.get('mac'):
+                self.__by_mac[tv['mac'].lower()] = key
+        self.__notify(DeviceEvent.ADDED if previous is None else DeviceEvent.UPDATED, tv)
+
+    def touch(self, key, max_age=DEFAULT_MAX_AGE):
+        """Extend the lifetime of a known TV
+
+        @return [bool] False if the TV is unknown
+        """
+        with self.__lock:
+            if key not in self.__devices:
+                return False
+            self.__expires[key] = monotonic() + max_age
+            return True
+
+    def get(self, key):
+        """Return the TV dict with this registry key, or None
+        """
+        return self.__devices.get(key)
+
+    def remove(self, key):
+        """Remove a TV
+
+        @return [dict] the removed TV or None
+        """
+        with self.__lock:
+            tv = self.__devices.pop(key, None)
+            if tv is None:
+                return None
+            self.__unindex(key, tv)
+        self.__notify(DeviceEvent.REMOVED, tv)
+        return tv
+
+    def expire(self):
+        """Remove the TVs whose lifetime has elapsed
+
+        @return [float] the monotonic time of the next expiration or None
+        """
+        now = monotonic()
+        with self.__lock:
+            expired = [key for key, expires in self.__expires.items() if expires <= now]
+        for key in expired:
+            g_logger.info("TV %s has expired", key)
+            self.remove(key)
+        with self.__lock:
+            return min(self.__expires.values()) if self.__expires else None
+
+    def __unindex(self, key, tv):
+        self.__expires.pop(key, None)
+        if self.__by_address.get(tv['address']) == key:
+            del self.__by_address[tv['address']]
+        mac = (tv.get('mac') or '').lower()
+        if self.__by_mac.get(mac) == key:
+            del self.__by_mac[mac]
+
+    def __notify(self, event, tv):
+        for listener in list(self.__listeners):
+            try:
+                listener(event, tv)
+            except Exception as e:
+                g_logger.error("Registry listener %r has failed : %s", listener, str(e))
+
+
+class DiscoveryService:
+    """This is a background SSDP listener which keeps a TVRegistry up to date
+
+    It listens for the ssdp:alive and ssdp:byebye NOTIFY messages sent by
+    the TVs on the multicast group, and sends an M-SEARCH request every
+    'search_interval' seconds for the TVs which do not announce themselves.
+    A TV is described once, then its announcements only extend its
+    lifetime until its boot id or location changes.
+
+    Usage:
+
+    >>> service = DiscoveryService()
+    >>> service.start()
+    >>> tv = service.getRegistry().getByAddress("192.168.1.2")
+    """
+
+    def __init__(self, rc=None, registry=None,
+                 multicast_address=DEFAULT_FIND_MULTICAST_ADDRESS,
+                 multicast_port=DEFAULT_FIND_MULTICAST_PORT, listen_port=None,
+                 search_interval=DEFAULT_SEARCH_INTERVAL, max_workers=DEFAULT_FIND_WORKERS):
+        """Default constructor
+
+        @param [RemoteControl] OPTIONAL rc  the remote control used to fetch
+                    the descriptions, give it a DescriptionCache to share
+                    them with the other discovery methods
+        @param [TVRegistry] OPTIONAL registry  the registry to fill
+        @param [int] OPTIONAL listen_port  the local UDP port, by default
+                    the multicast port so the NOTIFY messages are received
+        @param [float] OPTIONAL search_interval  the delay in seconds between
+                    two M-SEARCH requests, None to only listen
+        @param [int] OPTIONAL max_workers  the max number of descriptions
+                    fetched at the same time
+        """
+        self.__rc = rc if rc is not None else RemoteControl()
+        self.__registry = registry if registry is not None else TVRegistry()
+        self.__multicast_address = multicast_address
+        self.__multicast_port = multicast_port
+        self.__listen_port = multicast_port if listen_port is None else listen_port
+        self.__search_interval = search_interval
+        self.__max_workers = max_workers
+        self.__arps = getNeighborTable()
+        self.__describing = set()
+        self.__lock = threading.Lock()
+        self.__sock = None
+        self.__thread = None
+        self.__executor = None
+        self.__running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def getRegistry(self):
+        return self.__registry
+
+    def start(self):
+        """Open the multicast socket and start listening in a background thread
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, True)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, True)
+        sock.bind((str(socket.INADDR_ANY), self.__listen_port))
+        if isMulticastAddress(self.__multicast_address):
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(self.__multicast_address) + socket.inet_aton(str(socket.INADDR_ANY)))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        self.__sock = sock
+        self.__executor = ThreadPoolExecutor(max_workers=self.__max_workers)
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='viera-discovery')
+        self.__thread.daemon = True
+        self.__thread.start()
+        g_logger.debug("Discovery service listening on port %d", sock.getsockname()[1])
+
+    def stop(self):
+        """Stop listening and close the socket
+        """
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+        if self.__sock is not None:
+            self.__sock.close()
+            self.__sock = None
+
+    def search(self):
+        """Send an M-SEARCH request now
+        """
+        g_logger.debug("Sending multicast discovery request")
+        try:
+            self.__sock.sendto(buildDiscoveryRequest(self.__multicast_address, self.__multicast_port),
+                               (self.__multicast_address, self.__multicast_port))
+        except socket.error as e:
+            g_logger.error("Unable to send discovery request : %s", str(e))
+
+    def handleDatagram(self, data, addr):
+        """Process one SSDP message
+
+        @param [bytes] data  the SSDP datagram payload
+        @param [tuple] addr  the address and port of the sender
+        """
+        if data.startswith(b'NOTIFY'):
+            is_notify = True
+        elif data.startswith(b'HTTP/'):
+            is_notify = False
+        else:
+            # M-SEARCH requests of other control points
+            return
+        try:
+            tv = parseDiscoveryResponse(data, addr, self.__arps)
+        except ValueError as e:
+            g_logger.debug("Invalid SSDP message from %s : %s", addr[0], str(e))
+            return
+        headers = tv['discovery']
+        key = getDeviceKey(tv)
+
+        if is_notify and getHeader(headers, 'NTS') == NTS_BYEBYE:
+            if self.__registry.remove(key) is not None:
+                g_logger.info("TV %s has left", key)
+            return
+
+        max_age = getMaxAge(headers) or DEFAULT_MAX_AGE
+        known = self.__registry.get(key)
+        if known is not None and self.__isSameBoot(known['discovery'], headers):
+            self.__registry.touch(key, max_age)
+            return
+        target = getHeader(headers, 'NT' if is_notify else 'ST')
+        if known is None and target != SSDP_SEARCH_TARGET:
+            return
+
+        with self.__lock:
+            if key in self.__describing or self.__executor is None:
+                return
+            self.__describing.add(key)
+        self.__executor.submit(self.__describe, key, tv, max_age)
+
+    @staticmethod
+    def __isSameBoot(old, new):
+        for name in ('BOOTID.UPNP.ORG', 'LOCATION'):
+            value = getHeader(new, name)
+            if value is not None and value != getHeader(old, name):
+                return False
+        return True
+
+    def __describe(self, key, tv, max_age):
+        try:
+            tv = buildDevice(tv, self.__rc.description(tv['address'], None, tv['discovery']))
+        except DESCRIPTION_ERRORS as e:
+            g_logger.error("Unable to describe TV %s : %s", tv['address'], str(e))
+            return
+        finally:
+            with self.__lock:
+                self.__describing.discard(key)
+        g_logger.info("Found TV %s", tv['address'])
+        self.__registry.update(tv, max_age)
+
+    def __run(self):
+        next_search = monotonic()
+        while self.__running:
+            now = monotonic()
+            if self.__search_interval is not None and now >= next_search:
+                self.search()
+                next_search = now + self.__search_interval
+            next_expiry = self.__registry.expire()
+            timeout = SERVICE_POLL_INTERVAL
+            if self.__search_interval is not None:
+                timeout = min(timeout, next_search - now)
+            if next_expiry is not None:
+                timeout = min(timeout, next_expiry - now)
+            try:
+                readable, _, _ = select.select([self.__sock], [], [], max(timeout, 0))
+                if not readable:
+                    continue
+                data, addr = self.__sock.recvfrom(2048)
+            except socket.error as e:
+                g_logger.error("Discovery service socket error : %s", str(e))
+                continue
+            self.handleDatagram(data, addr)
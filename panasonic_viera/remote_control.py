@@ -1,24 +1,40 @@
 # -*- coding: utf8 -*-
 
 # Systems imports
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from email.parser import Parser as HeadersParser
+import logging
 import re
 import socket
 import sys
+import time
 import xml.etree.ElementTree as xml_elm
+try:
+    import selectors
+except ImportError:
+    # backport for python 2
+    import selectors2 as selectors
 if sys.version_info[0] == 3:
     from urllib.request import urlopen, Request, URLError, HTTPError
+    from http.client import HTTPConnection, HTTPException
     from socketserver import UDPServer, BaseRequestHandler
     from io import StringIO
 else:
     from urllib2 import urlopen, Request, URLError, HTTPError
+    from httplib import HTTPConnection, HTTPException
     from SocketServer import UDPServer, BaseRequestHandler
     from StringIO import StringIO
 
 # Project imports
-from .constants import Keys, ErrorCodes
+from .constants import Keys, ErrorCodes, CircuitState
 from .utils import *
 from .exceptions import RemoteControlException, UserControlException
+from .pool import ConnectionPool
+from .soap import SoapTemplate, buildSoapBody, buildHostLine
+from .cache import getHeader, getMaxAge
+from .metrics import RequestEvent, getOutcome, OUTCOME_SUCCESS
+from .state import getStateKey
+from .device import TVDevice
 
 # Global vars
 g_logger = getLogger()
@@ -29,25 +45,305 @@ URN_REMOTE_CONTROL = 'panasonic-com:service:p00NetworkControl:1'
 URL_CONTROL_DMR = 'dmr/control_0'
 URL_CONTROL_NRC = 'nrc/control_0'
 URL_INFORMATION = 'nrc/ddd.xml'
+URL_EVENT_DMR = 'dmr/event_0'
 
 DEFAULT_PORT = 55000
 DEFAULT_TIMEOUT = 2
+# Lifetime in seconds of the GENA event subscriptions
+DEFAULT_SUBSCRIPTION_TIMEOUT = 300
 
-DEFAULT_FIND_LOCAL_PORT = 60000
+# 0 lets the system choose a free port for each search
+DEFAULT_FIND_LOCAL_PORT = 0
 DEFAULT_FIND_MULTICAST_ADDRESS = "239.255.255.250"
 DEFAULT_FIND_MULTICAST_PORT = 1900
+DEFAULT_FIND_WORKERS = 8
+# Max number of TCP connections in progress during a network sweep
+DEFAULT_SWEEP_PROBES = 256
+
+# Delay between two checks of the finished descriptions during discovery
+FIND_POLL_INTERVAL = 0.05
+
+
+PARAMS_MASTER_CHANNEL = '<InstanceID>0</InstanceID><Channel>Master</Channel>'
+
+SSDP_SEARCH_TARGET = 'urn:panasonic-com:device:p00RemoteController:1'
+
+RE_CURRENT_VOLUME = re.compile(br'<CurrentVolume>\s*(\d{1,3})\s*</CurrentVolume>')
+RE_CURRENT_MUTE = re.compile(br'<CurrentMute>\s*([01])\s*</CurrentMute>')
+RE_SUBSCRIPTION_TIMEOUT = re.compile(r'Second-(\d+)', re.IGNORECASE)
+
+
+def buildHttpRequest(host, port, query):
+    """Build the raw HTTP GET request of a TV resource
+
+    @param [str] host  the hostname/ip address of the TV
+    @param [int] port  the port of the TV
+    @param [str] query  the query part of the url
+
+    @return [bytes] the request ready to be written on a socket
+    """
+    return (
+        'GET /{query} HTTP/1.1\r\n'
+        'Host: {host}:{port}\r\n'
+        'Connection: close\r\n'
+        '\r\n'
+    ).format(query=query, host=host, port=port).encode('utf-8')
+
+
+def buildKeyParams(key):
+    """Build the arguments of a X_SendKey action
+
+    @param [Keys|str] key  the key to send
+    """
+    if isinstance(key, Keys):
+        key = key.value
+    return '<X_KeyEvent>{}</X_KeyEvent>'.format(key)
+
+
+def isUnreachableError(exception):
+    """Tell if an exception reports an unreachable TV
+
+    @param [RemoteControlException] exception  the raised exception
+    """
+    return len(exception.args) > 1 and exception.args[1] == ErrorCodes.TV_UNREACHEABLE
+
+
+def checkVolume(volume):
+    """Ensure a volume level is in the allowed range
+
+    @param [int] volume  the volume value
+    @raise UserControlException if the value is out of range
+    """
+    if volume > 100 or volume < 0:
+        raise UserControlException("Bad value for volume control. It must be between 0 and 100.")
+
+
+def buildVolumeParams(volume):
+    """Build the arguments of a SetVolume action
+
+    @param [int] volume  the new value for volume
+    """
+    checkVolume(volume)
+    return (PARAMS_MASTER_CHANNEL +
+            '<DesiredVolume>{}</DesiredVolume>').format(volume)
+
+
+def buildMuteParams(enable):
+    """Build the arguments of a SetMute action
+
+    @param [bool] enable  true if mute must be enabled, false if not
+    """
+    data = '1' if enable else '0'
+    return (PARAMS_MASTER_CHANNEL +
+            '<DesiredMute>{}</DesiredMute>').format(data)
+
+
+def getKeyValue(key):
+    """Return the string value of a key
+
+    @param [Keys|str] key  the key
+    """
+    if isinstance(key, Keys):
+        return key.value
+    return key
+
+
+def getKeyTemplate(key):
+    """Return the precomputed X_SendKey request of a key
+
+    @param [Keys|str] key  the key to send
+    @return [SoapTemplate] the request template
+    """
+    key = getKeyValue(key)
+    template = KEY_TEMPLATES.get(key)
+    if template is None:
+        template = SoapTemplate(URL_CONTROL_NRC, URN_REMOTE_CONTROL,
+                                'X_SendKey', buildKeyParams(key))
+    return template
+
+
+def parseVolumeResponse(res):
+    """Extract the volume level from a GetVolume response
+
+    @param [bytes] res  the SOAP response body
+    @return [int] the volume value
+    """
+    value = scanResponse(res, RE_CURRENT_VOLUME, b'GetVolumeResponse')
+    if value is not None:
+        return int(value)
+    root = xml_elm.fromstring(res)
+    el_volume = root.find('.//CurrentVolume')
+    return int(el_volume.text)
+
+
+def parseMuteResponse(res):
+    """Extract the mute status from a GetMute response
+
+    @param [bytes] res  the SOAP response body
+    @return [bool] the mute status
+    """
+    value = scanResponse(res, RE_CURRENT_MUTE, b'GetMuteResponse')
+    if value is not None:
+        return value != b'0'
+    root = xml_elm.fromstring(res)
+    el_mute = root.find('.//CurrentMute')
+    return el_mute.text != '0'
+
+
+def parseSubscriptionTimeout(value, default):
+    """Parse the TIMEOUT header of a GENA subscription response
+
+    @param [str] value  the header value, like 'Second-300'
+    @param [int] default  the value used for 'infinite' or a missing header
+    @return [int] the timeout in seconds
+    """
+    match = RE_SUBSCRIPTION_TIMEOUT.search(value or '')
+    if match:
+        return int(match.group(1))
+    return default
+
+
+def parseInformations(data):
+    """Parse the XML device description of the TV
+
+    @param [bytes] data  the content of the description file
+    @return [dict] the informations as returned by RemoteControl.informations
+    """
+    infos = dict()
+    infos['general'] = parseXMLInformationsFromBytes(data)
+    return infos
+
+
+# Precomputed requests of the common actions
+KEY_TEMPLATES = dict()
+for _key in getattr(Keys, '__members__', dict()).values():
+    KEY_TEMPLATES[_key.value] = SoapTemplate(URL_CONTROL_NRC, URN_REMOTE_CONTROL,
+                                             'X_SendKey', buildKeyParams(_key))
+GET_VOLUME_TEMPLATE = SoapTemplate(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
+                                   'GetVolume', PARAMS_MASTER_CHANNEL)
+SET_VOLUME_TEMPLATE = SoapTemplate(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
+                                   'SetVolume', PARAMS_MASTER_CHANNEL,
+                                   'DesiredVolume')
+GET_MUTE_TEMPLATE = SoapTemplate(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
+                                 'GetMute', PARAMS_MASTER_CHANNEL)
+SET_MUTE_TEMPLATES = {
+    True: SoapTemplate(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
+                       'SetMute', buildMuteParams(True)),
+    False: SoapTemplate(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
+                        'SetMute', buildMuteParams(False)),
+}
+
+# Cached states which may be changed by a key
+STATE_KEYS = {
+    getKeyValue(Keys.VOLUME_UP): ('volume', 'mute'),
+    getKeyValue(Keys.VOLUME_DOWN): ('volume', 'mute'),
+    getKeyValue(Keys.MUTE): ('mute',),
+}
+
+# Errors raised when the description of a TV cannot be retrieved
+DESCRIPTION_ERRORS = (RemoteControlException, socket.error, URLError,
+                      AttributeError, ValueError, xml_elm.ParseError)
+
+
+def buildDiscoveryRequest(multicast_address, multicast_port):
+    """Build the SSDP M-SEARCH datagram which looks for TVs
+
+    @return [bytes] the datagram payload
+    """
+    return (
+        'M-SEARCH * HTTP/1.1\r\n'
+        'HOST:{address}:{port}\r\n'
+        'MAN:"ssdp:discover"\r\n'
+        'ST:{target}\r\n'
+        'MX:1\r\n\r\n'
+    ).format(address=multicast_address, port=multicast_port,
+             target=SSDP_SEARCH_TARGET).encode('utf-8')
+
+
+def parseDiscoveryResponse(data, addr, arps):
+    """Build a TV dict from a SSDP reply
+
+    The 'informations' key is not filled by this function.
+
+    @param [bytes] data  the SSDP datagram payload
+    @param [tuple] addr  the address and port of the sender
+    @param [NeighborTable|dict] arps  the ARP table
+    @return [dict] the TV dict
+    """
+    request, head = data.decode().split('\r\n', 1)
+    g_logger.debug("Received response from %s : '''%s'''", addr, head)
+
+    headers = HeadersParser().parsestr(head, True)
+    tv = dict()
+    tv['address'] = addr[0]
+    tv['port'] = addr[1]
+    tv['mac'] = arps.get(tv['address'])
+    tv['discovery'] = dict(headers.items())
+    return tv
+
+
+def buildDevice(tv, description):
+    """Build the record of a discovered TV
+
+    @param [dict] tv  the TV dict as returned by parseDiscoveryResponse
+    @param [bytes] description  the content of the description file
+    @return [TVDevice] the record
+    @raise ValueError if the content is not a device description
+    """
+    device = TVDevice(tv['address'], tv['port'], tv['mac'], tv['discovery'], description)
+    if device.device_type is None:
+        raise ValueError("Invalid device description")
+    return device
 
 
 class RemoteControl:
     """This is a remote control client
     """
 
-    def __init__(self, host=None, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+    def __init__(self, host=None, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, pool=None, description_cache=None, instrumentation=None, breaker=None, state_cache=None, recorder=None, policy=None):
         """Default constructor
+
+        @param [str] OPTIONAL host  the hostname/ip address of the TV
+        @param [int] OPTIONAL port  the port of the TV
+        @param [float] OPTIONAL timeout  the network timeout in seconds
+        @param [ConnectionPool|bool] OPTIONAL pool  a pool of keep-alive
+                    connections used for SOAP requests. Give True to use
+                    a private pool, or share a ConnectionPool instance
+                    between several RemoteControl
+        @param [DescriptionCache] OPTIONAL description_cache  a cache for
+                    the TV description files used by informations()
+        @param [Instrumentation] OPTIONAL instrumentation  the hooks called
+                    around each request
+        @param [CircuitBreaker] OPTIONAL breaker  the circuit breaker which
+                    makes requests to dead TVs fail immediately
+        @param [StateCache] OPTIONAL state_cache  the cache of the volume
+                    and mute values
+        @param [TraceRecorder] OPTIONAL recorder  the recorder of the SOAP
+                    requests and responses
+        @param [AdaptivePolicy] OPTIONAL policy  the policy which sets the
+                    timeout of the SOAP and description requests from the
+                    latency of the TV, and retries them, instead of the
+                    static timeout
         """
         self.__host = host
         self.__port = port
         self.__timeout = timeout
+        if pool is True:
+            pool = ConnectionPool()
+        self.__pool = pool or None
+        self.__description_cache = description_cache
+        self.__instrumentation = instrumentation
+        self.__breaker = breaker
+        self.__state_cache = state_cache
+        self.__recorder = recorder
+        self.__policy = policy
+        self.__host_line = buildHostLine(host, port)
+
+    def getHost(self):
+        return self.__host
+
+    def getPort(self):
+        return self.__port
 
     def setTimeout(self, timeout):
         try:
@@ -55,62 +351,227 @@ class RemoteControl:
         except ValueError:
             g_logger.error("Unable to set network timeout with value : %s", timeout)
 
-    def find(self, multicast_address=DEFAULT_FIND_MULTICAST_ADDRESS, multicast_port=DEFAULT_FIND_MULTICAST_PORT, multicast_localport=DEFAULT_FIND_LOCAL_PORT):
+    def getPool(self):
+        """Return the connection pool used by this remote control
+
+        @return [ConnectionPool] the pool or None if disabled
+        """
+        return self.__pool
+
+    def getDescriptionCache(self):
+        """Return the description cache used by this remote control
+
+        @return [DescriptionCache] the cache or None if disabled
+        """
+        return self.__description_cache
+
+    def getInstrumentation(self):
+        """Return the instrumentation hooks of this remote control
+
+        @return [Instrumentation] the hooks or None if disabled
+        """
+        return self.__instrumentation
+
+    def getStateCache(self):
+        """Return the state cache used by this remote control
+
+        @return [StateCache] the cache or None if disabled
+        """
+        return self.__state_cache
+
+    def getRecorder(self):
+        """Return the trace recorder of this remote control
+
+        @return [TraceRecorder] the recorder or None if disabled
+        """
+        return self.__recorder
+
+    def getPolicy(self):
+        """Return the timeout and retry policy of this remote control
+
+        @return [AdaptivePolicy] the policy or None if the static timeout is used
+        """
+        return self.__policy
+
+    def getHostState(self):
+        """Return the circuit breaker state of the TV
+
+        @return [CircuitState] CLOSED when no breaker is used
+        """
+        if self.__breaker is None:
+            return CircuitState.CLOSED
+        return self.__breaker.getState(self.__host, self.__port)
+
+    def find(self, multicast_address=DEFAULT_FIND_MULTICAST_ADDRESS, multicast_port=DEFAULT_FIND_MULTICAST_PORT, multicast_localport=DEFAULT_FIND_LOCAL_PORT, max_workers=DEFAULT_FIND_WORKERS, interfaces=None, records=False):
         """Find a TV on the network
 
+        @param [bool] OPTIONAL records  return TVDevice records instead of
+                    dicts, see iterFind
+
         @return [list] the list of discovered TVs
             This list contains a dict per TV
             Each dict contains at least the 'address' key which contains the TV's IP address
         """
-        tvs = []
-        udpsock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        udpsock.settimeout(self.__timeout)
-        udpsock.setsockopt(socket.IPPROTO_IP, socket.SO_REUSEADDR, True)
-        udpsock.bind((str(socket.INADDR_ANY), multicast_localport))
-        udpsock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(multicast_address) + socket.inet_aton(str(socket.INADDR_ANY)))
-        udpsock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
-        udpsock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
-        g_logger.debug("UDP Multicast socket ready on request on %s : %d", socket.INADDR_ANY, multicast_localport)
-
-        arps = getArpTable()
-
-        find_body = (
-            'M-SEARCH * HTTP/1.1\r\n'
-            'HOST:{address}:{port}\r\n'
-            'MAN:"ssdp:discover"\r\n'
-            'ST:urn:panasonic-com:device:p00RemoteController:1\r\n'
-            'MX:1\r\n\r\n'
-        ).format(address=multicast_address, port=multicast_port).encode('utf-8')
-
+        return list(self.iterFind(multicast_address, multicast_port,
+                                  multicast_localport, max_workers, interfaces, records))
+
+    def iterFind(self, multicast_address=DEFAULT_FIND_MULTICAST_ADDRESS, multicast_port=DEFAULT_FIND_MULTICAST_PORT, multicast_localport=DEFAULT_FIND_LOCAL_PORT, max_workers=DEFAULT_FIND_WORKERS, interfaces=None, records=False):
+        """Find TVs on the network and yield them as soon as they are known
+
+        The M-SEARCH request is sent on each network interface from its own
+        socket, and all the SSDP replies are read by a single selector loop
+        until one overall timeout, while the description of each replying
+        TV is fetched by a pool of workers. A TV seen on several interfaces
+        is described once. A TV is yielded as soon as its description has
+        been retrieved.
+
+        @param [int] OPTIONAL multicast_localport  the local UDP port, 0 for
+                    an ephemeral one so concurrent searches do not collide
+        @param [int] OPTIONAL max_workers  the max number of descriptions
+                    fetched at the same time
+        @param [list] OPTIONAL interfaces  the IPv4 addresses of the local
+                    interfaces to search on, all interfaces by default
+        @param [bool] OPTIONAL records  yield the compact TVDevice records,
+                    which parse the description tree only on demand
+
+        @return [generator] the discovered TVs, same dicts as find()
+        """
+        if interfaces is None:
+            interfaces = getInterfaceAddresses(include_loopback=multicast_address.startswith('127.'))
+        selector = selectors.DefaultSelector()
+        find_body = buildDiscoveryRequest(multicast_address, multicast_port)
+        for interface in interfaces:
+            udpsock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            try:
+                udpsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, True)
+                udpsock.bind((interface, multicast_localport))
+                if isMulticastAddress(multicast_address):
+                    udpsock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+                    udpsock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+                    udpsock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+                g_logger.debug("Sending discovery request from %s:%d", *udpsock.getsockname()[:2])
+                udpsock.sendto(find_body, (multicast_address, multicast_port))
+            except socket.error as e:
+                g_logger.warning("Unable to search TVs from interface %s : %s", interface, str(e))
+                udpsock.close()
+                continue
+            selector.register(udpsock, selectors.EVENT_READ)
+
+        arps = getNeighborTable()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = dict()
+        seen = set()
         try:
-            g_logger.debug("Sending multicast discovery request")
-            udpsock.sendto(find_body, (multicast_address, multicast_port))
             g_logger.debug("Listen for incoming discovery replies")
-            while True:
-                data, addr = udpsock.recvfrom(2048)
-                request, head = data.decode().split('\r\n', 1)
-                g_logger.debug("Received response from %s : '''%s'''", addr, head)
-
-                headers = HeadersParser().parsestr(head, True)
-                tv = dict()
-                tv['address'] = addr[0]
-                tv['port'] = addr[1]
-                if tv['address'] in arps:
-                    tv['mac'] = arps[tv['address']]
-                else:
-                    tv['mac'] = None
-                tv['discovery'] = dict(headers.items())
-                tv['informations'] = self.informations(tv['address'])
-                fillComputedValues(tv)
-                tvs.append(tv)
-                g_logger.info("Found TV %s", tv['address'])
-        except (socket.timeout) as e:
-            g_logger.debug(str(e))
-            g_logger.info("No more TV's found")
-        except (socket.error, URLError) as e:
-            g_logger.fatal(str(e))
-        udpsock.close()
-        return tvs
+            deadline = monotonic() + self.__timeout
+            listening = bool(selector.get_map())
+            while listening or pending:
+                for future in [f for f in pending if f.done()]:
+                    tv = pending.pop(future)
+                    try:
+                        tv = buildDevice(tv, future.result())
+                    except DESCRIPTION_ERRORS as e:
+                        g_logger.fatal("Unable to describe TV %s : %s", tv['address'], str(e))
+                        continue
+                    g_logger.info("Found TV %s", tv['address'])
+                    yield tv if records else tv.toDict()
+
+                if not listening:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                    continue
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    g_logger.info("No more TV's found")
+                    listening = False
+                    continue
+                for key, _ in selector.select(min(remaining, FIND_POLL_INTERVAL)):
+                    try:
+                        data, addr = key.fileobj.recvfrom(2048)
+                    except socket.error as e:
+                        g_logger.fatal(str(e))
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                        listening = bool(selector.get_map())
+                        continue
+                    tv = parseDiscoveryResponse(data, addr, arps)
+                    usn = getHeader(tv['discovery'], 'USN') or tv['address']
+                    if usn in seen:
+                        continue
+                    seen.add(usn)
+                    pending[executor.submit(self.description, tv['address'], None, tv['discovery'])] = tv
+        finally:
+            executor.shutdown(wait=False)
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+
+    def sweep(self, network, port=None, timeout=None, max_probes=DEFAULT_SWEEP_PROBES, max_workers=DEFAULT_FIND_WORKERS, records=False):
+        """Find the TVs of a network without multicast
+
+        @param [str] network  the IPv4 network to sweep, like '192.168.1.0/24'
+        @return [list] the list of discovered TVs, same dicts as find()
+        """
+        return list(self.iterSweep(network, port, timeout, max_probes, max_workers, records))
+
+    def iterSweep(self, network, port=None, timeout=None, max_probes=DEFAULT_SWEEP_PROBES, max_workers=DEFAULT_FIND_WORKERS, records=False):
+        """Find the TVs of a network by probing their control port
+
+        Each address of the network is probed with a TCP connection on the
+        control port, many probes being in progress at the same time, then
+        the description of each responder is fetched by a pool of workers.
+        This works where multicast is filtered, the 'discovery' key of the
+        TV dicts is empty.
+
+        @param [str] network  the IPv4 network to sweep, like '192.168.1.0/24'
+        @param [int] OPTIONAL port  the control port, the one of this
+                    remote control by default
+        @param [float] OPTIONAL timeout  the deadline of each probe, the
+                    timeout of this remote control by default
+        @param [int] OPTIONAL max_probes  the max number of TCP probes in
+                    progress at the same time
+        @param [int] OPTIONAL max_workers  the max number of descriptions
+                    fetched at the same time
+        @param [bool] OPTIONAL records  yield TVDevice records instead of dicts
+
+        @return [generator] the discovered TVs, same dicts as find()
+        """
+        if port is None:
+            port = self.__port
+        if timeout is None:
+            timeout = self.__timeout
+        addresses = iterNetworkAddresses(network)
+        arps = getNeighborTable()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = dict()
+
+        def describe(future):
+            tv = pending.pop(future)
+            # the probe has just filled the kernel ARP cache
+            tv['mac'] = arps.get(tv['address'])
+            try:
+                tv = buildDevice(tv, future.result())
+            except DESCRIPTION_ERRORS as e:
+                g_logger.debug("Unable to describe %s : %s", tv['address'], str(e))
+                return None
+            g_logger.info("Found TV %s", tv['address'])
+            return tv if records else tv.toDict()
+
+        g_logger.debug("Sweeping %s on port %d", network, port)
+        try:
+            for address in iterOpenPorts(addresses, port, timeout, max_probes):
+                g_logger.debug("Port %d is open on %s", port, address)
+                tv = dict(address=address, port=port, mac=None, discovery=dict())
+                pending[executor.submit(self.description, address, port)] = tv
+                for future in [f for f in pending if f.done()]:
+                    tv = describe(future)
+                    if tv is not None:
+                        yield tv
+            for future in as_completed(list(pending)):
+                tv = describe(future)
+                if tv is not None:
+                    yield tv
+        finally:
+            executor.shutdown(wait=False)
 
     def soapRequest(self, url, urn, action, params):
         """Send a SOAP request to the TV.
@@ -121,42 +582,121 @@ class RemoteControl:
 
         @return [str] the response body
         """
-        soap_body = (
-            '<?xml version="1.0" encoding="utf-8"?>'
-            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
-            ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
-            '<s:Body>'
-            '<m:{action} xmlns:m="urn:{urn}">'
-            '{params}'
-            '</m:{action}>'
-            '</s:Body>'
-            '</s:Envelope>'
-        ).format(action=action, urn=urn, params=params).encode('utf-8')
-
-        headers = {
-            'Host': '{}:{}'.format(self.__host, self.__port),
-            'Content-Length': len(soap_body),
-            'Content-Type': 'text/xml; charset="utf-8"',
-            'SOAPAction': '"urn:{}#{}"'.format(urn, action),
-        }
-
-        url = 'http://{}:{}/{}'.format(self.__host, self.__port, url)
+        return self.sendTemplate(SoapTemplate(url, urn, action, params))
+
+    def sendTemplate(self, template, value=None):
+        """Send a precomputed SOAP request to the TV.
+
+        @param [SoapTemplate] template  the request template
+        @param [object] OPTIONAL value  the variable argument of the template
+
+        @return [str] the response body
+        """
+        event = None
+        if self.__instrumentation is not None:
+            event = RequestEvent(self.__host, template.action, template.urn)
+            self.__instrumentation.before(event)
+        data = None
+        if self.__recorder is not None:
+            start = monotonic()
+        if self.__pool is not None or self.__recorder is not None:
+            # the same bytes are sent by each attempt and recorded
+            data = template.request(self.__host_line, value)
+        try:
+            self.__checkCircuit(self.__host, self.__port)
+            if self.__pool is not None:
+                send = lambda timeout: self.__pooledRequest(data, event, timeout)
+            else:
+                send = lambda timeout: self.__urllibRequest(template, value, event, timeout)
+            res = self.__retry(template.action, self.__host, self.__port, send, event)
+        except RemoteControlException as e:
+            self.__finish(self.__host, self.__port, event, e)
+            if self.__recorder is not None:
+                self.__recorder.record(self.__host, self.__port, template.action, data, b'',
+                                       start, getOutcome(e))
+            raise
+        self.__finish(self.__host, self.__port, event, None, len(res))
+        if self.__recorder is not None:
+            self.__recorder.record(self.__host, self.__port, template.action, data, res, start)
+        if g_logger.isEnabledFor(logging.DEBUG):
+            g_logger.debug("Received response: '''%s'''", res.decode('utf-8', 'replace'))
+        return res
+
+    def __retry(self, action, host, port, send, event=None):
+        """Call send(timeout) with the timeouts and the retries of the policy
+
+        @param [str] action  the SOAP action or the url of the request
+        @param [callable] send  sends the request with the given timeout
+        @return [bytes] the result of send
+        """
+        policy = self.__policy
+        if policy is None:
+            return send(self.__timeout)
+        start = monotonic()
+        attempt = 0
+        while True:
+            sent = monotonic()
+            try:
+                res = send(policy.getTimeout(host, port, sent - start))
+            except RemoteControlException as e:
+                if not isUnreachableError(e):
+                    raise
+                policy.recordFailure(host, port)
+                delay = policy.getRetryDelay(action, attempt, monotonic() - start)
+                if delay is None or (self.__breaker is not None and
+                                     self.__breaker.getState(host, port) == CircuitState.OPEN):
+                    raise
+                attempt += 1
+                g_logger.warning("Request %s to %s has failed, retry %d in %.3fs", action, host, attempt, delay)
+                if event is not None:
+                    event.retries = attempt
+                time.sleep(delay)
+                continue
+            policy.recordLatency(host, port, monotonic() - sent)
+            return res
+
+    def __urllibRequest(self, template, value, event, timeout):
+        """Send the SOAP request on a new connection with urllib
+        """
+        soap_body = template.body(value)
+        if event is not None:
+            event.bytes_sent = len(soap_body)
+        headers = dict(template.headers)
+        headers['Host'] = '{}:{}'.format(self.__host, self.__port)
+        headers['Content-Length'] = len(soap_body)
+
+        url = 'http://{}:{}/{}'.format(self.__host, self.__port, template.url)
 
         g_logger.debug("Sending request to %s: with headers : %s and body : '''%s'''", url, headers, soap_body)
         req = Request(url, soap_body, headers)
 
         try:
-            res = urlopen(req, timeout=self.__timeout).read()
+            res = urlopen(req, timeout=timeout)
+            if event is not None:
+                event.ttfb = event.getElapsed()
+            return res.read()
         except HTTPError as e:
             g_logger.fatal(str(e))
             raise UserControlException("This command has failed, maybe the TV does not support it.", ErrorCodes.COMMANDE_NOT_SUPPORTED)
         except (socket.error, socket.timeout, URLError) as e:
             g_logger.fatal(str(e))
             raise RemoteControlException("The TV is unreacheable.", ErrorCodes.TV_UNREACHEABLE)
-        if sys.version_info[0] == 3:
-            g_logger.debug("Received response: '''%s'''", res.decode())
-        else:
-            g_logger.debug("Received response: '''%s'''", res)
+
+    def __pooledRequest(self, data, event, timeout):
+        """Send the full SOAP request on a keep-alive connection of the pool
+        """
+        if event is not None:
+            event.bytes_sent = len(data)
+
+        g_logger.debug("Sending pooled request to %s:%d : '''%s'''", self.__host, self.__port, data)
+        try:
+            status, res = self.__pool.request(self.__host, self.__port, data, timeout, event)
+        except (socket.error, socket.timeout, HTTPException) as e:
+            g_logger.fatal(str(e))
+            raise RemoteControlException("The TV is unreacheable.", ErrorCodes.TV_UNREACHEABLE)
+        if status >= 400:
+            g_logger.fatal("HTTP Error %d from %s:%d", status, self.__host, self.__port)
+            raise UserControlException("This command has failed, maybe the TV does not support it.", ErrorCodes.COMMANDE_NOT_SUPPORTED)
         return res
 
     def http(self, query, host=None, port=None):
@@ -173,33 +713,204 @@ class RemoteControl:
             host = self.__host
         if port is None:
             port = self.__port
+        return self.__http(query, host, port)
+
+    def __http(self, query, host, port, read=False):
+        """Send a HTTP GET request, see http()
+
+        The attempts made by the policy are measured, and counted by the
+        circuit breaker, as one request.
+
+        @param [bool] OPTIONAL read  return the response body instead of the
+                    response object, the body is then read by each attempt
+        """
         url = 'http://{}:{}/{}'.format(host, port, query)
         g_logger.debug("Sending http request to %s", url)
-        req = Request(url)
+        event = None
+        if self.__instrumentation is not None:
+            event = RequestEvent(host, query)
+            event.bytes_sent = len(buildHttpRequest(host, port, query))
+            self.__instrumentation.before(event)
+
+        def send(timeout):
+            try:
+                res = urlopen(Request(url), timeout=timeout)
+                if event is not None:
+                    event.ttfb = event.getElapsed()
+                return res.read() if read else res
+            except HTTPError as e:
+                g_logger.fatal(str(e))
+                raise UserControlException(str(e), ErrorCodes.COMMANDE_NOT_SUPPORTED)
+            except (socket.error, socket.timeout, URLError) as e:
+                g_logger.fatal(str(e))
+                raise RemoteControlException("The TV is unreacheable.", ErrorCodes.TV_UNREACHEABLE)
+
         try:
-            return urlopen(req, timeout=self.__timeout)
-        except HTTPError as e:
-            g_logger.fatal(str(e))
-        except (socket.error, socket.timeout, URLError) as e:
+            self.__checkCircuit(host, port)
+            res = self.__retry(query, host, port, send, event)
+        except UserControlException as e:
+            self.__finish(host, port, event, e)
+            if read:
+                raise
+            return None
+        except RemoteControlException as e:
+            self.__finish(host, port, event, e)
+            raise
+        if read:
+            self.__finish(host, port, event, None, len(res))
+        else:
+            self.__finish(host, port, event, None, int(res.headers.get('Content-Length') or 0))
+        return res
+
+    def subscribe(self, callback_url, timeout=DEFAULT_SUBSCRIPTION_TIMEOUT, url=URL_EVENT_DMR):
+        """Subscribe to the UPnP events of a TV service
+
+        @param [str] callback_url  the url where the TV sends the NOTIFY requests
+        @param [int] OPTIONAL timeout  the requested lifetime in seconds
+        @param [str] OPTIONAL url  the event url of the service
+
+        @return [tuple] the subscription id and the granted timeout in seconds
+        """
+        res = self.__eventRequest('SUBSCRIBE', url, {
+            'CALLBACK': '<{}>'.format(callback_url),
+            'NT': 'upnp:event',
+            'TIMEOUT': 'Second-{}'.format(timeout),
+        })
+        return res.getheader('SID'), parseSubscriptionTimeout(res.getheader('TIMEOUT'), timeout)
+
+    def renewSubscription(self, sid, timeout=DEFAULT_SUBSCRIPTION_TIMEOUT, url=URL_EVENT_DMR):
+        """Extend the lifetime of an event subscription
+
+        @param [str] sid  the subscription id
+        @return [int] the granted timeout in seconds
+        """
+        res = self.__eventRequest('SUBSCRIBE', url, {
+            'SID': sid,
+            'TIMEOUT': 'Second-{}'.format(timeout),
+        })
+        return parseSubscriptionTimeout(res.getheader('TIMEOUT'), timeout)
+
+    def unsubscribe(self, sid, url=URL_EVENT_DMR):
+        """Cancel an event subscription
+
+        @param [str] sid  the subscription id
+        """
+        self.__eventRequest('UNSUBSCRIBE', url, {'SID': sid})
+
+    def __eventRequest(self, method, url, headers):
+        """Send a GENA request to the TV
+
+        @return [HTTPResponse] the read response
+        """
+        if self.__host is None:
+            raise UserControlException("You must set the host value to used this feature.")
+        g_logger.debug("Sending %s request to %s:%d/%s with headers : %s", method, self.__host, self.__port, url, headers)
+        event = None
+        if self.__instrumentation is not None:
+            event = RequestEvent(self.__host, method)
+            self.__instrumentation.before(event)
+        conn = HTTPConnection(self.__host, self.__port, timeout=self.__timeout)
+        try:
+            self.__checkCircuit(self.__host, self.__port)
+            conn.request(method, '/' + url, headers=headers)
+            res = conn.getresponse()
+            res.read()
+        except RemoteControlException as e:
+            self.__finish(self.__host, self.__port, event, e)
+            raise
+        except (socket.error, socket.timeout, HTTPException) as e:
             g_logger.fatal(str(e))
+            error = RemoteControlException("The TV is unreacheable.", ErrorCodes.TV_UNREACHEABLE)
+            self.__finish(self.__host, self.__port, event, error)
+            raise error
+        finally:
+            conn.close()
+        if res.status >= 400:
+            g_logger.fatal("HTTP Error %d on %s from %s:%d", res.status, method, self.__host, self.__port)
+            error = UserControlException("This command has failed, maybe the TV does not support it.", ErrorCodes.COMMANDE_NOT_SUPPORTED)
+            self.__finish(self.__host, self.__port, event, error)
+            raise error
+        self.__finish(self.__host, self.__port, event)
+        return res
+
+    def __checkCircuit(self, host, port):
+        """Fail immediately if the circuit of the TV is open
+        """
+        if self.__breaker is not None and not self.__breaker.allow(host, port):
+            g_logger.debug("Circuit of %s:%d is open, request not sent", host, port)
             raise RemoteControlException("The TV is unreacheable.", ErrorCodes.TV_UNREACHEABLE)
 
-    def informations(self, host=None, port=None):
+    def __finish(self, host, port, event, error=None, bytes_received=0):
+        """Record the outcome of a request
+
+        The circuit breaker and the post request hooks are updated.
+        """
+        if self.__breaker is not None:
+            if error is not None and isUnreachableError(error):
+                self.__breaker.recordFailure(host, port)
+            else:
+                self.__breaker.recordSuccess(host, port)
+        if event is not None:
+            if error is not None:
+                event.finish(getOutcome(error), bytes_received)
+            else:
+                event.finish(OUTCOME_SUCCESS, bytes_received)
+            self.__instrumentation.after(event)
+
+    def informations(self, host=None, port=None, discovery=None):
         """Retrieve a such amount of informations from the TV
 
         @param [str] OPTIONAL host  the hostname/ip address of the TV
         @param [str] OPTIONAL port  the port of the TV
+        @param [dict] OPTIONAL discovery  the SSDP headers of the TV, used
+                    to validate the cached description
 
         @return [object] a dict with theses keys
             'general' => contains some random informations extracted from
                         main XML specifications
         """
-        infos = dict()
+        return parseInformations(self.description(host, port, discovery))
+
+    def description(self, host=None, port=None, discovery=None):
+        """Retrieve the XML description file of the TV
+
+        The description cache, if any, is used when the entry of the TV is
+        still fresh, or when the BOOTID announced in the SSDP headers has
+        not changed.
 
-        root = xml_elm.fromstring(self.http(URL_INFORMATION, host, port).read())
-        infos['general'] = parseXMLInformations(root)
+        @param [str] OPTIONAL host  the hostname/ip address of the TV
+        @param [str] OPTIONAL port  the port of the TV
+        @param [dict] OPTIONAL discovery  the SSDP headers of the TV
 
-        return infos
+        @return [bytes] the content of the description file
+        """
+        if host is None:
+            host = self.__host
+        if port is None:
+            port = self.__port
+        cache = self.__description_cache
+        if cache is None:
+            return self.__http(URL_INFORMATION, host, port, read=True)
+
+        keys = ['{}:{}'.format(host, port)]
+        bootid = max_age = None
+        if discovery:
+            uuid = extractUUID(getHeader(discovery, 'USN') or '')
+            if uuid is not None:
+                keys.insert(0, uuid)
+            bootid = getHeader(discovery, 'BOOTID.UPNP.ORG')
+            max_age = getMaxAge(discovery)
+
+        for key in keys:
+            data = cache.get(key, bootid)
+            if data is not None:
+                g_logger.debug("Use cached description for %s", key)
+                return data
+
+        data = self.__http(URL_INFORMATION, host, port, read=True)
+        for key in keys:
+            cache.put(key, data, max_age, bootid)
+        return data
 
     def sendKey(self, key):
         """Send a key command to the TV.
@@ -208,60 +919,72 @@ class RemoteControl:
         """
         if self.__host is None:
             raise UserControlException("You must set the host value to used this feature.")
-        if isinstance(key, Keys):
-            key = key.value
-        params = '<X_KeyEvent>{}</X_KeyEvent>'.format(key)
         g_logger.info("Send Key %s to %s", key, self.__host)
-        self.soapRequest(URL_CONTROL_NRC, URN_REMOTE_CONTROL,
-                          'X_SendKey', params)
+        try:
+            self.sendTemplate(getKeyTemplate(key))
+        finally:
+            if self.__state_cache is not None:
+                for name in STATE_KEYS.get(getKeyValue(key), ()):
+                    self.__state_cache.invalidate(self.__stateKey(name))
 
     def getVolume(self):
         """Return the current volume level.
 
         @return [int] the volume value
         """
-        params = '<InstanceID>0</InstanceID><Channel>Master</Channel>'
+        if self.__state_cache is not None:
+            return self.__state_cache.get(self.__stateKey('volume'), self.__readVolume)
+        return self.__readVolume()
+
+    def __readVolume(self):
         g_logger.info("Send GetVolume request to %s", self.__host)
-        res = self.soapRequest(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
-                                'GetVolume', params)
-        root = xml_elm.fromstring(res)
-        el_volume = root.find('.//CurrentVolume')
-        return int(el_volume.text)
+        res = self.sendTemplate(GET_VOLUME_TEMPLATE)
+        return parseVolumeResponse(res)
 
     def setVolume(self, volume):
         """Set a new volume level
 
         @param [int] the new value for volume
         """
-        if volume > 100 or volume < 0:
-            raise UserControlException("Bad value for volume control. It must be between 0 and 100.")
-        params = ('<InstanceID>0</InstanceID><Channel>Master</Channel>'
-                  '<DesiredVolume>{}</DesiredVolume>').format(volume)
+        checkVolume(volume)
         g_logger.info("Send SetVolume request to %s", self.__host)
-        self.soapRequest(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
-                          'SetVolume', params)
+        try:
+            self.sendTemplate(SET_VOLUME_TEMPLATE, volume)
+        except RemoteControlException:
+            if self.__state_cache is not None:
+                self.__state_cache.invalidate(self.__stateKey('volume'))
+            raise
+        if self.__state_cache is not None:
+            self.__state_cache.set(self.__stateKey('volume'), volume)
 
     def getMute(self):
         """Return if the TV is muted
 
         @return [bool] the mute status
         """
-        params = '<InstanceID>0</InstanceID><Channel>Master</Channel>'
+        if self.__state_cache is not None:
+            return self.__state_cache.get(self.__stateKey('mute'), self.__readMute)
+        return self.__readMute()
+
+    def __readMute(self):
         g_logger.info("Send GetMute request to %s", self.__host)
-        res = self.soapRequest(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
-                                'GetMute', params)
-        root = xml_elm.fromstring(res)
-        el_mute = root.find('.//CurrentMute')
-        return el_mute.text != '0'
+        res = self.sendTemplate(GET_MUTE_TEMPLATE)
+        return parseMuteResponse(res)
 
     def setMute(self, enable):
         """Mute or unmute the TV.
 
         @param [bool] true if mute must be enabled, false if not
         """
-        data = '1' if enable else '0'
-        params = ('<InstanceID>0</InstanceID><Channel>Master</Channel>'
-                  '<DesiredMute>{}</DesiredMute>').format(data)
         g_logger.info("Send SetMute request to %s", self.__host)
-        self.soapRequest(URL_CONTROL_DMR, URN_RENDERING_CONTROL,
-                          'SetMute', params)
+        try:
+            self.sendTemplate(SET_MUTE_TEMPLATES[bool(enable)])
+        except RemoteControlException:
+            if self.__state_cache is not None:
+                self.__state_cache.invalidate(self.__stateKey('mute'))
+            raise
+        if self.__state_cache is not None:
+            self.__state_cache.set(self.__stateKey('mute'), bool(enable))
+
+    def __stateKey(self, name):
+        return getStateKey(self.__host, self.__port, name)
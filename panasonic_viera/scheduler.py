@@ -0,0 +1,229 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+from concurrent.futures import Future
+import heapq
+import itertools
+import threading
+
+# Project imports
+from .constants import Keys, Priority
+from .metrics import Histogram
+from .remote_control import getKeyValue
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_MAX_IN_FLIGHT = 1
+DEFAULT_MIN_GAP = 0.05
+
+# Keys sent before the others
+HIGH_PRIORITY_KEYS = frozenset(getKeyValue(key) for key in (
+    Keys.POWER, Keys.MUTE, Keys.TV_DISPLAY_MUTE_ON, Keys.TV_DISPLAY_MUTE_OFF,
+))
+
+# Keys sent after the others
+LOW_PRIORITY_KEYS = frozenset(getKeyValue(key) for key in (
+    Keys.UP, Keys.DOWN, Keys.LEFT, Keys.RIGHT, Keys.ENTER, Keys.RETURN,
+    Keys.CANCEL, Keys.MENU, Keys.HOME, Keys.APPS, Keys.OPTION, Keys.INFO,
+    Keys.GUIDE, Keys.EPG, Keys.INDEX,
+))
+
+# Priority of the RemoteControl methods, sendKey depends on the key
+METHOD_PRIORITIES = {
+    'setMute': Priority.HIGH,
+    'getVolume': Priority.LOW,
+    'getMute': Priority.LOW,
+}
+
+
+def getPriorityValue(priority):
+    """Return the sort value of a priority
+
+    @param [Priority] priority  the priority
+    @return [int] the value, lower is sent first
+    """
+    return getattr(priority, 'value', priority)
+
+
+def getDefaultPriority(method, args):
+    """Return the priority of a RemoteControl call
+
+    @param [str] method  the name of the RemoteControl method
+    @param [tuple] args  the arguments given to the method
+    @return [Priority] the priority
+    """
+    if method == 'sendKey' and args:
+        key = getKeyValue(args[0])
+        if key in HIGH_PRIORITY_KEYS:
+            return Priority.HIGH
+        if key in LOW_PRIORITY_KEYS:
+            return Priority.LOW
+    return METHOD_PRIORITIES.get(method, Priority.NORMAL)
+
+
+class CommandScheduler:
+    """This is a priority queue of the commands sent to one TV
+
+    Commands submitted by any thread are run by at most 'max_in_flight'
+    worker threads, and two commands are never started less than 'min_gap'
+    seconds apart, so the embedded HTTP server of the TV is not flooded.
+    Pending commands are sent by priority (power and mute first, then the
+    other commands, then navigation keys and state reads) and in
+    submission order within a priority.
+
+    Usage:
+
+    >>> scheduler = CommandScheduler(rc, max_in_flight=1, min_gap=0.05)
+    >>> scheduler.sendKey(Keys.RIGHT)
+    >>> scheduler.sendKey(Keys.POWER).result()
+    """
+
+    def __init__(self, rc, max_in_flight=DEFAULT_MAX_IN_FLIGHT, min_gap=DEFAULT_MIN_GAP):
+        """Default constructor
+
+        @param [RemoteControl] rc  the remote control of the TV
+        @param [int] OPTIONAL max_in_flight  the max number of requests sent
+                    to the TV at the same time
+        @param [float] OPTIONAL min_gap  the min delay in seconds between the
+                    start of two requests
+        """
+        self.__rc = rc
+        self.__min_gap = min_gap
+        self.__queue = []
+        self.__counter = itertools.count()
+        self.__next_start = 0.0
+        self.__closed = False
+        self.__cond = threading.Condition()
+        self.__stats = dict(submitted=0, completed=0, failed=0, cancelled=0, max_queued=0)
+        self.__wait_times = dict()
+        self.__workers = []
+        for i in range(max_in_flight):
+            worker = threading.Thread(target=self.__run, name='viera-scheduler-{}'.format(i))
+            worker.daemon = True
+            worker.start()
+            self.__workers.append(worker)
+
+    def getStats(self):
+        """Return the counters of this scheduler
+
+        @return [dict] with keys 'submitted', 'completed', 'failed',
+                    'cancelled', 'queued' and 'max_queued'
+        """
+        with self.__cond:
+            stats = dict(self.__stats)
+            stats['queued'] = len(self.__queue)
+        return stats
+
+    def getQueueDepth(self):
+        """Return the number of commands waiting to be sent
+        """
+        with self.__cond:
+            return len(self.__queue)
+
+    def getWaitHistogram(self, priority):
+        """Return the Histogram of the time spent in queue, or None
+
+        @param [Priority] priority  the priority of the commands
+        """
+        return self.__wait_times.get(getPriorityValue(priority))
+
+    def submit(self, method, args=(), priority=None):
+        """Queue a call of a RemoteControl method
+
+        @param [str] method  the name of the RemoteControl method
+        @param [tuple] OPTIONAL args  the arguments given to the method
+        @param [Priority] OPTIONAL priority  the priority of the command,
+                    by default it depends on the method and the key
+        @return [Future] resolved with the value returned by the method
+        """
+        if priority is None:
+            priority = getDefaultPriority(method, args)
+        future = Future()
+        with self.__cond:
+            if self.__closed:
+                raise RuntimeError("The scheduler is closed")
+            item = (getPriorityValue(priority), next(self.__counter), monotonic(),
+                    future, method, tuple(args))
+            heapq.heappush(self.__queue, item)
+            self.__stats['submitted'] += 1
+            self.__stats['max_queued'] = max(self.__stats['max_queued'], len(self.__queue))
+            self.__cond.notify()
+        return future
+
+    def sendKey(self, key, priority=None):
+        return self.submit('sendKey', (key,), priority)
+
+    def getVolume(self, priority=None):
+        return self.submit('getVolume', (), priority)
+
+    def setVolume(self, volume, priority=None):
+        return self.submit('setVolume', (volume,), priority)
+
+    def getMute(self, priority=None):
+        return self.submit('getMute', (), priority)
+
+    def setMute(self, enable, priority=None):
+        return self.submit('setMute', (enable,), priority)
+
+    def close(self, timeout=None):
+        """Send the queued commands and stop the worker threads
+        """
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+        for worker in self.__workers:
+            worker.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __next(self):
+        """Wait for the next command which may be started
+        """
+        with self.__cond:
+            while True:
+                if not self.__queue:
+                    if self.__closed:
+                        return None
+                    self.__cond.wait()
+                    continue
+                delay = self.__next_start - monotonic()
+                if delay > 0:
+                    self.__cond.wait(delay)
+                    continue
+                item = heapq.heappop(self.__queue)
+                now = monotonic()
+                self.__next_start = now + self.__min_gap
+                histogram = self.__wait_times.get(item[0])
+                if histogram is None:
+                    histogram = self.__wait_times[item[0]] = Histogram()
+                histogram.observe(now - item[2])
+                return item
+
+    def __run(self):
+        while True:
+            item = self.__next()
+            if item is None:
+                return
+            future, method, args = item[3:]
+            if not future.set_running_or_notify_cancel():
+                self.__count('cancelled')
+                continue
+            try:
+                result = getattr(self.__rc, method)(*args)
+            except Exception as e:
+                g_logger.error("Scheduled %s has failed : %s", method, str(e))
+                self.__count('failed')
+                future.set_exception(e)
+            else:
+                self.__count('completed')
+                future.set_result(result)
+
+    def __count(self, name):
+        with self.__cond:
+            self.__stats[name] += 1
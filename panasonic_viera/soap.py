@@ -0,0 +1,116 @@
+# -*- coding: utf8 -*-
+
+# Marker replaced by the variable argument of a template
+VALUE_MARKER = '\x00'
+
+
+def buildSoapBody(urn, action, params):
+    """Build the SOAP envelope of a request
+
+    @param [str] urn  the resource identifier
+    @param [str] action  the SOAP action name
+    @param [str] params  the action arguments
+
+    @return [bytes] the encoded SOAP envelope
+    """
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+        ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+        '<s:Body>'
+        '<m:{action} xmlns:m="urn:{urn}">'
+        '{params}'
+        '</m:{action}>'
+        '</s:Body>'
+        '</s:Envelope>'
+    ).format(action=action, urn=urn, params=params).encode('utf-8')
+
+
+def buildHostLine(host, port):
+    """Build the Host header line used by SoapTemplate.request
+
+    @return [bytes] the encoded header line
+    """
+    return 'Host: {}:{}\r\n'.format(host, port).encode('utf-8')
+
+
+class SoapTemplate:
+    """This is a SOAP request precomputed as bytes
+
+    The envelope, the request line and the static headers are encoded once.
+    A template may have one variable argument, given as a tag name, whose
+    value is spliced into the envelope when the request is built.
+
+    Usage:
+
+    >>> tpl = SoapTemplate('dmr/control_0', urn, 'SetVolume', params, 'DesiredVolume')
+    >>> tpl.request(buildHostLine('192.168.1.2', 55000), 30)
+    """
+
+    def __init__(self, url, urn, action, params='', variable=None):
+        """Default constructor
+
+        @param [str] url  the query part of the url
+        @param [str] urn  the resource identifier
+        @param [str] action  the SOAP action name
+        @param [str] OPTIONAL params  the static action arguments
+        @param [str] OPTIONAL variable  the tag name of the variable argument
+                    placed after the static ones
+        """
+        self.url = url
+        self.urn = urn
+        self.action = action
+        self.variable = variable
+
+        if variable is not None:
+            params += '<{0}>{1}</{0}>'.format(variable, VALUE_MARKER)
+        body = buildSoapBody(urn, action, params)
+        if variable is not None:
+            self.__body_head, self.__body_tail = body.split(VALUE_MARKER.encode('utf-8'))
+        else:
+            self.__body_head, self.__body_tail = body, b''
+
+        self.headers = {
+            'Content-Type': 'text/xml; charset="utf-8"',
+            'SOAPAction': '"urn:{}#{}"'.format(urn, action),
+        }
+        self.__request_line = 'POST /{} HTTP/1.1\r\n'.format(url).encode('utf-8')
+        self.__static_headers = (
+            'Content-Type: text/xml; charset="utf-8"\r\n'
+            'SOAPAction: "urn:{}#{}"\r\n'
+            'Connection: keep-alive\r\n'
+            '\r\n'
+        ).format(urn, action).encode('utf-8')
+        if variable is None:
+            self.__static_tail = self.__buildTail(self.__body_head)
+
+    def body(self, value=None):
+        """Return the encoded SOAP envelope
+
+        @param [object] OPTIONAL value  the variable argument
+        @return [bytes] the envelope
+        """
+        if self.variable is None:
+            return self.__body_head
+        return self.__body_head + self.__encodeValue(value) + self.__body_tail
+
+    def request(self, host_line, value=None):
+        """Return the full HTTP request
+
+        @param [bytes] host_line  the Host header line from buildHostLine
+        @param [object] OPTIONAL value  the variable argument
+        @return [bytes] the request ready to be written on a socket
+        """
+        if self.variable is None:
+            return self.__request_line + host_line + self.__static_tail
+        return self.__request_line + host_line + self.__buildTail(self.body(value))
+
+    def __buildTail(self, body):
+        return (b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\n' +
+                self.__static_headers + body)
+
+    @staticmethod
+    def __encodeValue(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf-8')
@@ -0,0 +1,127 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import threading
+
+# Project imports
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+DEFAULT_MAX_AGE = 1.0
+
+
+def getStateKey(host, port, name):
+    """Return the cache key of a TV state
+
+    @param [str] name  the state name, 'volume' or 'mute'
+    """
+    return (host, port, name)
+
+
+class _Flight:
+    """A value being loaded, shared by all concurrent readers
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StateCache:
+    """This is a read-through cache of TV states like volume and mute
+
+    A value read from the TV is served for at most 'max_age' seconds.
+    Concurrent readers of a missing value share a single request to the TV.
+    Writes done by the remote control update the cache directly, and
+    invalidations drop the value so the next read asks the TV.
+
+    One cache can be shared by many RemoteControl instances, values are
+    indexed by (host, port, name).
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        """Default constructor
+
+        @param [float] OPTIONAL max_age  the max age of a value in seconds
+        """
+        self.__max_age = max_age
+        self.__values = dict()
+        self.__flights = dict()
+        self.__generations = dict()
+        self.__lock = threading.Lock()
+        self.__stats = dict(hits=0, misses=0, shared=0)
+
+    def getStats(self):
+        """Return the usage counters of this cache
+
+        @return [dict] with keys 'hits', 'misses' and 'shared'
+        """
+        with self.__lock:
+            return dict(self.__stats)
+
+    def get(self, key, loader):
+        """Return a value, loading it from the TV if needed
+
+        @param [tuple] key  the value key
+        @param [callable] loader  the function which reads the value on the TV
+        @return [object] the value
+        """
+        with self.__lock:
+            entry = self.__values.get(key)
+            if entry is not None and monotonic() - entry[1] <= self.__max_age:
+                self.__stats['hits'] += 1
+                return entry[0]
+            flight = self.__flights.get(key)
+            if flight is not None:
+                self.__stats['shared'] += 1
+                leader = False
+            else:
+                self.__stats['misses'] += 1
+                flight = self.__flights[key] = _Flight()
+                generation = self.__generations.get(key, 0)
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__flights[key]
+                # do not store a value read before an invalidation
+                if flight.error is None and self.__generations.get(key, 0) == generation:
+                    self.__values[key] = (flight.value, monotonic())
+            flight.done.set()
+        return flight.value
+
+    def set(self, key, value):
+        """Store a value written on the TV
+        """
+        with self.__lock:
+            self.__generations[key] = self.__generations.get(key, 0) + 1
+            self.__values[key] = (value, monotonic())
+
+    def invalidate(self, key):
+        """Drop a value which may have changed on the TV
+        """
+        with self.__lock:
+            self.__generations[key] = self.__generations.get(key, 0) + 1
+            self.__values.pop(key, None)
+
+    def clear(self):
+        """Drop all values
+        """
+        with self.__lock:
+            for key in set(self.__values) | set(self.__flights):
+                self.__generations[key] = self.__generations.get(key, 0) + 1
+            self.__values.clear()
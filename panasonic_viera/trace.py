@@ -0,0 +1,405 @@
+# -*- coding: utf8 -*-
+
+"""
+    Recorder of the SOAP traffic exchanged with the TVs, and its replay
+
+    The recorder keeps the last requests and responses of each TV in memory
+    and dumps them on demand in a compact binary file. A dump can be sent
+    again to a MockTV or through a RemoteControl, with the original pacing,
+    to reproduce a problem or to benchmark a change on a real workload.
+
+    Usage:
+
+        python -m panasonic_viera.trace show trace.bin
+        python -m panasonic_viera.trace replay trace.bin --target 127.0.0.1:55000
+"""
+
+# Systems imports
+import argparse
+from collections import deque
+import re
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+if sys.version_info[0] == 3:
+    from http.client import HTTPException
+else:
+    from httplib import HTTPException
+
+# Project imports
+from .exceptions import RemoteControlException
+from .metrics import getOutcome, OUTCOME_SUCCESS
+from .pool import ConnectionPool
+from .soap import buildHostLine
+from .utils import getLogger, monotonic
+
+# Global vars
+g_logger = getLogger()
+
+# Number of exchanges kept per TV
+DEFAULT_CAPACITY = 1024
+
+# Dump file format
+TRACE_MAGIC = b'VIERATRC'
+TRACE_VERSION = 1
+# start, duration, port, host, action and outcome lengths, request and response lengths
+RECORD_HEADER = struct.Struct('!ddHBBBII')
+
+RE_HOST_LINE = re.compile(br'^Host:[^\r\n]*\r\n', re.IGNORECASE | re.MULTILINE)
+RE_REQUEST_LINE = re.compile(br'^(\w+) /(\S*) HTTP/1\.[01]\r\n')
+RE_HEADER = re.compile(br'^([\w-]+):[ \t]*([^\r\n]*)\r\n', re.MULTILINE)
+
+
+class TraceRecord(object):
+    """One request sent to a TV and its response
+
+    'start' is the wall clock time of the request, only used as a label
+    and derived from the monotonic clock so the gaps between the records
+    of a recorder are exact, 'duration' its length in seconds and 'outcome' the result as reported to the metrics, like
+    'success' or 'TV_UNREACHEABLE'. 'response' is empty on failures.
+    """
+
+    __slots__ = ('start', 'duration', 'host', 'port', 'action', 'outcome', 'request', 'response')
+
+    def __init__(self, start, duration, host, port, action, outcome, request, response):
+        self.start = start
+        self.duration = duration
+        self.host = host
+        self.port = port
+        self.action = action
+        self.outcome = outcome
+        self.request = request
+        self.response = response
+
+    def __repr__(self):
+        return '<TraceRecord {}:{} {} {} {:.3f}s>'.format(
+            self.host, self.port, self.action, self.outcome, self.duration)
+
+
+class TraceRecorder:
+    """This is a ring buffer of the last exchanges with each TV
+
+    Recording only stores references to the request and response bytes,
+    which are built and read anyway on pooled connections, so it can stay
+    enabled in production. Without a pool, urllib builds its own request,
+    and the recorded one is the same request in the form sent by a pool.
+    Give it to RemoteControl with the 'recorder' argument.
+
+    Usage:
+
+    >>> recorder = TraceRecorder(capacity=512)
+    >>> rc = RemoteControl("192.168.1.2", recorder=recorder)
+    >>> recorder.dump('/tmp/viera.trace')
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Default constructor
+
+        @param [int] OPTIONAL capacity  the number of exchanges kept per TV
+        """
+        self.__capacity = capacity
+        self.__buffers = dict()
+        self.__lock = threading.Lock()
+        # the wall clock time matching a monotonic time
+        self.__origin = (time.time(), monotonic())
+
+    def record(self, host, port, action, request, response, start, outcome=OUTCOME_SUCCESS):
+        """Store one exchange, the oldest one of the TV is dropped when full
+
+        @param [str] host  the address of the TV
+        @param [int] port  the port of the TV
+        @param [str] action  the SOAP action
+        @param [bytes] request  the full HTTP request, as sent on a pooled
+                    connection
+        @param [bytes] response  the response body
+        @param [float] start  the utils.monotonic() time of the request
+        @param [str] OPTIONAL outcome  the result of the request
+        """
+        duration = monotonic() - start
+        wall, clock = self.__origin
+        record = TraceRecord(wall + start - clock, duration, host, port, action, outcome, request, response)
+        buffer = self.__buffers.get((host, port))
+        if buffer is None:
+            with self.__lock:
+                buffer = self.__buffers.setdefault((host, port), deque(maxlen=self.__capacity))
+        buffer.append(record)
+
+    def getRecords(self, host=None):
+        """Return the recorded exchanges by start time
+
+        @param [str] OPTIONAL host  only return the exchanges of this TV
+        @return [list] the TraceRecord
+        """
+        with self.__lock:
+            buffers = [buffer for (address, _), buffer in self.__buffers.items()
+                       if host is None or address == host]
+        records = [record for buffer in buffers for record in list(buffer)]
+        records.sort(key=lambda record: record.start)
+        return records
+
+    def clear(self):
+        with self.__lock:
+            self.__buffers = dict()
+
+    def dump(self, path, host=None):
+        """Write the recorded exchanges in a binary file
+
+        @param [str|file] path  the file path or a binary file object
+        @param [str] OPTIONAL host  only dump the exchanges of this TV
+        @return [int] the number of dumped exchanges
+        """
+        records = self.getRecords(host)
+        if hasattr(path, 'write'):
+            writeTrace(path, records)
+        else:
+            with open(path, 'wb') as output:
+                writeTrace(output, records)
+        g_logger.info("Dumped %d exchanges in %s", len(records), getattr(path, 'name', path))
+        return len(records)
+
+    def dumpOnSignal(self, path, signum=getattr(signal, 'SIGUSR1', None)):
+        """Dump the exchanges each time the process receives a signal
+
+        Must be called from the main thread.
+
+        @param [str] path  the file path
+        @param [int] OPTIONAL signum  the signal, SIGUSR1 by default
+        """
+        def handler(signum, frame):
+            try:
+                self.dump(path)
+            except (IOError, OSError) as e:
+                g_logger.error("Unable to dump the trace in %s : %s", path, str(e))
+        signal.signal(signum, handler)
+
+
+def writeTrace(output, records):
+    """Write exchanges in the binary trace format
+
+    @param [file] output  a binary file object
+    @param [list] records  the TraceRecord
+    """
+    output.write(TRACE_MAGIC + struct.pack('!H', TRACE_VERSION))
+    for record in records:
+        host = record.host.encode('utf-8')
+        action = record.action.encode('utf-8')
+        outcome = record.outcome.encode('utf-8')
+        output.write(RECORD_HEADER.pack(record.start, record.duration, record.port,
+                                        len(host), len(action), len(outcome),
+                                        len(record.request), len(record.response)))
+        output.write(host + action + outcome + record.request + record.response)
+
+
+def readTrace(path):
+    """Read a binary trace file
+
+    @param [str|file] path  the file path or a binary file object
+    @return [list] the TraceRecord
+    @raise ValueError if the file is not a valid trace
+    """
+    if hasattr(path, 'read'):
+        data = path.read()
+    else:
+        with open(path, 'rb') as source:
+            data = source.read()
+    header = TRACE_MAGIC + struct.pack('!H', TRACE_VERSION)
+    if not data.startswith(header):
+        raise ValueError("Not a trace file of version {}".format(TRACE_VERSION))
+
+    records = []
+    offset = len(header)
+    while offset < len(data):
+        if offset + RECORD_HEADER.size > len(data):
+            raise ValueError("Truncated trace file")
+        (start, duration, port, host_length, action_length, outcome_length,
+         request_length, response_length) = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        lengths = (host_length, action_length, outcome_length, request_length, response_length)
+        if offset + sum(lengths) > len(data):
+            raise ValueError("Truncated trace file")
+        fields = []
+        for length in lengths:
+            fields.append(data[offset:offset + length])
+            offset += length
+        host, action, outcome = [field.decode('utf-8') for field in fields[:3]]
+        records.append(TraceRecord(start, duration, host, port, action, outcome, fields[3], fields[4]))
+    return records
+
+
+def rewriteHost(request, host, port):
+    """Replace the Host header of a recorded request
+
+    @param [bytes] request  the full HTTP request
+    @return [bytes] the request for the new TV
+    """
+    return RE_HOST_LINE.sub(lambda match: buildHostLine(host, port), request, count=1)
+
+
+class RecordedTemplate:
+    """A recorded request usable as a SoapTemplate by RemoteControl.sendTemplate
+    """
+
+    def __init__(self, record):
+        head, _, self.__body = record.request.partition(b'\r\n\r\n')
+        match = RE_REQUEST_LINE.match(head + b'\r\n')
+        if match is None:
+            raise ValueError("Not a recorded HTTP request")
+        self.url = match.group(2).decode('utf-8')
+        self.action = record.action
+        self.urn = None
+        self.variable = None
+        self.headers = dict()
+        for name, value in RE_HEADER.findall(head + b'\r\n'):
+            name = name.decode('utf-8')
+            if name.lower() not in ('host', 'content-length', 'connection'):
+                self.headers[name] = value.decode('utf-8')
+        self.__request = record.request
+
+    def body(self, value=None):
+        return self.__body
+
+    def request(self, host_line, value=None):
+        return RE_HOST_LINE.sub(lambda match: host_line, self.__request, count=1)
+
+
+class ReplayResult:
+    """The outcome of one replayed exchange
+    """
+
+    def __init__(self, record, outcome, response, latency):
+        self.record = record
+        self.outcome = outcome
+        self.response = response
+        self.latency = latency
+
+    def __repr__(self):
+        return '<ReplayResult {} {} {:.3f}s (recorded {:.3f}s)>'.format(
+            self.record.action, self.outcome, self.latency, self.record.duration)
+
+
+class TraceReplayer:
+    """This sends recorded exchanges again
+
+    The exchanges of each recorded TV are sent in their recorded order from
+    one thread per TV, at their recorded offsets divided by 'speed', so the
+    concurrency between the TVs is reproduced. A None speed sends them
+    without waiting.
+
+    Usage:
+
+    >>> replayer = TraceReplayer(readTrace('/tmp/viera.trace'))
+    >>> results = replayer.replay(target=tv.getAddress())
+    """
+
+    def __init__(self, records, speed=1.0):
+        """Default constructor
+
+        @param [list] records  the TraceRecord
+        @param [float] OPTIONAL speed  the pacing factor, None for no pacing
+        """
+        self.__records = sorted(records, key=lambda record: record.start)
+        self.__speed = speed
+
+    def replay(self, target=None, pool=None, timeout=None):
+        """Send the raw recorded requests to a server, like a MockTV
+
+        @param [tuple] OPTIONAL target  the (host, port) of the server, by
+                    default each request goes to its recorded TV
+        @param [ConnectionPool] OPTIONAL pool  the pool of connections
+        @param [float] OPTIONAL timeout  the network timeout in seconds
+        @return [list] the ReplayResult in the recorded order
+        """
+        pool = pool if pool is not None else ConnectionPool()
+
+        def send(record):
+            host, port = target if target is not None else (record.host, record.port)
+            status, response = pool.request(host, port, rewriteHost(record.request, host, port), timeout)
+            return OUTCOME_SUCCESS if status < 400 else 'HTTP_{}'.format(status), response
+        return self.__run(send, (socket.error, HTTPException))
+
+    def replayWith(self, rc):
+        """Send the recorded requests through a remote control
+
+        The requests go through the pool, the circuit breaker and the
+        instrumentation of the remote control, so its whole client path is
+        measured.
+
+        @param [RemoteControl] rc  the remote control of the target TV
+        @return [list] the ReplayResult in the recorded order
+        """
+        def send(record):
+            return OUTCOME_SUCCESS, rc.sendTemplate(RecordedTemplate(record))
+        return self.__run(send, (RemoteControlException,))
+
+    def __run(self, send, errors):
+        results = [None] * len(self.__records)
+        by_host = dict()
+        for index, record in enumerate(self.__records):
+            by_host.setdefault((record.host, record.port), []).append(index)
+        if not self.__records:
+            return results
+        origin = self.__records[0].start
+        start = monotonic()
+
+        def play(indexes):
+            for index in indexes:
+                record = self.__records[index]
+                if self.__speed:
+                    delay = start + (record.start - origin) / self.__speed - monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                sent = monotonic()
+                try:
+                    outcome, response = send(record)
+                except errors as e:
+                    outcome = getOutcome(e) if isinstance(e, RemoteControlException) else type(e).__name__
+                    response = b''
+                results[index] = ReplayResult(record, outcome, response, monotonic() - sent)
+
+        threads = [threading.Thread(target=play, args=(indexes,), name='viera-replay')
+                   for indexes in by_host.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+def parseAddress(value):
+    host, _, port = value.rpartition(':')
+    return host, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show or replay a trace of the TV requests')
+    parser.add_argument('command', choices=('show', 'replay'))
+    parser.add_argument('path', help='the trace file')
+    parser.add_argument('--target', type=parseAddress,
+                        help='host:port of the server receiving the requests, like a MockTV')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='pacing factor, 0 to send without waiting')
+    parser.add_argument('--timeout', type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    records = readTrace(args.path)
+    if args.command == 'show':
+        origin = records[0].start if records else 0
+        for record in records:
+            print('{:+9.3f} {:>15}:{:<5} {:<12} {:<20} {:7.3f}s {}/{}B'.format(
+                record.start - origin, record.host, record.port, record.action, record.outcome,
+                record.duration, len(record.request), len(record.response)))
+        return 0
+
+    results = TraceReplayer(records, args.speed or None).replay(args.target, timeout=args.timeout)
+    for result in results:
+        print(result)
+    failed = [result for result in results if result.outcome != OUTCOME_SUCCESS]
+    print('{} exchanges, {} failed'.format(len(results), len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,55 +1,390 @@
 
+import errno
 import logging
 import re
+import socket
+import struct
+import threading
+import time
+import zlib
+import xml.etree.ElementTree as xml_elm
+try:
+    import selectors
+except ImportError:
+    # backport for python 2
+    import selectors2 as selectors
+
+# Clock used for deadlines and delays, not affected by system time changes
+monotonic = getattr(time, 'monotonic', time.time)
+
+RE_NAMESPACE = re.compile(r'\{.*\}')
+RE_UUID = re.compile(r'[a-f0-9]{8}\-[a-f0-9]{4}\-[a-f0-9]{4}\-[a-f0-9]{4}\-[a-f0-9]{12}')
 
 def getLogger():
     """Helper for retrieve the logger object
     """
     return logging.getLogger(__name__)
 
+# Responses bigger than this are never scanned, they go to ElementTree
+MAX_SCAN_SIZE = 4096
+
+# Cache of the XML tags without their namespace
+g_tag_names = dict()
+
+def stripNamespace(tag):
+    """Remove the '{namespace}' prefix of an ElementTree tag
+    """
+    name = g_tag_names.get(tag)
+    if name is None:
+        name = RE_NAMESPACE.sub('', tag)
+        if len(g_tag_names) < 1024:
+            g_tag_names[tag] = name
+    return name
+
+def scanResponse(res, regex, marker):
+    """Extract a value from a small SOAP response without building a tree
+
+    The scan is accepted only if the response is small, contains the
+    expected action marker and exactly one match of the regex.
+
+    @param [bytes] res  the SOAP response body
+    @param [re] regex  a compiled bytes regex with one group
+    @param [bytes] marker  a string which must appear in the response
+    @return [bytes] the captured value or None if the response must be
+                    parsed by ElementTree
+    """
+    if len(res) > MAX_SCAN_SIZE or marker not in res:
+        return None
+    matches = regex.findall(res)
+    if len(matches) != 1:
+        return None
+    return matches[0]
+
+def buildXMLInformations(children, is_list):
+    """Build the structure of one element from its (name, value) children
+    """
+    if is_list:
+        return [dict({name: value}) for name, value in children]
+    return dict(children)
+
 def parseXMLInformations(element):
+    children = []
     is_list = False
     last_tag = None
-    # detect list of items
     for elm in element:
+        # detect list of items
         if last_tag is not None and last_tag == elm.tag:
             is_list = True
         last_tag = elm.tag
-
-    if is_list:
-        data = []
-    else:
-        data = dict()
-
-    # parse the elements
-    for elm in element:
-        name = re.sub('\{.*\}', '', elm.tag)
         if len(elm) > 0:
             sub_item = parseXMLInformations(elm)
         else:
             sub_item = elm.text
-        if is_list:
-            data.append(dict({name:sub_item}))
+        children.append((stripNamespace(elm.tag), sub_item))
+    return buildXMLInformations(children, is_list)
+
+class InformationsBuilder:
+    """Parser target which builds the parseXMLInformations structure
+
+    The structure is built while the document is read, no element tree is
+    kept in memory.
+    """
+
+    def __init__(self):
+        # each frame holds the children, the last child tag and the list flag
+        self.__stack = []
+        self.__text = []
+        self.__result = None
+
+    def start(self, tag, attrs):
+        self.__stack.append([[], None, False])
+        self.__text = []
+
+    def data(self, data):
+        self.__text.append(data)
+
+    def end(self, tag):
+        children, _, is_list = self.__stack.pop()
+        if children:
+            value = buildXMLInformations(children, is_list)
         else:
-            data[name] = sub_item
-    return data
+            value = ''.join(self.__text) or None
+        self.__text = []
+        if not self.__stack:
+            self.__result = value if children else dict()
+            return
+        parent = self.__stack[-1]
+        # detect list of items
+        if parent[1] is not None and parent[1] == tag:
+            parent[2] = True
+        parent[1] = tag
+        parent[0].append((stripNamespace(tag), value))
 
-def getArpTable():
-    arps = dict()
-    arp_file = '/proc/net/arp'
-    logger = getLogger()
-    re_arp = re.compile('(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}).*(?P<mac>[\da-f]{2}(:[\da-f]{2}){5})')
+    def close(self):
+        return self.__result
+
+def parseXMLInformationsFromBytes(data):
+    """Parse a XML document in one pass, same result as parseXMLInformations
+
+    @param [bytes] data  the XML document
+    @return [dict|list] the parsed root element
+    """
+    parser = xml_elm.XMLParser(target=InformationsBuilder())
+    parser.feed(data)
+    return parser.close()
+
+def isMulticastAddress(address):
+    """Return True if the given IPv4 address is a multicast one
+    """
+    try:
+        return 224 <= int(address.split('.', 1)[0]) <= 239
+    except ValueError:
+        return False
+
+def getLocalAddress(remote):
+    """Return the local IP address used to reach a remote host
+
+    @param [str] remote  the remote IP address
+    @return [str] the local IP address
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # no datagram is sent, this only selects the route
+        sock.connect((remote, 9))
+        return sock.getsockname()[0]
+    except socket.error:
+        return '127.0.0.1'
+    finally:
+        sock.close()
+
+def iterNetworkAddresses(cidr):
+    """Yield the host addresses of an IPv4 network
+
+    The network and broadcast addresses are skipped for prefixes up to /30.
+
+    @param [str] cidr  the network, like '192.168.1.0/24'
+    @raise ValueError if the network is invalid
+    """
+    address, _, prefix = cidr.partition('/')
+    prefix = int(prefix or 32)
+    if not 0 <= prefix <= 32:
+        raise ValueError("Invalid network prefix in '{}'".format(cidr))
     try:
-        f_arp = open(arp_file, 'r')
-        for row in f_arp.readlines():
-            match = re_arp.search(row)
-            if match:
-                result = match.groupdict()
-                arps[result['ip']] = result['mac']
-        logger.debug("Initialized ARP mapping table from file : %s : with %d addresses", arp_file, len(arps))
-    except Exception as e:
-        logger.warning("Unable to access ARP mapping table from file : %s. Because of %s", arp_file, str(e))
-    return arps
+        base = struct.unpack('!I', socket.inet_aton(address))[0]
+    except socket.error:
+        raise ValueError("Invalid network address in '{}'".format(cidr))
+    mask = (0xffffffff << (32 - prefix)) & 0xffffffff
+    first = base & mask
+    last = first | (~mask & 0xffffffff)
+    if prefix < 31:
+        first += 1
+        last -= 1
+    value = first
+    while value <= last:
+        yield socket.inet_ntoa(struct.pack('!I', value))
+        value += 1
+
+def iterOpenPorts(addresses, port, timeout, max_probes):
+    """Yield the addresses which accept a TCP connection on a port
+
+    Non blocking connections are opened to at most 'max_probes' addresses
+    at the same time and each one is given up after 'timeout' seconds, so
+    a whole network is probed in about one timeout.
+
+    @param [iterable] addresses  the IPv4 addresses to probe
+    @param [int] port  the TCP port
+    @param [float] timeout  the deadline of each probe in seconds
+    @param [int] max_probes  the max number of connections in progress
+    """
+    addresses = iter(addresses)
+    probes = dict()
+    exhausted = False
+    # unlike select(), a selector is not limited to the first 1024 descriptors
+    selector = selectors.DefaultSelector()
+    try:
+        while probes or not exhausted:
+            while not exhausted and len(probes) < max_probes:
+                try:
+                    address = next(addresses)
+                except StopIteration:
+                    exhausted = True
+                    break
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(0)
+                error = sock.connect_ex((address, port))
+                if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    probes[sock] = (address, monotonic() + timeout)
+                    selector.register(sock, selectors.EVENT_WRITE)
+                else:
+                    sock.close()
+            if not probes:
+                continue
+            delay = min(deadline for _, deadline in probes.values()) - monotonic()
+            for key, _ in selector.select(max(delay, 0)):
+                sock = key.fileobj
+                address, _ = probes.pop(sock)
+                selector.unregister(sock)
+                connected = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                sock.close()
+                if connected:
+                    yield address
+            now = monotonic()
+            for sock, (address, deadline) in list(probes.items()):
+                if deadline <= now:
+                    del probes[sock]
+                    selector.unregister(sock)
+                    sock.close()
+    finally:
+        selector.close()
+        for sock in probes:
+            sock.close()
+
+# ioctl request which returns the IPv4 address of an interface
+SIOCGIFADDR = 0x8915
+
+def getInterfaceAddresses(include_loopback=False):
+    """Return the IPv4 addresses of the network interfaces
+
+    Interfaces are enumerated on Linux only, elsewhere the wildcard address
+    is returned so the default interface is used.
+
+    @param [bool] OPTIONAL include_loopback  keep the 127.0.0.0/8 addresses
+    @return [list] the IPv4 addresses
+    """
+    try:
+        import fcntl
+        names = [name for _, name in socket.if_nameindex()]
+    except (ImportError, AttributeError, socket.error):
+        names = []
+    addresses = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for name in names:
+            try:
+                res = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, struct.pack('256s', name[:15].encode('utf-8')))
+            except (IOError, OSError):
+                # no IPv4 address on this interface
+                continue
+            address = socket.inet_ntoa(res[20:24])
+            if address.startswith('127.') and not include_loopback:
+                continue
+            if address not in addresses:
+                addresses.append(address)
+    finally:
+        sock.close()
+    if not addresses:
+        return ['0.0.0.0']
+    return addresses
+
+ARP_TABLE_PATH = '/proc/net/arp'
+# Min delay between two reads of the neighbor table caused by lookup misses
+NEIGHBOR_REFRESH_INTERVAL = 0.2
+INCOMPLETE_MAC = '00:00:00:00:00:00'
+
+class NeighborTable:
+    """This is an index of the kernel neighbor (ARP) table
+
+    The table file is parsed again only when its checksum has changed, and
+    a lookup miss triggers a new read of the file, at most once every
+    NEIGHBOR_REFRESH_INTERVAL seconds. A hit is a dict read, so a lookup
+    can be done for each discovery reply.
+    """
+
+    def __init__(self, path=ARP_TABLE_PATH):
+        """Default constructor
+
+        @param [str] OPTIONAL path  the path of the ARP table file
+        """
+        self.__path = path
+        self.__macs = dict()
+        self.__crc = None
+        self.__last_read = None
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__macs)
+
+    def __contains__(self, address):
+        return self.get(address) is not None
+
+    def get(self, address, default=None):
+        """Return the MAC address of an IP address
+
+        @param [str] address  the IPv4 address
+        @return [str] the MAC address or the default value if unknown
+        """
+        mac = self.__macs.get(address)
+        if mac is None:
+            with self.__lock:
+                if (self.__last_read is None or
+                        monotonic() - self.__last_read >= NEIGHBOR_REFRESH_INTERVAL):
+                    self.__refresh()
+                mac = self.__macs.get(address)
+        return mac if mac is not None else default
+
+    lookup = get
+
+    def refresh(self):
+        """Read the table file and parse it again if it has changed
+
+        @return [bool] True if the table has changed
+        """
+        with self.__lock:
+            return self.__refresh()
+
+    def getTable(self):
+        """Return an up to date copy of the whole table
+
+        @return [dict] the MAC addresses by IP address
+        """
+        with self.__lock:
+            self.__refresh()
+            return dict(self.__macs)
+
+    def __refresh(self):
+        self.__last_read = monotonic()
+        try:
+            with open(self.__path, 'rb') as f_arp:
+                data = f_arp.read()
+        except (IOError, OSError) as e:
+            if self.__crc is None:
+                getLogger().warning("Unable to access ARP mapping table from file : %s. Because of %s", self.__path, str(e))
+            self.__crc = -1
+            return False
+        crc = zlib.crc32(data)
+        if crc == self.__crc:
+            return False
+        self.__crc = crc
+        macs = dict()
+        # skip the header line
+        for row in data.split(b'\n')[1:]:
+            fields = row.split()
+            if len(fields) < 4:
+                continue
+            mac = fields[3].decode('ascii', 'replace').lower()
+            if mac != INCOMPLETE_MAC:
+                macs[fields[0].decode('ascii', 'replace')] = mac
+        self.__macs = macs
+        getLogger().debug("Initialized ARP mapping table from file : %s : with %d addresses", self.__path, len(macs))
+        return True
+
+# Table shared by all discovery methods
+g_neighbor_table = None
+
+def getNeighborTable():
+    """Return the neighbor table shared by the whole process
+    """
+    global g_neighbor_table
+    if g_neighbor_table is None:
+        g_neighbor_table = NeighborTable()
+    return g_neighbor_table
+
+def getArpTable():
+    """Return a copy of the ARP table
+
+    @return [dict] the MAC addresses by IP address
+    """
+    return getNeighborTable().getTable()
 
 def fillComputedValues(tv):
     """Add some computed values into 'computed' key of the given tv dict
@@ -61,14 +396,30 @@ def fillComputedValues(tv):
     fillModelFromDiscoverResponse(tv)
     fillManufacturerFromDiscoverResponse(tv)
 
+def extractUUID(usn):
+    """Extract the UUID part of an USN string
+
+    @return [str] the lower case UUID or None
+    """
+    match = RE_UUID.search(usn.lower())
+    if match:
+        return match.group(0)
+    return None
+
 def fillUUIDFromDiscoverResponse(tv):
     """Try to find the UUID of the TV in headers
     """
     if 'discovery' in tv and 'USN' in tv['discovery']:
-        usn = tv['discovery']['USN'].lower()
-        match = re.search('[a-f0-9]{8}\-[a-f0-9]{4}\-[a-f0-9]{4}\-[a-f0-9]{4}\-[a-f0-9]{12}', usn)
-        if match:
-            tv['computed']['uuid'] = match.group(0)
+        uuid = extractUUID(tv['discovery']['USN'])
+        if uuid:
+            tv['computed']['uuid'] = uuid
+    elif ('informations' in tv and
+          'general' in tv['informations'] and
+          'device' in tv['informations']['general'] and
+          'UDN' in tv['informations']['general']['device']):
+        uuid = extractUUID(tv['informations']['general']['device']['UDN'])
+        if uuid:
+            tv['computed']['uuid'] = uuid
 
 def fillNameFromDiscoverResponse(tv):
     """Try to find the friendly name of the TV in informations
@@ -14,6 +14,16 @@ setup(
     description="Library to control Panasonic Viera TVs",
     long_description=open('README.md').read(),
     include_package_data=True,
+    install_requires=[
+        'futures; python_version < "3.2"',
+        'selectors2; python_version < "3.4"',
+    ],
+    entry_points={
+        'console_scripts': [
+            'viera = panasonic_viera.cli:main',
+            'vierad = panasonic_viera.daemon:main',
+        ],
+    },
     url='https://github.com/Turgon37/panasonic-viera',
     classifiers=[
         "Development Status :: 4 - Beta",
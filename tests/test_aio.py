@@ -0,0 +1,97 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import socket
+import sys
+import threading
+import unittest
+
+# Project imports
+from panasonic_viera.constants import ErrorCodes
+from panasonic_viera.exceptions import RemoteControlException
+from panasonic_viera.mock import MockTV
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from panasonic_viera.aio import AsyncRemoteControl, readHttpResponse
+
+
+def runCoroutine(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio client needs python 3.5")
+class ReadHttpResponseTest(unittest.TestCase):
+    """The parsing of the responses by the asyncio client
+    """
+
+    def read(self, data):
+        loop = asyncio.new_event_loop()
+        try:
+            reader = asyncio.StreamReader(loop=loop)
+            reader.feed_data(data)
+            reader.feed_eof()
+            return loop.run_until_complete(readHttpResponse(reader))
+        finally:
+            loop.close()
+
+    def testResponse(self):
+        self.assertEqual(self.read(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'), (200, b'ok'))
+        self.assertEqual(self.read(b'HTTP/1.1 500\r\n\r\nerror'), (500, b'error'))
+
+    def testInvalidStatusLine(self):
+        for line in (b'HTTP/1.1\r\n', b'garbage\r\n', b'HTTP/1.1 2000 OK\r\n'):
+            self.assertRaises(ValueError, self.read, line + b'\r\n')
+
+    def testGarbageIsUnreachable(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+
+        def reply():
+            client, _ = server.accept()
+            client.recv(65536)
+            client.sendall(b'SSH-2.0\r\n\r\n')
+            client.close()
+        thread = threading.Thread(target=reply)
+        thread.start()
+        try:
+            rc = AsyncRemoteControl(*server.getsockname(), timeout=2)
+            with self.assertRaises(RemoteControlException) as context:
+                runCoroutine(rc.getVolume())
+            self.assertEqual(context.exception.args[1], ErrorCodes.TV_UNREACHEABLE)
+        finally:
+            thread.join()
+            server.close()
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio client needs python 3.5")
+class AsyncFindTest(unittest.TestCase):
+    """The discovery of the asyncio client against a MockTV
+    """
+
+    def testDuplicateReplies(self):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(('127.0.0.1', 0))
+        local_port = probe.getsockname()[1]
+        probe.close()
+        with MockTV() as tv:
+            host, port = tv.getAddress()
+            ssdp_host, ssdp_port = tv.getSsdpAddress()
+            rc = AsyncRemoteControl(host, port, timeout=0.3)
+            # the TV also announces itself while the search is running
+            timer = threading.Timer(0.1, tv.notify, [('127.0.0.1', local_port)])
+            timer.start()
+            tvs = runCoroutine(rc.find(multicast_address=ssdp_host, multicast_port=ssdp_port,
+                                       multicast_localport=local_port))
+            timer.join()
+        self.assertEqual(len(tvs), 1)
+        self.assertEqual(tvs[0]['computed']['name'], 'Mock Viera')
+
+
+if __name__ == '__main__':
+    unittest.main()
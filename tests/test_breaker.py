@@ -0,0 +1,65 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import socket
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.breaker import CircuitBreaker
+from panasonic_viera.constants import CircuitState
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """The states of the circuit of a TV
+    """
+
+    def setUp(self):
+        # a TV which accepts the TCP probes
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.host, self.port = self.server.getsockname()
+
+    def tearDown(self):
+        self.server.close()
+
+    def openCircuit(self, breaker):
+        for i in range(2):
+            breaker.recordFailure(self.host, self.port)
+        self.assertEqual(breaker.getState(self.host, self.port), CircuitState.OPEN)
+        self.assertFalse(breaker.allow(self.host, self.port))
+        time.sleep(0.06)
+
+    def testSingleTrial(self):
+        breaker = CircuitBreaker(threshold=2, backoff=0.05)
+        self.openCircuit(breaker)
+        self.assertTrue(breaker.allow(self.host, self.port))
+        self.assertEqual(breaker.getState(self.host, self.port), CircuitState.HALF_OPEN)
+        # the other callers wait for the outcome of the trial
+        self.assertFalse(breaker.allow(self.host, self.port))
+        self.assertFalse(breaker.allow(self.host, self.port))
+        breaker.recordSuccess(self.host, self.port)
+        self.assertEqual(breaker.getState(self.host, self.port), CircuitState.CLOSED)
+        self.assertTrue(breaker.allow(self.host, self.port))
+
+    def testFailedTrial(self):
+        breaker = CircuitBreaker(threshold=2, backoff=0.05)
+        self.openCircuit(breaker)
+        self.assertTrue(breaker.allow(self.host, self.port))
+        breaker.recordFailure(self.host, self.port)
+        self.assertEqual(breaker.getState(self.host, self.port), CircuitState.OPEN)
+        self.assertFalse(breaker.allow(self.host, self.port))
+
+    def testLostTrial(self):
+        breaker = CircuitBreaker(threshold=2, backoff=0.05, trial_timeout=0.05)
+        self.openCircuit(breaker)
+        self.assertTrue(breaker.allow(self.host, self.port))
+        self.assertFalse(breaker.allow(self.host, self.port))
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow(self.host, self.port))
+        self.assertFalse(breaker.allow(self.host, self.port))
+
+
+if __name__ == '__main__':
+    unittest.main()
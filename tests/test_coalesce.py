@@ -0,0 +1,74 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.coalesce import CommandCoalescer
+from panasonic_viera.constants import Keys
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl, getKeyValue
+
+
+class CommandCoalescerTest(unittest.TestCase):
+    """The merging of the volume commands sent to a MockTV
+    """
+
+    def setUp(self):
+        self.tv = MockTV(volume=10)
+        self.tv.start()
+        self.rc = RemoteControl(*self.tv.getAddress())
+
+    def tearDown(self):
+        self.tv.stop()
+
+    def testMerge(self):
+        with CommandCoalescer(self.rc, window=0.2) as queue:
+            futures = [queue.sendKey(Keys.VOLUME_UP) for i in range(5)]
+            futures.append(queue.sendKey(Keys.VOLUME_DOWN))
+            queue.flush(timeout=2.0)
+        self.assertEqual([future.result() for future in futures], [14] * 6)
+        # one GetVolume and one SetVolume
+        self.assertEqual(self.tv.requests, 2)
+        self.assertEqual(self.tv.volume, 14)
+
+    def testOrder(self):
+        with CommandCoalescer(self.rc, window=0.2) as queue:
+            first = queue.sendKey(Keys.VOLUME_UP)
+            absolute = queue.setVolume(30)
+            queue.sendKey(Keys.VOLUME_UP)
+            mute = queue.sendKey(Keys.MUTE)
+            last = queue.sendKey(Keys.VOLUME_DOWN)
+            queue.flush(timeout=2.0)
+        # the setVolume call supersedes the keys before it
+        self.assertEqual(first.result(), 31)
+        self.assertEqual(absolute.result(), 31)
+        # the other keys are not merged across
+        self.assertEqual(self.tv.keys, [getKeyValue(Keys.MUTE)])
+        self.assertTrue(mute.done())
+        self.assertEqual(last.result(), 30)
+
+    def testDispatchedBatch(self):
+        self.tv.latency = 0.2
+        with CommandCoalescer(self.rc, window=0.01) as queue:
+            first = queue.sendKey(Keys.VOLUME_UP)
+            while not self.tv.requests:
+                time.sleep(0.01)
+            # the first command is in flight, it must not absorb this one
+            second = queue.sendKey(Keys.VOLUME_UP)
+            queue.flush(timeout=3.0)
+        self.assertEqual(first.result(), 11)
+        self.assertEqual(second.result(), 12)
+        self.assertEqual(self.tv.volume, 12)
+
+    def testClosed(self):
+        queue = CommandCoalescer(self.rc)
+        queue.close()
+        self.assertRaises(RuntimeError, queue.sendKey, Keys.VOLUME_UP)
+        self.assertRaises(RuntimeError, queue.setVolume, 20)
+        self.assertRaises(RuntimeError, queue.sendKey, Keys.MUTE)
+
+
+if __name__ == '__main__':
+    unittest.main()
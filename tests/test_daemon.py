@@ -0,0 +1,74 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.cli import runRequest, sendRequest, MAX_REPLY_SIZE
+from panasonic_viera.daemon import ControllerDaemon
+from panasonic_viera.mock import MockTV
+
+
+class DaemonTest(unittest.TestCase):
+    """The requests served over the Unix socket
+    """
+
+    def setUp(self):
+        self.tv = MockTV(volume=17)
+        self.tv.start()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'viera.sock')
+        self.daemon = ControllerDaemon(self.path, timeout=1.0)
+        self.thread = threading.Thread(target=self.daemon.serveForever)
+        self.thread.start()
+        while not os.path.exists(self.path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.tv.stop()
+        shutil.rmtree(self.directory)
+
+    def request(self, **request):
+        host, port = self.tv.getAddress()
+        request.update(host=host, port=port)
+        return request
+
+    def testRequests(self):
+        self.assertEqual(sendRequest(dict(method='ping'), self.path), dict(result='pong'))
+        self.assertEqual(sendRequest(self.request(method='getVolume'), self.path), dict(result=17))
+        reply = sendRequest(self.request(method='setVolume', args=['loud']), self.path)
+        self.assertTrue(reply['error'].startswith('invalid arguments'))
+
+    def testRequestTooLong(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(2.0)
+        try:
+            sock.connect(self.path)
+            sock.sendall(b'{"method":"ping","pad":"' + b' ' * MAX_REPLY_SIZE + b'"}\n')
+            reply = b''
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                reply += chunk
+        finally:
+            sock.close()
+        # the tail of the line is not served as another request
+        self.assertEqual(reply, b'{"error":"request too long"}\n')
+
+    def testInProcess(self):
+        self.assertEqual(runRequest(self.request(method='setVolume', args=[21])), dict(result=None))
+        self.assertEqual(runRequest(self.request(method='getVolume')), dict(result=21))
+        self.assertEqual(runRequest(dict(method='getMute')), dict(error='a host is required'))
+
+
+if __name__ == '__main__':
+    unittest.main()
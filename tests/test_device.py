@@ -0,0 +1,105 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import json
+import os
+import unittest
+import xml.etree.ElementTree as xml_elm
+
+# Project imports
+from panasonic_viera.device import (TVDevice, Mapping, scanDescription, parseDescriptionFields,
+                                    isScannableDescription)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def readFixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as fixture:
+        return fixture.read()
+
+
+class ScanDescriptionTest(unittest.TestCase):
+    """The root device fields read from the description files
+    """
+
+    def testScan(self):
+        data = readFixture('ddd.xml')
+        self.assertTrue(isScannableDescription(data))
+        fields = scanDescription(data)
+        self.assertEqual(fields['name'], '55 VIErA')
+        self.assertEqual(fields['model_number'], 'TX-55EX780E')
+        self.assertEqual(fields['uuid'], 'uuid:4d454930-0200-1000-8001-a81374c9c2b6')
+        self.assertEqual(fields, parseDescriptionFields(data))
+
+    def testEntities(self):
+        data = readFixture('ddd_entities.xml')
+        self.assertFalse(isScannableDescription(data))
+        fields = scanDescription(data)
+        self.assertEqual(fields['name'], u'T\xe9l\xe9 "Salon" & cuisine')
+        self.assertEqual(fields['model_name'], 'Panasonic <VIErA>')
+        self.assertIsNone(fields['model_number'])
+
+    def testLatin1(self):
+        data = readFixture('ddd_latin1.xml')
+        self.assertFalse(isScannableDescription(data))
+        self.assertEqual(scanDescription(data)['name'], u'T\xe9l\xe9 chambre')
+
+    def testEmbeddedDevices(self):
+        data = readFixture('ddd_embedded.xml')
+        fields = scanDescription(data)
+        # the model number is only known by the embedded device
+        self.assertIsNone(fields['model_number'])
+        self.assertEqual(fields['name'], '65 VIErA')
+        self.assertEqual(fields, parseDescriptionFields(data))
+        data = data.replace(b'<modelName>VIErA</modelName>\n    ',
+                            b'<modelName>VIErA</modelName>\n    <modelNumber>TX-65FZ800</modelNumber>\n    ')
+        self.assertEqual(scanDescription(data)['model_number'], 'TX-65FZ800')
+
+    def testInvalidUtf8(self):
+        # the parser reports the error, like any invalid description
+        data = readFixture('ddd.xml').replace(b'55 VIErA', u'T\xe9l\xe9'.encode('latin-1'))
+        self.assertTrue(isScannableDescription(data))
+        self.assertRaises(xml_elm.ParseError, scanDescription, data)
+
+
+class TVDeviceTest(unittest.TestCase):
+    """The compatibility of the records with the former dicts
+    """
+
+    def setUp(self):
+        self.device = TVDevice('192.168.1.2', 55000, 'aa:bb:cc:dd:ee:ff',
+                               dict(USN='uuid:4d454930-0200-1000-8001-a81374c9c2b6::upnp:rootdevice'),
+                               readFixture('ddd.xml'))
+
+    def testMapping(self):
+        self.assertTrue(isinstance(self.device, Mapping))
+        self.assertEqual(sorted(self.device.keys()),
+                         ['address', 'computed', 'discovery', 'informations', 'mac', 'port'])
+        self.assertEqual(self.device['computed']['name'], '55 VIErA')
+        self.assertEqual(self.device['computed']['uuid'], '4d454930-0200-1000-8001-a81374c9c2b6')
+
+    def testLazyInformations(self):
+        self.assertTrue('informations' in self.device)
+        self.assertEqual(len(self.device), 6)
+        self.assertEqual(sorted(self.device), sorted(self.device.keys()))
+        self.assertIsNone(self.device._informations)
+        device = TVDevice('192.168.1.3', 55000)
+        self.assertFalse('informations' in device)
+        self.assertRaises(KeyError, lambda: device['informations'])
+        self.assertFalse('name' in device)
+
+    def testToDict(self):
+        tv = self.device.toDict()
+        self.assertEqual(type(tv), dict)
+        self.assertEqual(json.loads(json.dumps(tv))['computed'], self.device['computed'])
+        self.assertEqual(tv['informations']['general']['device']['friendlyName'], '55 VIErA')
+        tv['computed']['name'] = 'Kitchen'
+        tv['discovery']['USN'] = None
+        tv['informations']['general']['device']['friendlyName'] = 'Kitchen'
+        self.assertEqual(self.device.name, '55 VIErA')
+        self.assertNotEqual(self.device['discovery']['USN'], None)
+        self.assertEqual(self.device.informations['general']['device']['friendlyName'], '55 VIErA')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import sys
+import threading
+import time
+import unittest
+if sys.version_info[0] == 3:
+    from queue import Queue
+else:
+    from Queue import Queue
+
+# Project imports
+from panasonic_viera.events import EventListener
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl
+from panasonic_viera.state import StateCache
+
+
+class _CountingRemoteControl(RemoteControl):
+    """Count the subscription renewals
+    """
+
+    renewals = 0
+
+    def renewSubscription(self, *args, **kwargs):
+        self.renewals += 1
+        return RemoteControl.renewSubscription(self, *args, **kwargs)
+
+
+class EventListenerTest(unittest.TestCase):
+    """The GENA subscriptions to the events of a MockTV
+    """
+
+    def setUp(self):
+        self.tv = MockTV(volume=10)
+        self.tv.start()
+        self.rc = _CountingRemoteControl(*self.tv.getAddress(), state_cache=StateCache(max_age=60))
+        self.events = Queue()
+
+    def tearDown(self):
+        self.tv.stop()
+
+    def callback(self, rc, states):
+        self.events.put((rc, states))
+
+    def listen(self, timeout=300):
+        return EventListener('127.0.0.1', advertise_address='127.0.0.1', timeout=timeout)
+
+    def testSubscribeNotify(self):
+        with self.listen() as listener:
+            sid = listener.subscribe(self.rc, self.callback)
+            self.assertTrue(sid.startswith('uuid:'))
+            # the initial event gives the current states
+            self.assertEqual(self.events.get(timeout=2.0), (self.rc, dict(volume=10, mute=False)))
+            self.tv.volume = 33
+            self.tv.publish()
+            self.assertEqual(self.events.get(timeout=2.0)[1], dict(volume=33, mute=False))
+            # the value is served by the cache without a request
+            requests = self.tv.requests
+            self.assertEqual(self.rc.getVolume(), 33)
+            self.assertEqual(self.tv.requests, requests)
+        # the subscription has been cancelled by stop()
+        self.assertFalse(self.tv.unsubscribe(sid))
+
+    def testRenew(self):
+        with self.listen(timeout=1) as listener:
+            sid = listener.subscribe(self.rc, self.callback)
+            self.events.get(timeout=2.0)
+            time.sleep(0.8)
+            self.assertEqual(self.rc.renewals, 1)
+            self.tv.publish([sid])
+            self.assertEqual(self.events.get(timeout=2.0)[1]['volume'], 10)
+
+    def testLostSubscription(self):
+        with self.listen(timeout=1) as listener:
+            sid = listener.subscribe(self.rc, self.callback)
+            self.events.get(timeout=2.0)
+            # the TV forgets the subscription, the renewal makes a new one
+            self.tv.unsubscribe(sid)
+            self.assertEqual(self.events.get(timeout=2.0)[1], dict(volume=10, mute=False))
+            self.tv.volume = 5
+            self.tv.publish()
+            self.assertEqual(self.events.get(timeout=2.0)[1]['volume'], 5)
+            # the events of the old subscription are refused
+            self.assertEqual(listener.dispatch(sid, '0', b''), 412)
+
+    def testStopWithoutStart(self):
+        listener = self.listen()
+        thread = threading.Thread(target=listener.stop)
+        thread.daemon = True
+        thread.start()
+        thread.join(2.0)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
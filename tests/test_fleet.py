@@ -0,0 +1,41 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.fleet import RemoteControlGroup
+from panasonic_viera.mock import MockTV
+
+
+class RemoteControlGroupTest(unittest.TestCase):
+    """The commands run on a group of MockTVs
+    """
+
+    def testExecute(self):
+        with MockTV(volume=5) as tv:
+            host, port = tv.getAddress()
+            results = RemoteControlGroup([host, 'localhost'], port=port).getVolume()
+            self.assertEqual(list(results.keys()), [host, 'localhost'])
+            self.assertEqual([result.value for result in results.values()], [5, 5])
+            self.assertTrue(all(result.isSuccess() for result in results.values()))
+
+    def testDeadline(self):
+        with MockTV(latency=0.5) as tv:
+            host, port = tv.getAddress()
+            # the same TV under two names, one worker: the second command waits
+            group = RemoteControlGroup([host, 'localhost'], port=port, max_workers=1, deadline=0.1)
+            start = time.time()
+            results = group.getVolume()
+            self.assertTrue(time.time() - start < 0.4)
+            self.assertEqual(str(results[host].error), "The TV has not answered before the deadline.")
+            self.assertEqual(str(results['localhost'].error),
+                             "The command has not been sent before the deadline.")
+            self.assertEqual(results[host].error.getCode(), 408)
+            # let the request in flight end before the TV stops
+            time.sleep(0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
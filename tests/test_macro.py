@@ -0,0 +1,90 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.constants import Keys
+from panasonic_viera.exceptions import RemoteControlException
+from panasonic_viera.macro import Macro, MacroRunner
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl, getKeyValue
+from panasonic_viera.state import StateCache
+
+KEYS = (Keys.NUM_1, Keys.NUM_2, Keys.ENTER)
+
+
+class MacroTest(unittest.TestCase):
+    """The compiled steps of a macro
+    """
+
+    def testOffsets(self):
+        macro = Macro(interval=0.1).key(Keys.NUM_1).key(Keys.NUM_2, delay=0.3).wait(0.2).key(Keys.ENTER)
+        self.assertEqual([round(step.offset, 3) for step in macro.getSteps()], [0.0, 0.3, 0.6])
+        macro.wait(0.5)
+        self.assertEqual(len(macro), 4)
+        self.assertAlmostEqual(macro.getDuration(), 1.1)
+        self.assertRaises(ValueError, macro.key, Keys.ENTER, -1)
+
+
+class MacroRunnerTest(unittest.TestCase):
+    """The macros run on MockTVs
+    """
+
+    def setUp(self):
+        self.tvs = [MockTV(latency=0.02), MockTV(latency=0.02)]
+        for tv in self.tvs:
+            tv.start()
+        self.rcs = [RemoteControl(*tv.getAddress(), state_cache=StateCache(max_age=60))
+                    for tv in self.tvs]
+
+    def tearDown(self):
+        for tv in self.tvs:
+            tv.stop()
+
+    def testStepOrder(self):
+        macro = Macro(interval=0.05).keys(KEYS).setVolume(20).setMute(True)
+        with MacroRunner(max_workers=2) as runner:
+            futures = [runner.run(rc, macro) for rc in self.rcs]
+            results = [future.result(timeout=3.0) for future in futures]
+        for tv, rc, timings in zip(self.tvs, self.rcs, results):
+            self.assertEqual(tv.keys, [getKeyValue(key) for key in KEYS])
+            self.assertEqual((tv.volume, tv.mute), (20, True))
+            self.assertEqual([timing.index for timing in timings], list(range(5)))
+            # each step starts after the previous one has ended
+            for previous, timing in zip(timings, timings[1:]):
+                self.assertTrue(timing.started >= previous.finished)
+                self.assertTrue(timing.scheduled - previous.scheduled >= 0.049)
+            self.assertTrue(all(timing.error is None for timing in timings))
+            # the written states are cached
+            requests = tv.requests
+            self.assertEqual((rc.getVolume(), rc.getMute()), (20, True))
+            self.assertEqual(tv.requests, requests)
+
+    def testCancel(self):
+        macro = Macro(interval=0.1).keys(KEYS * 3)
+        with MacroRunner() as runner:
+            steps = []
+            future = runner.run(self.rcs[0], macro, on_step=lambda rc, timing: steps.append(timing))
+            while len(steps) < 2:
+                time.sleep(0.01)
+            self.assertTrue(future.cancel())
+            time.sleep(0.3)
+            self.assertEqual(runner.getActiveCount(), 0)
+        self.assertEqual(len(self.tvs[0].keys), 2)
+        self.assertEqual(self.tvs[0].keys, [getKeyValue(key) for key in KEYS[:2]])
+
+    def testStopOnError(self):
+        self.tvs[0].error_rate = 1.0
+        macro = Macro().keys(KEYS)
+        with MacroRunner() as runner:
+            future = runner.run(self.rcs[0], macro)
+            self.assertRaises(RemoteControlException, future.result, 3.0)
+            timings = runner.run(self.rcs[0], macro, stop_on_error=False).result(timeout=3.0)
+        self.assertEqual(len(timings), 3)
+        self.assertTrue(all(timing.error is not None for timing in timings))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import unittest
+
+# Project imports
+from panasonic_viera.metrics import Instrumentation, MetricsRegistry, RequestEvent
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl, URL_INFORMATION
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    """The metrics of the requests sent to a MockTV
+    """
+
+    def testBytesSent(self):
+        instrumentation = Instrumentation()
+        registry = MetricsRegistry()
+        instrumentation.addPostRequestHook(registry.observe)
+        with MockTV() as tv:
+            host, port = tv.getAddress()
+            rc = RemoteControl(host, port, instrumentation=instrumentation)
+            rc.description()
+            rc.getVolume()
+        text = registry.exportPrometheus()
+        sent = [line for line in text.splitlines()
+                if line.startswith('viera_request_bytes_sent_total')]
+        self.assertEqual(len(sent), 2)
+        # the GET request line and headers are counted
+        for line in sent:
+            self.assertTrue(int(line.rsplit(' ', 1)[1]) > 0, line)
+        self.assertTrue(any(URL_INFORMATION in line for line in sent))
+
+    def testLabelsEscaped(self):
+        registry = MetricsRegistry()
+        event = RequestEvent('tv "salon"\\1', 'Get\nVolume')
+        event.finish('success')
+        registry.observe(event)
+        text = registry.exportPrometheus()
+        self.assertTrue('viera_requests_total{host="tv \\"salon\\"\\\\1",action="Get\\nVolume",'
+                        'outcome="success"} 1' in text, text)
+        # one sample per line
+        self.assertTrue(all(line.startswith(('#', 'viera_')) for line in text.splitlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
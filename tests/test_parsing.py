@@ -0,0 +1,120 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import os
+import unittest
+import xml.etree.ElementTree as xml_elm
+
+# Project imports
+from panasonic_viera.remote_control import (parseVolumeResponse, parseMuteResponse,
+                                            buildVolumeParams, RE_CURRENT_VOLUME,
+                                            RE_CURRENT_MUTE, SET_VOLUME_TEMPLATE,
+                                            URN_RENDERING_CONTROL)
+from panasonic_viera.soap import buildSoapBody
+from panasonic_viera.utils import (scanResponse, parseXMLInformations,
+                                   parseXMLInformationsFromBytes, MAX_SCAN_SIZE)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+DESCRIPTIONS = ('ddd.xml', 'ddd_entities.xml', 'ddd_latin1.xml', 'ddd_embedded.xml')
+
+
+def readFixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as fixture:
+        return fixture.read()
+
+
+class ScanResponseTest(unittest.TestCase):
+    """The regex scan of the RenderingControl responses
+    """
+
+    def testVolume(self):
+        res = readFixture('get_volume.xml')
+        self.assertEqual(scanResponse(res, RE_CURRENT_VOLUME, b'GetVolumeResponse'), b'11')
+        self.assertEqual(parseVolumeResponse(res), 11)
+
+    def testVolumeWithWhitespaces(self):
+        res = readFixture('get_volume_pretty.xml')
+        self.assertEqual(scanResponse(res, RE_CURRENT_VOLUME, b'GetVolumeResponse'), b'100')
+        self.assertEqual(parseVolumeResponse(res), 100)
+
+    def testMute(self):
+        self.assertTrue(parseMuteResponse(readFixture('get_mute_on.xml')))
+        self.assertFalse(parseMuteResponse(readFixture('get_mute_off.xml')))
+
+    def testMultipleMatchesFallBack(self):
+        res = readFixture('get_volume_comment.xml')
+        self.assertIsNone(scanResponse(res, RE_CURRENT_VOLUME, b'GetVolumeResponse'))
+        # the value in the comment is ignored by the XML parser
+        self.assertEqual(parseVolumeResponse(res), 7)
+
+    def testMissingMarkerFallsBack(self):
+        res = readFixture('get_mute_on.xml')
+        self.assertIsNone(scanResponse(res, RE_CURRENT_MUTE, b'GetVolumeResponse'))
+
+    def testLargeResponseFallsBack(self):
+        res = readFixture('get_volume.xml')
+        padding = b'<!--' + b' ' * MAX_SCAN_SIZE + b'-->'
+        res = res.replace(b'<s:Body>', b'<s:Body>' + padding)
+        self.assertIsNone(scanResponse(res, RE_CURRENT_VOLUME, b'GetVolumeResponse'))
+        self.assertEqual(parseVolumeResponse(res), 11)
+
+    def testScanMatchesParser(self):
+        for name, parse in (('get_volume.xml', parseVolumeResponse),
+                            ('get_volume_pretty.xml', parseVolumeResponse),
+                            ('get_mute_on.xml', parseMuteResponse),
+                            ('get_mute_off.xml', parseMuteResponse)):
+            res = readFixture(name)
+            tag = 'CurrentVolume' if 'volume' in name else 'CurrentMute'
+            text = xml_elm.fromstring(res).find('.//' + tag).text
+            expected = int(text) if tag == 'CurrentVolume' else text.strip() != '0'
+            self.assertEqual(parse(res), expected, name)
+
+
+class SoapTemplateTest(unittest.TestCase):
+    """The precomputed requests match the formatted ones
+    """
+
+    def testVolume(self):
+        for volume in (0, 11, 100, 10.5):
+            self.assertEqual(SET_VOLUME_TEMPLATE.body(volume),
+                             buildSoapBody(URN_RENDERING_CONTROL, 'SetVolume',
+                                           buildVolumeParams(volume)))
+
+
+class InformationsTest(unittest.TestCase):
+    """The one pass parser of the description files
+    """
+
+    def testSameAsElementTree(self):
+        for name in DESCRIPTIONS:
+            data = readFixture(name)
+            self.assertEqual(parseXMLInformationsFromBytes(data),
+                             parseXMLInformations(xml_elm.fromstring(data)), name)
+
+    def testStructure(self):
+        infos = parseXMLInformationsFromBytes(readFixture('ddd.xml'))
+        device = infos['device']
+        self.assertEqual(device['friendlyName'], '55 VIErA')
+        # namespaced tags are stripped
+        self.assertEqual(device['X_DeviceInfo']['X_DeviceType'], 'TV')
+        # repeated siblings make a list, a single child a dict
+        self.assertEqual([icon['icon']['width'] for icon in device['iconList']], ['48', '120'])
+        self.assertEqual(device['serviceList']['service']['controlURL'], '/nrc/control_0')
+
+    def testEmptyAndBlankText(self):
+        info = parseXMLInformationsFromBytes(readFixture('ddd.xml'))['device']['X_DeviceInfo']
+        self.assertIsNone(info['X_Empty'])
+        self.assertEqual(info['X_Blank'], '   ')
+
+    def testEntitiesAndEncodings(self):
+        device = parseXMLInformationsFromBytes(readFixture('ddd_entities.xml'))['device']
+        self.assertEqual(device['friendlyName'], u'T\xe9l\xe9 "Salon" & cuisine')
+        self.assertEqual(device['modelName'], 'Panasonic <VIErA>')
+        self.assertIsNone(device['modelNumber'])
+        device = parseXMLInformationsFromBytes(readFixture('ddd_latin1.xml'))['device']
+        self.assertEqual(device['friendlyName'], u'T\xe9l\xe9 chambre')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.constants import Keys, Priority
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl, getKeyValue
+from panasonic_viera.scheduler import CommandScheduler
+from panasonic_viera.utils import monotonic
+
+
+class _TimedRemoteControl:
+    """Record the start time of the calls made to a remote control
+    """
+
+    def __init__(self, rc):
+        self.rc = rc
+        self.starts = []
+
+    def __getattr__(self, name):
+        method = getattr(self.rc, name)
+
+        def call(*args):
+            self.starts.append(monotonic())
+            return method(*args)
+        return call
+
+
+class CommandSchedulerTest(unittest.TestCase):
+    """The order and the pacing of the commands sent to a MockTV
+    """
+
+    def setUp(self):
+        self.tv = MockTV(latency=0.1)
+        self.tv.start()
+        self.rc = _TimedRemoteControl(RemoteControl(*self.tv.getAddress()))
+
+    def tearDown(self):
+        self.tv.stop()
+
+    def testPriorityOrder(self):
+        with CommandScheduler(self.rc, min_gap=0.0) as scheduler:
+            first = scheduler.sendKey(Keys.RIGHT)
+            while not self.rc.starts:
+                time.sleep(0.001)
+            # queued while the first key is in flight
+            futures = [scheduler.sendKey(Keys.LEFT), scheduler.sendKey(Keys.VOLUME_UP),
+                       scheduler.getVolume(), scheduler.sendKey(Keys.POWER),
+                       scheduler.sendKey(Keys.MUTE), scheduler.sendKey(Keys.ENTER, Priority.HIGH)]
+        self.assertTrue(first.done() and all(future.done() for future in futures))
+        self.assertEqual(self.tv.keys, [getKeyValue(key) for key in (
+            Keys.RIGHT, Keys.POWER, Keys.MUTE, Keys.ENTER, Keys.VOLUME_UP, Keys.LEFT)])
+        self.assertEqual(scheduler.getStats()['completed'], 7)
+        self.assertEqual(scheduler.getWaitHistogram(Priority.HIGH).count, 3)
+
+    def testMinGap(self):
+        with CommandScheduler(self.rc, max_in_flight=3, min_gap=0.05) as scheduler:
+            futures = [scheduler.getVolume() for i in range(5)]
+        self.assertEqual([future.result() for future in futures], [10] * 5)
+        gaps = [b - a for a, b in zip(self.rc.starts, self.rc.starts[1:])]
+        self.assertEqual(len(gaps), 4)
+        # the workers in parallel are still paced
+        self.assertTrue(min(gaps) >= 0.045, gaps)
+        self.assertTrue(self.rc.starts[-1] - self.rc.starts[0] < 0.4)
+
+    def testCancel(self):
+        with CommandScheduler(self.rc, min_gap=0.0) as scheduler:
+            scheduler.sendKey(Keys.RIGHT)
+            queued = scheduler.sendKey(Keys.LEFT)
+            self.assertTrue(queued.cancel())
+        self.assertEqual(self.tv.keys, [getKeyValue(Keys.RIGHT)])
+        self.assertEqual(scheduler.getStats()['cancelled'], 1)
+        self.assertRaises(RuntimeError, scheduler.sendKey, Keys.MUTE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import threading
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl
+from panasonic_viera.state import StateCache, getStateKey
+
+
+class StateCacheTest(unittest.TestCase):
+    """The volume and mute values served without asking the TV
+    """
+
+    def testSingleFlight(self):
+        cache = StateCache(max_age=5.0)
+        with MockTV(latency=0.2, volume=23) as tv:
+            rc = RemoteControl(*tv.getAddress(), state_cache=cache)
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(rc.getVolume()))
+                       for i in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, [23] * 5)
+            # the readers have shared one request
+            self.assertEqual(tv.requests, 1)
+            self.assertEqual(cache.getStats(), dict(hits=0, misses=1, shared=4))
+            # the written value is served without a request
+            rc.setVolume(40)
+            self.assertEqual(rc.getVolume(), 40)
+            self.assertEqual(tv.requests, 2)
+
+    def testFailedFlight(self):
+        cache = StateCache()
+        key = getStateKey('127.0.0.1', 55000, 'volume')
+
+        def fail():
+            raise ValueError('unreachable')
+
+        self.assertRaises(ValueError, cache.get, key, fail)
+        # the error is not cached
+        self.assertEqual(cache.get(key, lambda: 12), 12)
+
+    def testGenerationRace(self):
+        cache = StateCache(max_age=5.0)
+        key = getStateKey('127.0.0.1', 55000, 'volume')
+        loading = threading.Event()
+        release = threading.Event()
+
+        def load():
+            loading.set()
+            release.wait()
+            return 10
+
+        results = []
+        reader = threading.Thread(target=lambda: results.append(cache.get(key, load)))
+        reader.start()
+        loading.wait()
+        # the TV is written while the old value is being read
+        cache.set(key, 42)
+        release.set()
+        reader.join()
+        self.assertEqual(results, [10])
+        # the stale value read before the write is not stored
+        self.assertEqual(cache.get(key, lambda: self.fail('the TV is asked')), 42)
+
+        loading.clear()
+        release.clear()
+        reader = threading.Thread(target=lambda: cache.get(key, load))
+        cache.invalidate(key)
+        reader.start()
+        loading.wait()
+        cache.invalidate(key)
+        release.set()
+        reader.join()
+        self.assertEqual(cache.get(key, lambda: 7), 7)
+
+    def testMaxAge(self):
+        cache = StateCache(max_age=0.05)
+        key = getStateKey('127.0.0.1', 55000, 'mute')
+        self.assertEqual(cache.get(key, lambda: True), True)
+        self.assertEqual(cache.get(key, lambda: False), True)
+        time.sleep(0.1)
+        self.assertEqual(cache.get(key, lambda: False), False)
+
+
+if __name__ == '__main__':
+    unittest.main()
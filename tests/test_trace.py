@@ -0,0 +1,47 @@
+# -*- coding: utf8 -*-
+
+# Systems imports
+import io
+import time
+import unittest
+
+# Project imports
+from panasonic_viera.mock import MockTV
+from panasonic_viera.remote_control import RemoteControl
+from panasonic_viera.trace import TraceRecorder, TraceReplayer, writeTrace, readTrace
+
+
+class TraceTest(unittest.TestCase):
+    """The recording of the exchanges with a MockTV and their replay
+    """
+
+    def testRecordAndReplay(self):
+        recorder = TraceRecorder()
+        with MockTV(latency=0.01) as tv:
+            rc = RemoteControl(*tv.getAddress(), pool=True, recorder=recorder)
+            before = time.time()
+            rc.setVolume(12)
+            time.sleep(0.1)
+            self.assertEqual(rc.getVolume(), 12)
+            records = recorder.getRecords()
+            self.assertEqual([record.action for record in records], ['SetVolume', 'GetVolume'])
+            for record in records:
+                self.assertTrue(0.01 <= record.duration < 1.0)
+                self.assertTrue(before - 1 < record.start < time.time() + 1)
+            self.assertTrue(records[1].start - records[0].start >= 0.1)
+
+            output = io.BytesIO()
+            writeTrace(output, records)
+            output.seek(0)
+            loaded = readTrace(output)
+            start = time.time()
+            results = TraceReplayer(loaded, speed=2.0).replay(tv.getAddress(), timeout=1.0)
+            # the second request waits for half of the recorded gap
+            self.assertTrue(time.time() - start >= 0.05)
+            self.assertEqual([result.outcome for result in results], ['success', 'success'])
+            self.assertTrue(all(result.latency >= 0 for result in results))
+            rc.getPool().close()
+
+
+if __name__ == '__main__':
+    unittest.main()